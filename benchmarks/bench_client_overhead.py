@@ -0,0 +1,78 @@
+"""Micro-benchmark: per-call setup vs the cached GeminiClient session.
+
+Replaces the SDK with a local fake transport: configuring the SDK, creating a
+model handle and opening a handle's connection on its first call each cost a
+fixed delay, and generating returns at once. The old per-call pattern
+(configure, new GenerativeModel, generate) is timed against
+`GeminiClient.transport(...).send(...)`, so the difference is the setup and
+connection overhead each call used to pay.
+
+Usage: python benchmarks/bench_client_overhead.py [--calls N] [--setup-ms MS] [--connect-ms MS]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zor.api import GeminiClient, Prompt  # noqa: E402
+
+
+class FakeResponse:
+    text = "OK"
+
+
+def fake_sdk(setup_seconds, connect_seconds):
+    """configure and GenerativeModel stand-ins with the given costs"""
+
+    class FakeModel:
+        def __init__(self, model_name, generation_config=None):
+            time.sleep(setup_seconds)
+            self.connected = False
+
+        def generate_content(self, prompt):
+            if not self.connected:
+                time.sleep(connect_seconds)
+                self.connected = True
+            return FakeResponse()
+
+    def configure(api_key):
+        time.sleep(setup_seconds)
+
+    return configure, FakeModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--setup-ms", type=float, default=2.0)
+    parser.add_argument("--connect-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    configure, fake_model = fake_sdk(args.setup_ms / 1000, args.connect_ms / 1000)
+    prompt = Prompt.build("Explain this.", {"app.py": "print('hello')\n"})
+
+    with patch("zor.api.genai.configure", configure), patch("zor.api.genai.GenerativeModel", fake_model):
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            configure(api_key="key")
+            fake_model("gemini-2.0-flash", generation_config={"temperature": 0.2}).generate_content(prompt.text)
+        per_call_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client = GeminiClient()
+        for _ in range(args.calls):
+            client.configure("key")
+            client.transport("gemini-2.0-flash", 0.2).send(prompt)
+        client_time = time.perf_counter() - start
+
+    print(f"calls           : {args.calls} (setup {args.setup_ms}ms, connect {args.connect_ms}ms)")
+    print(f"setup per call  : {per_call_time:8.3f}s  ({per_call_time / args.calls * 1000:.2f}ms/call)")
+    print(f"cached client   : {client_time:8.3f}s  ({client_time / args.calls * 1000:.2f}ms/call, "
+          f"{per_call_time / client_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark warm vs cold context collection with the on-disk file index.
+
+Builds a synthetic tree (50k files by default) and times:
+  * cold  - collection with the index disabled (the old behaviour)
+  * build - first collection with the index enabled
+  * warm  - a later collection where every file is answered from the index
+
+Usage: python benchmarks/bench_context_index.py [--files N] [--keep DIR]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zor.config import DEFAULT_CONFIG  # noqa: E402
+from zor.context import get_codebase_context  # noqa: E402
+
+FILES_PER_DIR = 100
+SAMPLE = '''import os
+
+
+def handler_{n}(request):
+    """Handle request number {n}"""
+    value = request.get("value", {n})
+    return {{"path": os.path.join("data", str(value)), "n": {n}}}
+'''
+
+
+def make_tree(root: Path, files: int):
+    """Create `files` small source files spread over nested directories"""
+    old = time.time_ns() - 3600 * 1_000_000_000
+    for n in range(files):
+        directory = root / f"pkg{n // (FILES_PER_DIR * 10)}" / f"mod{(n // FILES_PER_DIR) % 10}"
+        if n % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"file_{n}.py"
+        path.write_text(SAMPLE.format(n=n))
+        # Outside the index's racy window, as on any real checkout
+        os.utime(path, ns=(old, old))
+
+
+def timed_collection(root: Path, use_index: bool):
+    config = dict(DEFAULT_CONFIG, use_index=use_index)
+    with patch("zor.context.load_config", return_value=config):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            context = get_codebase_context(str(root))
+            elapsed = time.perf_counter() - start
+    return elapsed, len(context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--keep", help="build the tree in this directory and keep it")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(args.keep) if args.keep else Path(tmp)
+        root.mkdir(parents=True, exist_ok=True)
+        print(f"Creating {args.files} files under {root} ...")
+        make_tree(root, args.files)
+
+        cold, count = timed_collection(root, use_index=False)
+        build, _ = timed_collection(root, use_index=True)
+        warm, _ = timed_collection(root, use_index=True)
+
+    print(f"files collected : {count}")
+    print(f"cold (no index) : {cold:8.3f}s")
+    print(f"index build     : {build:8.3f}s")
+    print(f"warm (index)    : {warm:8.3f}s  ({cold / warm:.1f}x faster than cold)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark peak memory of collecting a context and building the prompt.
+
+Builds a synthetic source tree (500 MB by default) and measures, with
+tracemalloc, the peak Python allocation of:
+  * eager - a dict of every file's text, then the old `context_str` and
+            `full_prompt` strings built from it
+  * lazy  - a `LazyContext` of file sizes, streamed into the prompt with
+            `build_prompt`
+  * prepared - the lazy context taken through what a request does before
+            sending: `_prepare_context` (large-file focus, dedup, light
+            minification, packing to the model budget), then `Prompt.build`
+
+The file index and the git fast path are disabled so both runs read the
+same files. The prompt itself is part of every peak; the difference is the
+copies made on the way to it. The prepared prompt is smaller when packing
+drops files to fit the budget, so its peak is compared with its own size.
+
+Usage: python benchmarks/bench_context_memory.py [--megabytes N] [--keep DIR]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zor.api import Prompt, _prepare_context, build_prompt  # noqa: E402
+from zor.config import DEFAULT_CONFIG  # noqa: E402
+from zor.context import get_codebase_context  # noqa: E402
+
+FILE_SIZE = 64 * 1024
+FILES_PER_DIR = 100
+LINE = "    value_{n} = compute(value_{n}, offset={n})  # keep the line realistic\n"
+PROMPT = "Summarise the architecture of this project"
+
+
+def make_tree(root: Path, megabytes: int):
+    """Create about `megabytes` MB of source spread over FILE_SIZE files"""
+    lines = FILE_SIZE // len(LINE)
+    files = megabytes * 1024 * 1024 // (lines * len(LINE))
+    for n in range(files):
+        directory = root / f"pkg{n // (FILES_PER_DIR * 10)}" / f"mod{(n // FILES_PER_DIR) % 10}"
+        if n % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        # Distinct names per file, so deduplication keeps every file
+        body = "".join(LINE.format(n=n * lines + k) for k in range(lines))
+        (directory / f"file_{n}.py").write_text(f"# file {n}\ndef handler(value):\n{body}")
+    return files
+
+
+def eager_prompt(root):
+    """What ask did before: a dict of strings, then two more full copies"""
+    context = get_codebase_context(str(root))
+    context_str = "\n".join(f"File: {path}\n{content}" for path, content in context.items())
+    full_prompt = f"Codebase Context:\n{context_str}\n\nUser Prompt: {PROMPT}"
+    return len(full_prompt)
+
+
+def lazy_prompt(root):
+    context = get_codebase_context(str(root), lazy=True)
+    return len(build_prompt(PROMPT, context))
+
+
+def prepared_prompt(root):
+    config = dict(DEFAULT_CONFIG, use_index=False, use_git_index=False, minify="light")
+    context = get_codebase_context(str(root), lazy=True)
+    context, manifest = _prepare_context(PROMPT, context, config)
+    return Prompt.build(PROMPT, context, manifest["used_tokens"]).nbytes
+
+
+def measure(func, root):
+    config = dict(DEFAULT_CONFIG, use_index=False, use_git_index=False)
+    gc.collect()
+    with patch("zor.context.load_config", return_value=config):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = func(root)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return size, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=500)
+    parser.add_argument("--keep", help="build the tree in this directory and keep it")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(args.keep) if args.keep else Path(tmp)
+        root.mkdir(parents=True, exist_ok=True)
+        print(f"Creating ~{args.megabytes} MB of source under {root} ...")
+        files = make_tree(root, args.megabytes)
+
+        eager_size, eager_peak, eager_time = measure(eager_prompt, root)
+        lazy_size, lazy_peak, lazy_time = measure(lazy_prompt, root)
+        prepared_size, prepared_peak, prepared_time = measure(prepared_prompt, root)
+
+    assert eager_size == lazy_size, "the two prompts differ"
+    mb = 1024 * 1024
+    print(f"files           : {files}")
+    print(f"prompt size     : {eager_size / mb:8.1f} MB")
+    print(f"eager peak      : {eager_peak / mb:8.1f} MB  ({eager_peak / eager_size:.2f}x prompt, {eager_time:.2f}s)")
+    print(f"lazy peak       : {lazy_peak / mb:8.1f} MB  ({lazy_peak / lazy_size:.2f}x prompt, {lazy_time:.2f}s)")
+    print(f"prepared peak   : {prepared_peak / mb:8.1f} MB  ({prepared_peak / prepared_size:.2f}x its "
+          f"{prepared_size / mb:.1f} MB prompt, {prepared_time:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
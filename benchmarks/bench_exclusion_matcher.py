@@ -0,0 +1,68 @@
+"""Micro-benchmark: compiled ExclusionMatcher vs the per-pattern fnmatch checks.
+
+Runs both over the same synthetic mix of directory and file names using the
+default exclusion lists (plus any extra extensions requested) and checks that
+they agree.
+
+Usage: python benchmarks/bench_exclusion_matcher.py [--names N] [--extra-extensions N]
+"""
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from zor.context import (  # noqa: E402
+    DEFAULT_EXCLUDE_DIRS,
+    DEFAULT_EXCLUDE_EXTENSIONS,
+    DEFAULT_EXCLUDE_FILES,
+    ExclusionMatcher,
+    should_exclude_directory,
+)
+
+DIR_NAMES = ["src", "lib", "node_modules", ".git", "build", "tests", "pkg", "__pycache__", "docs"]
+EXTENSIONS = [".py", ".js", ".ts", ".md", ".png", ".pyc", ".json", ".lock", ".so", ".txt"]
+
+
+def legacy_excludes_file(name, exclude_files, exclude_extensions):
+    """should_exclude_file without the binary sniff, so only matching is timed"""
+    for pattern in exclude_files:
+        if fnmatch.fnmatch(name, pattern):
+            return True
+    return os.path.splitext(name)[1].lower() in exclude_extensions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=100_000)
+    parser.add_argument("--extra-extensions", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    extensions = DEFAULT_EXCLUDE_EXTENSIONS + [f".x{i}" for i in range(args.extra_extensions)]
+    dirs = [rng.choice(DIR_NAMES) + str(rng.randint(0, 3)) for _ in range(args.names // 10)]
+    files = [f"file_{i}{rng.choice(EXTENSIONS)}" for i in range(args.names)]
+
+    start = time.perf_counter()
+    legacy = [should_exclude_directory(d, DEFAULT_EXCLUDE_DIRS) for d in dirs]
+    legacy += [legacy_excludes_file(f, DEFAULT_EXCLUDE_FILES, extensions) for f in files]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = ExclusionMatcher(DEFAULT_EXCLUDE_DIRS, DEFAULT_EXCLUDE_FILES, extensions)
+    compiled = [matcher.excludes_dir(d) for d in dirs]
+    compiled += [matcher.excludes_file(f) for f in files]
+    compiled_time = time.perf_counter() - start
+
+    assert legacy == compiled, "matcher disagrees with the fnmatch checks"
+    print(f"names checked   : {len(dirs) + len(files)} ({len(extensions)} excluded extensions)")
+    print(f"fnmatch loops   : {legacy_time:8.3f}s")
+    print(f"compiled matcher: {compiled_time:8.3f}s  ({legacy_time / compiled_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
-from zor.api import generate_with_context, exponential_backoff, RateLimitError
+from zor import api
+from zor.api import generate_with_context, exponential_backoff, GeminiClient, Prompt, RateLimitError
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch, tmp_path):
+    # Model handles are cached per process; each test starts without them,
+    # and with an empty response cache of its own
+    monkeypatch.setattr(api, "_client", None)
+    monkeypatch.setattr(api, "_semaphores", {})
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
 
 def test_exponential_backoff_decorator():
     # Test the decorator retries on rate limit errors
@@ -32,3 +43,318 @@ def test_generate_with_context(mock_load_config, mock_genai_model):
     assert result == "Generated response"
     mock_genai_model.assert_called_once_with("test-model", generation_config={"temperature": 0.5})
     mock_model_instance.generate_content.assert_called_once()
+
+def test_build_prompt_matches_layout():
+    from zor.api import build_prompt
+    context = {"a.py": "x = 1\n", "b.py": "y = 2\n"}
+    context_str = "\n".join(f"File: {path}\n{content}" for path, content in context.items())
+    assert build_prompt("Why?", context) == f"Codebase Context:\n{context_str}\n\nUser Prompt: Why?"
+
+def test_prompt_is_built_once_and_immutable():
+    from zor.api import build_prompt
+    context = {"a.py": "x = 1\n", "b.md": "café\n"}
+    prompt = Prompt.build("Why?", context)
+    assert prompt.text == build_prompt("Why?", context)
+    assert prompt.nbytes == len(prompt.text.encode("utf-8"))
+    assert prompt.tokens > 0
+    with pytest.raises(AttributeError):
+        prompt.text = "other"
+    assert Prompt.build("Why?", context, context_tokens=100).tokens > 100
+
+@patch("zor.api.time.sleep")
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_generate_with_context_retries_same_prompt(mock_load_config, mock_genai_model, mock_sleep):
+    mock_load_config.return_value = {"model": "test-model", "rate_limit_retries": 3}
+    mock_model_instance = mock_genai_model.return_value
+    mock_response = MagicMock()
+    mock_response.text = "Generated response"
+    mock_model_instance.generate_content.side_effect = [Exception("429 too many requests"), mock_response]
+
+    with patch("zor.api.Prompt.build", wraps=Prompt.build) as mock_build:
+        result = generate_with_context("Test prompt", {"file.py": "file content"})
+
+    assert result == "Generated response"
+    assert mock_load_config.call_count == 1
+    assert mock_genai_model.call_count == 1
+    assert mock_build.call_count == 1
+    first, second = mock_model_instance.generate_content.call_args_list
+    assert first.args[0] is second.args[0]
+
+@patch("zor.api.genai")
+def test_client_configures_once_and_caches_models(mock_genai):
+    mock_genai.GenerativeModel.side_effect = lambda *args, **kwargs: MagicMock()
+    client = GeminiClient()
+    client.configure("key")
+    client.configure("key")
+    mock_genai.configure.assert_called_once_with(api_key="key")
+
+    first = client.model("m", 0.2)
+    assert client.model("m", 0.2) is first
+    assert client.model("m", 0.2, {"top_p": 0.9}) is not first
+    assert client.model("m", 0.5) is not first
+    assert mock_genai.GenerativeModel.call_count == 3
+    mock_genai.GenerativeModel.assert_any_call("m", generation_config={"top_p": 0.9, "temperature": 0.2})
+
+    # A new key drops handles bound to the old one
+    client.configure("other")
+    assert mock_genai.configure.call_count == 2
+    client.model("m", 0.2)
+    assert mock_genai.GenerativeModel.call_count == 4
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_generate_with_context_reuses_model_handle(mock_load_config, mock_genai_model):
+    mock_load_config.return_value = {"model": "test-model", "temperature": 0.5}
+    mock_genai_model.return_value.generate_content.return_value.text = "ok"
+    generate_with_context("one", {"file.py": "x"})
+    generate_with_context("two", {"file.py": "x"})
+    assert mock_genai_model.call_count == 1
+    assert mock_genai_model.return_value.generate_content.call_count == 2
+
+def test_render_stream_returns_whole_text():
+    import io
+    from rich.console import Console
+    from zor.api import render_stream
+    out = io.StringIO()
+    text = render_stream(iter(["# Title\n", "Some ", "**bold** text"]), Console(file=out, width=60))
+    assert text == "# Title\nSome **bold** text"
+    assert "bold" in out.getvalue()
+
+def test_render_stream_cancel_keeps_partial_text():
+    import io
+    from rich.console import Console
+    from zor.api import StreamCancelled, render_stream
+    closed = []
+
+    def chunks():
+        try:
+            yield "first "
+            yield "second"
+            raise KeyboardInterrupt
+        finally:
+            closed.append(True)
+
+    with pytest.raises(StreamCancelled) as cancelled:
+        render_stream(chunks(), Console(file=io.StringIO()))
+    assert cancelled.value.text == "first second"
+    assert closed == [True]
+
+@patch("zor.api.render_stream_async")
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_generate_with_context_stream(mock_load_config, mock_genai_model, mock_render):
+    mock_load_config.return_value = {"model": "test-model"}
+    chunks = [MagicMock(text="Hello "), MagicMock(text="world")]
+    mock_genai_model.return_value.generate_content.return_value = iter(chunks)
+
+    async def render(pieces):
+        return "".join(pieces)
+    mock_render.side_effect = render
+
+    with patch("zor.history.save_history_item") as mock_save:
+        result = generate_with_context("Test prompt", {"file.py": "x"}, stream=True)
+
+    assert result == "Hello world"
+    assert mock_genai_model.return_value.generate_content.call_args.kwargs == {"stream": True}
+    mock_save.assert_called_once_with("Test prompt", "Hello world")
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_generate_with_context_cached(mock_load_config, mock_genai_model):
+    mock_load_config.return_value = {"model": "test-model"}
+    generate = mock_genai_model.return_value.generate_content
+    generate.return_value.text = "answer"
+
+    assert generate_with_context("Why?", {"a.py": "x = 1\n"}) == "answer"
+    assert generate_with_context("Why?", {"a.py": "x = 1\n"}) == "answer"
+    assert generate.call_count == 1
+    # Changed code, --refresh and --no-cache all reach the model
+    generate_with_context("Why?", {"a.py": "x = 2\n"})
+    generate_with_context("Why?", {"a.py": "x = 1\n"}, refresh=True)
+    generate_with_context("Why?", {"a.py": "x = 1\n"}, use_cache=False)
+    assert generate.call_count == 4
+    assert api.ResponseCache().stats() == {"hits": 1, "misses": 2}
+
+@patch("zor.api.render_stream_async")
+@patch("zor.api.render_stream")
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_cached_stream_replays_chunks(mock_load_config, mock_genai_model, mock_render, mock_render_live):
+    mock_load_config.return_value = {"model": "test-model"}
+    generate = mock_genai_model.return_value.generate_content
+    generate.return_value = iter([MagicMock(text="Hello "), MagicMock(text="world")])
+    replayed = []
+    mock_render.side_effect = lambda pieces: replayed.append(list(pieces)) or "".join(replayed[-1])
+
+    async def render_live(pieces):
+        return mock_render(pieces)
+    mock_render_live.side_effect = render_live
+
+    generate_with_context("Hi", {"a.py": "x"}, stream=True)
+    assert generate_with_context("Hi", {"a.py": "x"}, stream=True) == "Hello world"
+    assert generate.call_count == 1
+    assert replayed == [["Hello ", "world"], ["Hello ", "world"]]
+
+def _slow_model(mock_genai_model, seconds, active=None):
+    """Make the mocked model block like a network call, tracking calls in flight"""
+    import threading
+    lock = threading.Lock()
+
+    def generate_content(text, stream=False):
+        if active is not None:
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+        time.sleep(seconds)
+        if active is not None:
+            with lock:
+                active["now"] -= 1
+        return MagicMock(text="answer")
+
+    mock_genai_model.return_value.generate_content.side_effect = generate_content
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_async_requests_are_bounded(mock_load_config, mock_genai_model):
+    import asyncio
+    from zor.api import generate_with_context_async
+    mock_load_config.return_value = {"model": "m", "max_concurrent_requests": 2, "response_cache": False}
+    active = {"now": 0, "max": 0}
+    _slow_model(mock_genai_model, 0.05, active)
+
+    async def run():
+        return await asyncio.gather(*(generate_with_context_async(f"q{i}", {"a.py": "x"}) for i in range(6)))
+
+    assert asyncio.run(run()) == ["answer"] * 6
+    assert active["max"] == 2
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_async_deadline_and_cancellation(mock_load_config, mock_genai_model):
+    import asyncio
+    from zor.api import DeadlineExceeded, generate_with_context_async
+    mock_load_config.return_value = {"model": "m", "max_concurrent_requests": 1, "response_cache": False}
+    _slow_model(mock_genai_model, 0.2)
+
+    with pytest.raises(DeadlineExceeded):
+        generate_with_context("q", {"a.py": "x"}, timeout=0.05)
+
+    async def run():
+        task = asyncio.create_task(generate_with_context_async("slow", {"a.py": "x"}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The cancelled request gave its slot back
+        return await generate_with_context_async("next", {"a.py": "x"}, timeout=5)
+
+    assert asyncio.run(run()) == "answer"
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_abandoned_call_keeps_its_slot(mock_load_config, mock_genai_model):
+    from zor.api import DeadlineExceeded
+    mock_load_config.return_value = {"model": "m", "max_concurrent_requests": 1, "response_cache": False}
+    active = {"now": 0, "max": 0}
+    _slow_model(mock_genai_model, 0.3, active)
+
+    with pytest.raises(DeadlineExceeded):
+        generate_with_context("q", {"a.py": "x"}, timeout=0.05)
+    # The timed-out call is still running, so the next one waits for it
+    assert generate_with_context("next", {"a.py": "x"}, timeout=5) == "answer"
+    assert active["max"] == 1
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_sync_callers_share_the_request_limit(mock_load_config, mock_genai_model):
+    import threading
+    mock_load_config.return_value = {"model": "m", "max_concurrent_requests": 2, "response_cache": False}
+    active = {"now": 0, "max": 0}
+    _slow_model(mock_genai_model, 0.1, active)
+
+    # Each sync call runs its own event loop
+    threads = [threading.Thread(target=generate_with_context, args=(f"q{i}", {"a.py": "x"})) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert active["max"] == 2
+
+def test_render_stream_async_propagates_cancellation():
+    import asyncio
+    import io
+    from rich.console import Console
+    from zor.api import render_stream_async
+
+    def chunks():
+        yield "first "
+        time.sleep(2)
+        yield "never"
+
+    async def run():
+        task = asyncio.create_task(render_stream_async(chunks(), Console(file=io.StringIO())))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await task
+
+    started = time.perf_counter()
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+    # The blocked worker thread is not waited for
+    assert time.perf_counter() - started < 1
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_sync_deadline_does_not_wait_for_slow_transport(mock_load_config, mock_genai_model):
+    from zor.api import DeadlineExceeded
+    mock_load_config.return_value = {"model": "m", "response_cache": False}
+    _slow_model(mock_genai_model, 3)
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        generate_with_context("q", {"a.py": "x"}, timeout=0.2)
+    assert time.perf_counter() - started < 1
+
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_streaming_deadline_raises_deadline_exceeded(mock_load_config, mock_genai_model):
+    from zor.api import DeadlineExceeded
+
+    def slow_stream(text, stream=False):
+        yield MagicMock(text="first ")
+        time.sleep(3)
+        yield MagicMock(text="late")
+
+    mock_load_config.return_value = {"model": "m", "response_cache": False}
+    mock_genai_model.return_value.generate_content.side_effect = slow_stream
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        generate_with_context("q", {"a.py": "x"}, stream=True, timeout=0.3)
+    assert time.perf_counter() - started < 1.5
+
+@patch("zor.api.render_stream_async")
+@patch("zor.api.genai.GenerativeModel")
+@patch("zor.api.load_config")
+def test_ctrl_c_during_stream_raises_stream_cancelled(mock_load_config, mock_genai_model, mock_render):
+    from zor.api import StreamCancelled
+    mock_load_config.return_value = {"model": "m", "response_cache": False}
+    mock_genai_model.return_value.generate_content.return_value = iter([])
+    mock_render.side_effect = KeyboardInterrupt
+
+    with pytest.raises(StreamCancelled):
+        generate_with_context("q", {"a.py": "x"}, stream=True)
+
+def test_prepare_context_keeps_files_that_references_point_at():
+    lib = "".join(f"beta {i}\n" for i in range(200))
+    main = "".join(f"alpha {i}\n" for i in range(300))
+    context = {"lib.py": lib, "vendor/lib.py": lib, "main.py": main}
+    budget = api.estimate_tokens(main) + api.estimate_tokens(lib) // 2
+    config = {"context_budget_tokens": budget, "max_tokens": 0, "use_index": False, "minify": "off"}
+
+    # Retrieval ranks the copy and main.py above the canonical lib.py
+    packed, manifest = api._prepare_context("q", context, config,
+                                            scores={"vendor/lib.py": 1.0, "main.py": 1.0})
+    assert packed["vendor/lib.py"] == "[zor: identical to lib.py]"
+    assert packed["lib.py"] == lib
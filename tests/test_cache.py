@@ -0,0 +1,59 @@
+import os
+import time
+
+from zor.cache import ResponseCache, get_cache_dir, response_key
+
+
+def _age(cache, key, seconds):
+    path = cache._path(key)
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_cache_dir_follows_xdg(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert get_cache_dir() == tmp_path / "zor"
+
+
+def test_response_key_covers_model_prompt_and_context():
+    key = response_key("m", 0.2, "Why?", {"a.py": "x", "b.py": "y"})
+    assert key == response_key("m", 0.2, "Why?", {"a.py": "x", "b.py": "y"})
+    assert key != response_key("m", 0.5, "Why?", {"a.py": "x", "b.py": "y"})
+    assert key != response_key("other", 0.2, "Why?", {"a.py": "x", "b.py": "y"})
+    assert key != response_key("m", 0.2, "How?", {"a.py": "x", "b.py": "y"})
+    assert key != response_key("m", 0.2, "Why?", {"a.py": "x", "b.py": "z"})
+    # The order files are sent in is part of the prompt
+    assert key != response_key("m", 0.2, "Why?", {"b.py": "y", "a.py": "x"})
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, ["Hello ", "world"], "m")
+    assert cache.get("ab" * 32) == ["Hello ", "world"]
+    status = cache.status()
+    assert status["entries"] == 1 and status["hits"] == 1 and status["misses"] == 1
+    cache.clear()
+    assert cache.status()["entries"] == 0 and cache.stats() == {"hits": 0, "misses": 0}
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResponseCache(tmp_path, max_age_days=1)
+    cache.put("cd" * 32, ["old"])
+    _age(cache, "cd" * 32, 2 * 86400)
+    assert cache.get("cd" * 32) is None
+    assert cache.status()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10**9)
+    keys = [f"{i:02d}" * 32 for i in range(3)]
+    for age, key in zip((30, 20, 10), keys):
+        cache.put(key, ["x" * 100])
+        _age(cache, key, age)
+    # Using the oldest entry makes the middle one the least recently used
+    cache.get(keys[0])
+    cache.max_bytes = sum(os.path.getsize(cache._path(key)) for key in (keys[0], keys[2]))
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == ["x" * 100] and cache.get(keys[2]) == ["x" * 100]
@@ -59,3 +59,320 @@ def test_get_codebase_context_basic():
             assert "excluded_file.py" not in result
             assert "binary_file.exe" not in result
 
+def test_get_codebase_context_parallel_matches_serial(tmp_path):
+    for i in range(5):
+        sub = tmp_path / f"pkg{i}" / "inner"
+        sub.mkdir(parents=True)
+        (sub / f"mod{i}.py").write_text(f"value = {i}\n")
+        (tmp_path / f"pkg{i}" / "__init__.py").write_text("# package\n")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("module.exports = 1;\n")
+
+    config = {"exclude_dirs": ["node_modules"], "use_index": False}
+    with patch('zor.context.load_config', return_value=dict(config, context_workers=1)):
+        serial = context.get_codebase_context(str(tmp_path))
+    with patch('zor.context.load_config', return_value=dict(config, context_workers=8)):
+        parallel = context.get_codebase_context(str(tmp_path))
+
+    assert serial == parallel
+    assert list(parallel) == sorted(parallel)
+    assert len(parallel) == 10
+    assert not any(path.startswith("node_modules") for path in parallel)
+
+def test_exclusion_matcher_agrees_with_legacy_checks():
+    matcher = context.ExclusionMatcher(
+        ["node_modules", ".*", "build*"],
+        ["excluded_file.py", "*.png", "test_?.txt"],
+        [".jpg", ".EXE"],
+    )
+    for name in ["node_modules", ".git", "build", "build_out", "src", "nodes"]:
+        assert matcher.excludes_dir(name) == context.should_exclude_directory(name, matcher.exclude_dirs)
+
+    for name in ["excluded_file.py", "a.png", "test_1.txt", "test_10.txt", "main.py", "photo.JPG", "tool.exe"]:
+        assert matcher.excludes_file(name) == (
+            context.should_exclude_directory(name, matcher.exclude_files)
+            or os.path.splitext(name)[1].lower() in {".jpg", ".exe"}
+        )
+
+def test_exclusion_matcher_paths_and_extend():
+    matcher = context.ExclusionMatcher.from_config(mock_config)
+    assert matcher.excludes_path("src/exclude_this_dir/mod.py") is True
+    assert matcher.excludes_path("src/image.png") is True
+    assert matcher.excludes_path("src/mod.py") is False
+
+    extended = matcher.extend(exclude_files=["mod.py"])
+    assert extended.excludes_path("src/mod.py") is True
+    assert matcher.excludes_path("src/mod.py") is False
+
+def _git(repo, *args):
+    import subprocess
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                   cwd=repo, check=True, capture_output=True)
+
+def test_git_list_files(tmp_path):
+    _git(tmp_path, "init", "-q")
+    (tmp_path / ".gitignore").write_text("ignored.py\n")
+    (tmp_path / "tracked.py").write_text("a = 1\n")
+    (tmp_path / "changed.py").write_text("b = 1\n")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    (tmp_path / "changed.py").write_text("b = 2\n")
+    (tmp_path / "untracked.py").write_text("c = 1\n")
+    (tmp_path / "ignored.py").write_text("d = 1\n")
+
+    files = context.git_list_files(str(tmp_path))
+    assert set(files) == {".gitignore", "tracked.py", "changed.py", "untracked.py"}
+    assert files["tracked.py"] == context.blob_digest(b"a = 1\n")
+    assert files["changed.py"] is None
+    assert files["untracked.py"] is None
+
+def test_git_list_files_outside_repo(tmp_path):
+    with patch("zor.context._find_git_dir", return_value=False):
+        assert context.git_list_files(str(tmp_path)) is None
+
+def test_get_codebase_context_git_reuses_blob_hashes(tmp_path):
+    _git(tmp_path, "init", "-q")
+    (tmp_path / ".gitignore").write_text("ignored.py\n")
+    (tmp_path / "tracked.py").write_text("a = 1\n")
+    (tmp_path / "ignored.py").write_text("d = 1\n")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+
+    with patch('zor.context.load_config', return_value={}):
+        first = context.get_codebase_context(str(tmp_path))
+        assert first == {".gitignore": "ignored.py\n", "tracked.py": "a = 1\n"}
+
+        # A fresh mtime would normally force a re-read, but git vouches for the content
+        os.utime(tmp_path / "tracked.py")
+        stats = {}
+        assert context.get_codebase_context(str(tmp_path), stats=stats) == first
+        assert stats["files_read"] == 0
+
+def test_get_codebase_context_reads_each_file_once(tmp_path):
+    (tmp_path / "a.py").write_text("x = 1\n")
+    (tmp_path / "blob.bin").write_bytes(b"\x00" * 20000)
+
+    stats = {}
+    with patch('zor.context.load_config', return_value={"use_index": False}):
+        with patch("zor.context.is_binary_file", side_effect=AssertionError("second open")):
+            result = context.get_codebase_context(str(tmp_path), stats=stats)
+
+    assert result == {"a.py": "x = 1\n"}
+    assert stats["files_read"] == 2
+    # Only the sniffed prefix of the binary file is read
+    assert stats["bytes_read"] == len("x = 1\n") + context.SNIFF_SIZE
+
+def test_extension_stats_verdicts():
+    ext_stats = context.ExtensionStats(min_samples=3)
+    for i in range(3):
+        ext_stats.add(f"f{i}.py", False)
+        ext_stats.add(f"f{i}.woff", True)
+        ext_stats.add(f"f{i}.dat", i == 0)
+        ext_stats.add(f"Makefile{i}", False)
+    assert ext_stats.verdict("new.py") == "text"
+    assert ext_stats.verdict("new.WOFF") == "binary"
+    assert ext_stats.verdict("new.dat") is None
+    assert ext_stats.verdict("Makefile") is None
+
+def test_binary_extension_verdict_skips_reading(tmp_path):
+    (tmp_path / "font.woff").write_bytes(b"wOFF" + b"\x00" * 100)
+    stats = {}
+    with patch('zor.context.load_config', return_value={"use_index": False}):
+        with patch.object(context.ExtensionStats, "verdict", return_value="binary"):
+            assert context.get_codebase_context(str(tmp_path), stats=stats) == {}
+    assert stats["files_read"] == 0
+    assert stats["sniff_skipped"] == 1
+
+def test_text_extension_verdict_still_sniffs(tmp_path):
+    # NUL bytes are valid UTF-8, so only the sniff catches this file
+    (tmp_path / "blob.txt").write_bytes(b"abc\x00\x00\x00\x01\x02" * 100)
+    (tmp_path / "notes.txt").write_text("notes\n")
+    with patch('zor.context.load_config', return_value={"use_index": False, "use_git_index": False}):
+        with patch.object(context.ExtensionStats, "verdict", return_value="text"):
+            assert context.get_codebase_context(str(tmp_path)) == {"notes.txt": "notes\n"}
+
+PY_SOURCE = '''import os
+
+
+def helper():
+    return 1
+
+
+@decorated
+class Thing:
+    """A thing"""
+    size = 3
+
+    def grow(self):
+        return self.size + 1
+
+    async def shrink(self):
+        return self.size - 1
+
+
+def helper():
+    return 2
+'''
+
+def test_chunk_source_python_symbols():
+    chunks = context.chunk_files({"pkg/mod.py": PY_SOURCE})["pkg/mod.py"]
+    assert [(c["id"], c["kind"]) for c in chunks] == [
+        ("pkg/mod.py#<module>", "module"),
+        ("pkg/mod.py#helper", "function"),
+        ("pkg/mod.py#Thing", "class"),
+        ("pkg/mod.py#Thing.grow", "method"),
+        ("pkg/mod.py#Thing.shrink", "method"),
+        ("pkg/mod.py#helper~2", "function"),
+    ]
+    # Chunks cover the file contiguously, decorators included
+    assert chunks[0]["start"] == 1 and chunks[-1]["end"] == PY_SOURCE.count("\n")
+    assert all(a["end"] + 1 == b["start"] for a, b in zip(chunks, chunks[1:]))
+    assert context.chunk_text(PY_SOURCE, chunks[2]).startswith("@decorated\nclass Thing:")
+
+def test_chunk_source_falls_back_for_other_languages():
+    js = "import x from 'y';\n\nexport function foo(a) {\n  return a;\n}\n\nconst bar = (b) => {\n  return b;\n};\nfoo(1);\n"
+    chunks = context.chunk_source(js, context.chunk_language("app.js"))
+    assert [(c["name"], c["start"], c["end"]) for c in chunks] == [
+        ("<module>", 1, 2), ("foo", 3, 6), ("bar", 7, 9), ("<module>", 10, 10)
+    ]
+    # Broken Python still gets chunked heuristically
+    assert [c["name"] for c in context.chunk_source("def ok():\n    pass\ndef broken(:\n", "python")] == ["ok", "broken"]
+
+def test_render_elided_keeps_selected_chunks():
+    chunks = context.chunk_files({"mod.py": PY_SOURCE})["mod.py"]
+    view = context.render_elided(PY_SOURCE, chunks, {"mod.py#<module>", "mod.py#Thing.grow"})
+    assert view.startswith("import os\n")
+    assert "def grow(self):" in view
+    assert "def shrink" not in view
+    assert "... [elided by zor: lines 4-12: helper, Thing]\n" in view
+    assert view.endswith("[elided by zor: lines 16-21: Thing.shrink, helper]\n")
+
+def test_chunk_files_cached_in_index(tmp_path):
+    from zor.index import FileIndex
+    with FileIndex(tmp_path) as index:
+        first = context.chunk_files({"a.py": PY_SOURCE}, index)
+    with patch("zor.context.chunk_source", side_effect=AssertionError("re-parsed")):
+        with FileIndex(tmp_path) as index:
+            second = context.chunk_files({"b.py": PY_SOURCE}, index)
+    assert [c["name"] for c in first["a.py"]] == [c["name"] for c in second["b.py"]]
+    assert second["b.py"][1]["id"] == "b.py#helper"
+
+def test_chunk_files_lazy_context_reuses_index_digests(tmp_path):
+    from zor.index import FileIndex
+    (tmp_path / "a.py").write_text(PY_SOURCE)
+    (tmp_path / "notes.md").write_text("# Title\n\nbody\n")
+    with patch("zor.context.load_config", return_value={"use_git_index": False}):
+        lazy = context.get_codebase_context(str(tmp_path), lazy=True)
+    with FileIndex(tmp_path) as index:
+        first = context.chunk_files(lazy, index)
+    # Cached chunks are found by the digest the index holds, without reading
+    with patch("zor.context.read_text", side_effect=AssertionError("file read")):
+        with FileIndex(tmp_path) as index:
+            second = context.chunk_files(lazy, index)
+    assert second == first
+    assert second["a.py"][1]["id"] == "a.py#helper"
+
+def test_lazy_context_matches_eager(tmp_path):
+    (tmp_path / "a.py").write_text("print('a')\n")
+    (tmp_path / "crlf.txt").write_bytes(b"one\r\ntwo\r\n")
+    (tmp_path / "empty.py").write_text("")
+    (tmp_path / "image.bin").write_bytes(b"\x00\x01\x02")
+
+    with patch("zor.context.load_config", return_value={}):
+        eager = context.get_codebase_context(str(tmp_path))
+        # The second run answers from the index without loading any text
+        lazy = context.get_codebase_context(str(tmp_path), lazy=True)
+
+    assert isinstance(lazy, context.LazyContext)
+    assert dict(lazy) == eager == {"a.py": "print('a')\n", "crlf.txt": "one\ntwo\n"}
+    assert lazy.total_size() == len("print('a')\n") + len(b"one\r\ntwo\r\n")
+
+def test_lazy_context_subset_and_overrides(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    lazy = context.LazyContext(str(tmp_path), {"a.py": 6, "b.py": 6})
+
+    subset = lazy.subset(["b.py"], {"b.py": "b = ...\n"})
+    assert dict(subset) == {"b.py": "b = ...\n"}
+    assert subset.size("b.py") == len("b = ...\n")
+
+    # Files are read on access, so later edits are visible
+    (tmp_path / "a.py").write_text("a = 2\n")
+    assert lazy["a.py"] == "a = 2\n"
+    (tmp_path / "a.py").unlink()
+    assert lazy["a.py"] == ""
+
+
+def test_context_scope_covers():
+    scope = context.ContextScope(["services/billing", "libs/common/"], include=["*.py"], exclude=["test_*.py"])
+    assert scope.covers("services/billing/app.py")
+    assert scope.covers("libs/common/util.py")
+    assert not scope.covers("services/billingx/app.py")
+    assert not scope.covers("services/search/app.py")
+    assert not scope.covers("services/billing/README.md")
+    assert not scope.covers("libs/common/tests/test_util.py")
+    assert not context.ContextScope(["."]).restricted
+
+
+def test_context_scope_from_workspace_config():
+    assert context.ContextScope.from_options(config={"workspace": ["a", "b"]}).roots == ["a", "b"]
+    assert context.ContextScope.from_options(["c"], config={"workspace": ["a"]}).roots == ["c"]
+
+
+@pytest.mark.parametrize("use_git", [False, True])
+def test_get_codebase_context_scoped_roots(tmp_path, use_git):
+    for path in ["services/billing/app.py", "services/search/app.py", "libs/common/util.py", "top.py"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(f"# {path}\n")
+    if use_git:
+        _git(tmp_path, "init", "-q")
+    scope = context.ContextScope(["services/billing", "libs/common"])
+
+    with patch('zor.context.load_config', return_value={"use_index": False, "use_git_index": use_git}):
+        collected = context.get_codebase_context(str(tmp_path), scope=scope)
+    assert sorted(collected) == ["libs/common/util.py", "services/billing/app.py"]
+
+
+@pytest.mark.parametrize("use_git", [False, True])
+def test_get_codebase_context_file_root(tmp_path, use_git):
+    for path in ["services/billing/app.py", "services/search/app.py", "top.py"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(f"# {path}\n")
+    if use_git:
+        _git(tmp_path, "init", "-q")
+    scope = context.ContextScope(["top.py", "services/search/app.py"])
+
+    with patch('zor.context.load_config', return_value={"use_index": False, "use_git_index": use_git}):
+        collected = context.get_codebase_context(str(tmp_path), scope=scope)
+    assert collected == {"services/search/app.py": "# services/search/app.py\n", "top.py": "# top.py\n"}
+
+
+def test_exclusion_matcher_explain():
+    matcher = context.ExclusionMatcher(["node_modules"], ["*.log"], [".png"])
+    assert matcher.explain("web/node_modules/lib/index.js") == "exclude_dirs: node_modules"
+    assert matcher.explain("./logs/server.log") == "exclude_files: *.log"
+    assert matcher.explain("docs/logo.PNG") == "exclude_extensions: .png"
+    assert matcher.explain("src/app.py") is None
+
+
+@pytest.mark.parametrize("use_git", [False, True])
+def test_get_codebase_context_explain(tmp_path, use_git):
+    files = {"app.py": "x = 1\n", "node_modules/lib/index.js": "x\n", "yarn.lock": "x\n", "debug.log": "x\n"}
+    for path, text in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    (tmp_path / "blob.dat").write_bytes(b"\x00\x01\x02")
+    if use_git:
+        _git(tmp_path, "init", "-q")
+    config = {"use_index": False, "use_git_index": use_git,
+              "exclude_dirs": ["node_modules"], "exclude_files": ["*.log"], "exclude_extensions": []}
+
+    stats = {}
+    with patch('zor.context.load_config', return_value=config):
+        collected = context.get_codebase_context(str(tmp_path), stats=stats, explain=True)
+    assert list(collected) == ["app.py"]
+    assert stats["excluded:exclude_dirs: node_modules"] == 1
+    assert stats["excluded:exclude_files: *.log"] == 1
+    assert stats["excluded:generated: lockfile"] == 1
+    assert stats["excluded:binary"] == 1
+    assert stats["seconds_total"] >= stats["seconds_walk"] > 0
@@ -91,3 +91,31 @@ def test_send_query_with_mocked_litellm(tmp_path, monkeypatch):
     res = ci.send_query("Please summarize", start_path=tmp_path)
     assert res.get("sent") is True
     assert "response" in res
+
+
+def test_find_context_file_skips_excluded_dirs(tmp_path, monkeypatch):
+    from zor.context import ExclusionMatcher
+
+    monkeypatch.setattr(ci, "DEFAULT_GLOBAL", tmp_path / "missing.md")
+    vendored = tmp_path / "repo" / "node_modules" / "pkg"
+    vendored.mkdir(parents=True)
+    (tmp_path / "repo" / ".git").mkdir()
+    (vendored / ".context.md").write_text("vendored facts")
+    (tmp_path / "repo" / ".context.md").write_text("project facts")
+
+    matcher = ExclusionMatcher(["node_modules"])
+    assert ci.find_context_file(start_path=vendored).read_text() == "vendored facts"
+    assert ci.find_context_file(start_path=vendored, matcher=matcher).read_text() == "project facts"
+
+
+def test_find_context_file_ignores_excluded_dirs_above_project(tmp_path, monkeypatch):
+    from zor.context import ExclusionMatcher
+
+    monkeypatch.setattr(ci, "DEFAULT_GLOBAL", tmp_path / "missing.md")
+    repo = tmp_path / ".work" / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / "src").mkdir()
+    (repo / ".context.md").write_text("project facts")
+
+    matcher = ExclusionMatcher([".*", "node_modules"])
+    assert ci.find_context_file(start_path=repo / "src", matcher=matcher).read_text() == "project facts"
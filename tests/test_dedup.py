@@ -0,0 +1,68 @@
+import pytest
+
+from zor import dedup
+from zor.dedup import dedup_context, find_duplicates, minhash_signature
+from zor.index import FileIndex
+
+
+BASE = "".join(f"def handler_{n}(request):\n    return respond(request, code={n})\n\n" for n in range(40))
+
+
+def test_exact_duplicates_reference_canonical():
+    context = {"src/client.py": BASE, "vendor/lib/client.py": BASE, "small.py": "x = 1\n", "copy.py": "x = 1\n"}
+    result, duplicates = dedup_context(context, {"dedup_threshold": 1.0, "use_index": False})
+    assert duplicates == {"vendor/lib/client.py": ("src/client.py", 1.0)}
+    assert result["vendor/lib/client.py"] == "[zor: identical to src/client.py]"
+    # Files too small to be worth a reference are left alone
+    assert result["small.py"] == result["copy.py"] == "x = 1\n"
+
+
+def test_keep_paths_are_never_replaced():
+    context = {"a.py": BASE, "deep/b.py": BASE}
+    result, duplicates = dedup_context(context, {"dedup_threshold": 1.0, "use_index": False}, keep=["deep/b.py"])
+    assert duplicates == {"a.py": ("deep/b.py", 1.0)}
+    assert result["deep/b.py"] == BASE
+
+
+def test_near_duplicates_found_with_minhash():
+    pytest.importorskip("numpy")
+    edited = BASE.replace("code=7)", "code=7, retry=True)")
+    other = "".join(f"class Model{n}:\n    field_{n} = Column(Integer)\n\n" for n in range(40))
+    context = {"a/models.py": other, "a/api.py": BASE, "migrations/0001_api.py": edited}
+
+    duplicates = find_duplicates(context, threshold=0.8)
+    assert set(duplicates) == {"migrations/0001_api.py"}
+    canonical, similarity = duplicates["migrations/0001_api.py"]
+    assert canonical == "a/api.py"
+    assert 0.8 <= similarity < 1.0
+    assert "near-duplicate of a/api.py" in dedup.reference_line(canonical, similarity)
+
+
+def test_chained_near_duplicates_keep_files_far_from_canonical():
+    pytest.importorskip("numpy")
+    # Each file edits five more handlers than the one before it, so only
+    # neighbours in the chain are above the threshold
+    handlers = [f"def handler_{n}(request):\n    return respond(request, code={n})\n\n" for n in range(60)]
+    context = {}
+    for step, path in enumerate(["a.py", "b/b.py", "c/c/c.py", "d/d/d/d.py", "e/e/e/e/e.py"]):
+        for n in range(5 * (step - 1), 5 * step) if step else ():
+            handlers[n] = f"class Other_{step}_{n}:\n    value = compute_{n}({step})\n\n"
+        context[path] = "".join(handlers)
+
+    duplicates = find_duplicates(context, threshold=0.85)
+    assert all(canonical == "a.py" and similarity >= 0.85 for canonical, similarity in duplicates.values())
+    assert "b/b.py" in duplicates
+    assert not {"c/c/c.py", "d/d/d/d.py", "e/e/e/e/e.py"} & set(duplicates)
+
+
+def test_signatures_cached_in_index(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    signature = minhash_signature(BASE)
+    assert len(signature) == dedup.NUM_PERM
+    context = {"a.py": BASE, "b.py": BASE + "# trailing comment\n"}
+    with FileIndex(tmp_path) as index:
+        find_duplicates(context, index=index)
+
+    monkeypatch.setattr(dedup, "minhash_signature", lambda text: pytest.fail("signature recomputed"))
+    with FileIndex(tmp_path) as index:
+        assert "b.py" in find_duplicates(context, index=index)
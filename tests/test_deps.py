@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from zor import deps
+from zor.context import get_codebase_context
+from zor.deps import build_graph, dependency_context
+from zor.index import FileIndex
+
+CONTEXT = {
+    "pkg/__init__.py": "",
+    "pkg/core.py": "import os\nfrom .util import helper\n",
+    "pkg/util.py": "def helper():\n    pass\n",
+    "pkg/cli.py": "from pkg import core\nimport pkg.util\n",
+    "src/lib2/mod.py": "from lib2 import other\n",
+    "src/lib2/other.py": "",
+    "web/app.js": "import React from 'react';\nimport { api } from './api';\nconst s = require('../styles/site.css');\n",
+    "web/api/index.ts": "export * from './client';\n",
+    "web/api/client.ts": "",
+    "styles/site.css": "",
+}
+
+
+def test_build_graph_resolves_python_and_js_imports():
+    graph = build_graph(CONTEXT)
+    assert graph.imports["pkg/core.py"] == {"pkg/util.py"}
+    assert graph.imports["pkg/cli.py"] == {"pkg/core.py", "pkg/util.py"}
+    assert graph.imports["src/lib2/mod.py"] == {"src/lib2/other.py"}
+    assert graph.imports["web/app.js"] == {"web/api/index.ts", "styles/site.css"}
+    assert graph.imports["web/api/index.ts"] == {"web/api/client.ts"}
+    assert graph.importers["pkg/util.py"] == {"pkg/core.py", "pkg/cli.py"}
+
+
+def test_neighbours_by_hops():
+    graph = build_graph(CONTEXT)
+    assert graph.neighbours("web/api/client.ts", 1) == {"web/api/client.ts": 0, "web/api/index.ts": 1}
+    assert graph.neighbours("web/api/client.ts", 2)["web/app.js"] == 2
+
+
+def test_dependency_context_selects_neighbourhood():
+    with patch("zor.deps.open_index", return_value=None):
+        selected = dependency_context("pkg/core.py", CONTEXT, hops=1)
+        assert set(selected) == {"pkg/core.py", "pkg/util.py", "pkg/cli.py"}
+        assert dependency_context("missing.py", CONTEXT) is None
+
+
+def test_imports_cached_per_file(tmp_path):
+    with FileIndex(tmp_path) as index:
+        build_graph(CONTEXT, index)
+    changed = dict(CONTEXT, **{"pkg/util.py": "from pkg import cli\n"})
+    with patch("zor.deps.python_imports", wraps=deps.python_imports) as parse:
+        with FileIndex(tmp_path) as index:
+            graph = build_graph(changed, index)
+    # Only the edited file is parsed again
+    assert [call.args[0] for call in parse.call_args_list] == ["from pkg import cli\n"]
+    assert graph.imports["pkg/util.py"] == {"pkg/cli.py"}
+
+
+def test_lazy_graph_reuses_index_digests_without_reading(tmp_path):
+    for path, text in CONTEXT.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    config = {"use_git_index": False}
+    with patch("zor.context.load_config", return_value=config):
+        context = get_codebase_context(str(tmp_path), lazy=True)
+    first = deps.load_graph(context, str(tmp_path), config)
+
+    # Every file's imports are cached under the digest the index holds
+    with patch("zor.context.read_text", side_effect=AssertionError("file read")):
+        graph = deps.load_graph(context, str(tmp_path), config)
+    assert graph.imports == first.imports
+    assert graph.imports["pkg/core.py"] == {"pkg/util.py"}
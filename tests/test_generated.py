@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from zor.context import get_codebase_context
+from zor.generated import byte_entropy, classify, classify_name, classify_sample
+from zor.index import FileIndex
+
+
+def test_classify_name():
+    assert classify_name("web/package-lock.json") == "lockfile"
+    assert classify_name("poetry.lock") == "lockfile"
+    assert classify_name("static/app.min.js") == "generated"
+    assert classify_name("proto/user_pb2.py") == "generated"
+    assert classify_name("static/app.js.map") == "generated"
+    assert classify_name("src/app.js") is None
+
+
+def test_classify_sample_markers():
+    assert classify_sample(b"// Code generated by protoc-gen-go. DO NOT EDIT.\npackage x\n") == "generated"
+    assert classify_sample(b"# @generated\nx = 1\n") == "generated"
+    # Prose about generated code is not itself generated
+    assert classify_sample(b'"""Skip files marked "generated by" a tool"""\n') is None
+    assert classify_sample(b"def f():\n    return 1\n" * 100) is None
+    # A hand-written "do not edit" note without a generator banner
+    assert classify_sample(b"# Do not edit the order of these entries\nA = 1\n") is None
+
+
+def test_classify_sample_minified_and_data():
+    assert classify_sample(b"var a=1,b=2,c=a+b;" * 250) == "minified"
+    blob = bytes(range(33, 127)) * 30
+    assert byte_entropy(blob) > 6
+    assert classify_sample(b"\n".join(blob[i:i + 200] for i in range(0, len(blob), 200))) == "data"
+
+
+def test_long_prose_lines_are_not_minified():
+    record = b'{"request_id": "r-1", "title": "Speed up", "body": "' + b"words and more words " * 30 + b'"}\n'
+    assert classify_sample(record * 10, "requests.jsonl") is None
+    assert classify_sample(record * 10, "notes.md") is None
+    # Code with ordinary spacing and long lines is not minified either
+    assert classify_sample(b"x = [" + b"1, " * 500 + b"]\n", "table.py") is None
+    assert classify_sample(b"var a=1,b=2,c=a+b;" * 250, "bundle.js") == "minified"
+
+
+def test_classify_prefers_name():
+    assert classify("yarn.lock", b"x") == "lockfile"
+
+
+def test_collection_excludes_generated_and_caches_verdict(tmp_path):
+    (tmp_path / "app.py").write_text("x = 1\n")
+    (tmp_path / "package-lock.json").write_text("{}\n")
+    (tmp_path / "bundle.js").write_text("var a=1,b=2,c=a+b;" * 250)
+    config = {"use_git_index": False}
+
+    with patch("zor.context.load_config", return_value=config):
+        context = get_codebase_context(str(tmp_path))
+    assert list(context) == ["app.py"]
+
+    with FileIndex(tmp_path) as index:
+        assert index.get("bundle.js")["generated"] == "minified"
+        assert index.status()["generated_files"] == 1
+
+    with patch("zor.context.load_config", return_value=dict(config, exclude_generated=False)):
+        context = get_codebase_context(str(tmp_path))
+    assert list(context) == ["app.py", "bundle.js", "package-lock.json"]
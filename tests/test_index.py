@@ -0,0 +1,108 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+from zor import context
+from zor.index import FileIndex, blob_digest, text_digest, RACY_WINDOW_NS
+
+
+def _age(path, seconds=60):
+    """Push a file's mtime into the past so it is outside the racy window"""
+    st = os.stat(path)
+    old = st.st_mtime_ns - seconds * 1_000_000_000
+    os.utime(path, ns=(old, old))
+
+
+def test_blob_digest_matches_git(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"hello\n")
+    result = subprocess.run(["git", "hash-object", str(path)], capture_output=True, text=True)
+    if result.returncode == 0:
+        assert blob_digest(b"hello\n") == result.stdout.strip()
+    assert blob_digest(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_index_roundtrip_and_lookup(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("x = 1\n")
+    _age(path)
+    st = os.stat(path)
+
+    with FileIndex(tmp_path) as index:
+        index.put("a.py", st, "abc", False, "x = 1\n")
+
+    with FileIndex(tmp_path) as index:
+        entry = index.lookup("a.py", st)
+        assert entry["text"] == "x = 1\n"
+        assert entry["digest"] == "abc"
+        assert index.status()["files"] == 1
+
+        # Any stat change invalidates the entry
+        path.write_text("x = 2\n")
+        assert index.lookup("a.py", os.stat(path)) is None
+
+    assert (tmp_path / ".zor" / ".gitignore").exists()
+
+
+def test_index_ignores_racy_entries(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("x = 1\n")
+    st = os.stat(path)
+
+    with FileIndex(tmp_path) as index:
+        with patch("zor.index.time.time_ns", return_value=st.st_mtime_ns + RACY_WINDOW_NS // 2):
+            index.put("a.py", st, "abc", False, "x = 1\n")
+        assert index.lookup("a.py", st) is None
+
+
+def test_index_prune(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("x = 1\n")
+    st = os.stat(path)
+
+    with FileIndex(tmp_path) as index:
+        index.put("a.py", st, "abc", False, "x = 1\n")
+        index.put("b.py", st, "def", False, "y = 1\n")
+        index.prune({"a.py"})
+
+    with FileIndex(tmp_path) as index:
+        assert "a.py" in index
+        assert "b.py" not in index
+
+
+def test_index_prune_drops_orphaned_derived_values(tmp_path, monkeypatch):
+    path = tmp_path / "a.py"
+    path.write_text("x = 1\n")
+    st = os.stat(path)
+
+    with FileIndex(tmp_path) as index:
+        index.put("a.py", st, "abc", False, "x = 1\n")
+        index.put_derived("tokens", {text_digest("x = 1\n"): 4, text_digest("old"): 1})
+        # Recently used values outlive their file
+        index.prune({"a.py"})
+        assert len(list(index.derived_rows())) == 2
+
+        monkeypatch.setattr("zor.index.DERIVED_GRACE_SECONDS", -1)
+        index.prune({"a.py"})
+        assert list(index.derived_rows()) == [("tokens", text_digest("x = 1\n"), "4")]
+
+        index.put("a.py", st, "abd", False, "x = 2\n")
+        index.prune({"a.py"})
+        assert list(index.derived_rows()) == []
+
+
+def test_get_codebase_context_reuses_index(tmp_path):
+    path = tmp_path / "main.py"
+    path.write_text("print('hi')\n")
+    _age(path)
+
+    stats = {}
+    with patch("zor.context.load_config", return_value={}):
+        first = context.get_codebase_context(str(tmp_path))
+        with patch("zor.context.open", side_effect=AssertionError("file was re-read"), create=True):
+            second = context.get_codebase_context(str(tmp_path), stats=stats)
+
+    assert first == second == {"main.py": "print('hi')\n"}
+    assert stats["reused"] == 1
+    assert stats["bytes_read"] == 0
+    assert ".zor" not in "".join(second)
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import pytest
+
+from zor.config import DEFAULT_CONFIG
+from zor.context import LazyContext, get_codebase_context
+from zor.large import LargeFilePolicy, focus_large_files, head_tail, hits_view, is_large_view
+
+
+def _numbered(n):
+    return "".join(f"line {i}\n" for i in range(n))
+
+
+def test_head_tail_cuts_at_line_boundaries(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_text(_numbered(5000))
+    view = head_tail(str(path), path.stat().st_size, window_bytes=100)
+
+    header, rest = view.split("\n", 1)
+    assert is_large_view(view) and "head and tail shown" in header
+    head, marker_and_tail = rest.split("... [elided by zor: bytes ", 1)
+    assert head.startswith("line 0\n") and head.endswith("\n")
+    assert marker_and_tail.split("\n", 1)[1].endswith("line 4999\n")
+    assert len(view) < 400
+
+
+def test_head_tail_skips_binary(tmp_path):
+    path = tmp_path / "blob.bin"
+    path.write_bytes(b"\x00" * 5000)
+    assert head_tail(str(path), 5000, window_bytes=100) is None
+
+
+def test_hits_view_shows_matching_lines(tmp_path):
+    lines = [f"filler {i}\n" for i in range(3000)]
+    lines[1500] = "def handle_payment(order):\n"
+    path = tmp_path / "big.py"
+    path.write_text("".join(lines))
+    view = hits_view(str(path), path.stat().st_size, ["payment"], window_bytes=1000, context_lines=1)
+
+    assert "filler 1499\ndef handle_payment(order):\nfiller 1501\n" in view
+    assert "filler 0\n" not in view
+    assert view.count("... [elided by zor: bytes") == 2
+
+
+def test_policy_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        LargeFilePolicy(policy="shrink")
+
+
+def test_policy_default_matches_config_default():
+    assert LargeFilePolicy.from_config({}).policy == DEFAULT_CONFIG["large_file_policy"]
+    assert LargeFilePolicy().policy == DEFAULT_CONFIG["large_file_policy"]
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_collection_includes_large_files_as_views(tmp_path, lazy):
+    (tmp_path / "small.py").write_text("x = 1\n")
+    body = "".join(f"def f{i}(a):\n    return a + {i}\n\n" for i in range(400))
+    (tmp_path / "big.py").write_text(body)
+    config = {"use_index": False, "use_git_index": False, "large_file_size": 1000, "large_file_policy": "outline"}
+
+    with patch("zor.context.load_config", return_value=config):
+        context = get_codebase_context(str(tmp_path), lazy=lazy)
+
+    assert context["small.py"] == "x = 1\n"
+    view = context["big.py"]
+    assert is_large_view(view) and "outline" in view.split("\n", 1)[0]
+    assert "def f399(a):\n    ...\n" in view and "return a" not in view
+
+
+def test_collection_excludes_large_files(tmp_path):
+    (tmp_path / "big.txt").write_text(_numbered(500))
+    config = {"use_index": False, "use_git_index": False, "large_file_size": 1000, "large_file_policy": "exclude"}
+    with patch("zor.context.load_config", return_value=config):
+        assert "big.txt" not in get_codebase_context(str(tmp_path))
+
+
+def test_focus_large_files_uses_prompt_terms(tmp_path):
+    lines = [f"filler {i}\n" for i in range(3000)]
+    lines[2000] = "checkout_total = 0\n"
+    path = tmp_path / "big.txt"
+    path.write_text("".join(lines))
+    size = path.stat().st_size
+    context = LazyContext(str(tmp_path), {"small.txt": 3}, {"big.txt": head_tail(str(path), size, 500)})
+    config = {"large_file_policy": "hits", "large_file_window_bytes": 500}
+
+    focused = focus_large_files(context, "Where is the checkout_total computed?", config, str(tmp_path))
+    assert "checkout_total = 0\n" in focused["big.txt"]
+    assert focus_large_files(context, "checkout_total", {"large_file_policy": "head_tail"}) is context
+
+
+def test_outline_view_cached_by_stat_key(tmp_path):
+    body = "".join(f"def f{i}(a):\n    return a + {i}\n\n" for i in range(400))
+    (tmp_path / "big.py").write_text(body)
+    config = {"use_git_index": False, "large_file_size": 1000, "large_file_policy": "outline"}
+
+    with patch("zor.context.load_config", return_value=config):
+        first = get_codebase_context(str(tmp_path), lazy=True)["big.py"]
+        # An unchanged large file is not parsed again on the next collection
+        with patch("zor.large._outline_file", side_effect=AssertionError("re-parsed")):
+            second = get_codebase_context(str(tmp_path), lazy=True)["big.py"]
+        assert second == first and "def f399(a):\n    ...\n" in second
+
+        (tmp_path / "big.py").write_text(body + "def extra(b):\n    return b\n")
+        changed = get_codebase_context(str(tmp_path), lazy=True)["big.py"]
+    assert "def extra(b):\n    ...\n" in changed
@@ -113,3 +113,44 @@ def test_config_command_display():
             # API key should be masked
             api_key_call = [call for call in mock_echo.call_args_list if "api_key" in call[0][0]][0]
             assert "***** (configured)" in api_key_call[0][0]
+
+@patch("zor.main.generate_with_context")
+@patch("zor.main.get_codebase_context")
+def test_interactive_stream_cancel_keeps_session(mock_get_context, mock_generate):
+    from zor.api import StreamCancelled
+    from zor.main import interactive
+    mock_get_context.return_value = {"file.py": "content"}
+    mock_generate.side_effect = [StreamCancelled("partial"), "Second answer"]
+
+    with patch("zor.main.load_config", return_value={"watch": False, "stream": True}), \
+            patch("typer.prompt", side_effect=["first question", "second question", "exit"]), \
+            patch("typer.echo") as mock_echo:
+        interactive(full_context=True)
+
+    assert mock_generate.call_count == 2
+    # The cancelled exchange is left out of the history sent with the next prompt
+    second_context = mock_generate.call_args.args[1]
+    assert "_conversation_history" not in second_context
+    assert mock_generate.call_args.kwargs == {"stream": True}
+    assert any("cancelled" in str(call) for call in mock_echo.call_args_list)
+
+@patch("zor.main.edit_file")
+@patch("zor.main.show_diff")
+@patch("zor.main.generate_with_context")
+@patch("zor.main.get_codebase_context")
+def test_edit_sends_full_text_of_large_target(mock_get_context, mock_generate, mock_show_diff, mock_edit_file,
+                                              tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    original = "def f():\n    return 1\n" * 1000
+    (tmp_path / "big.py").write_text(original)
+    # Collection only kept the large-file view of the target
+    mock_get_context.return_value = {"big.py": "[zor: large file, 24000 bytes; outline, bodies elided]\ndef f(): ...\n",
+                                     "other.py": "x = 1\n"}
+    mock_generate.return_value = "```\nnew\n```"
+
+    with patch("typer.confirm", return_value=False), patch("zor.main.api_key_valid", True):
+        edit("big.py", "rename f", full_context=True)
+
+    sent = mock_generate.call_args.args[1]
+    assert sent["big.py"] == original
+    assert sent["other.py"] == "x = 1\n"
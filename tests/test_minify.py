@@ -0,0 +1,114 @@
+from zor.context import LazyContext
+from zor.minify import (
+    minify_context,
+    minify_text,
+    strip_c_comments,
+    strip_hash_comments,
+    strip_python,
+)
+
+LICENSE = "# Copyright (c) Example\n# Licensed under MIT\n# See LICENSE\n"
+
+
+def test_strip_python_comments_and_docstrings():
+    source = (
+        '"""Module doc"""\n'
+        "import os  # why\n"
+        "\n"
+        "\n"
+        "\n"
+        "def f():\n"
+        '    """Only a docstring"""\n'
+        "\n"
+        "class A:\n"
+        "    '''Doc'''\n"
+        "    # note\n"
+        "    x = '# not a comment'\n"
+    )
+    result = strip_python(source)
+    assert "doc" not in result.lower()
+    assert "# why" not in result and "# note" not in result
+    assert "x = '# not a comment'" in result
+    # A body left empty keeps a statement so the code still parses
+    assert "def f():\n    ...\n" in result
+    compile(result, "m.py", "exec")
+
+
+def test_strip_python_keeps_shebang_and_bad_source():
+    assert strip_python("#!/usr/bin/env python\nx = 1\n").startswith("#!/usr/bin/env python")
+    broken = "def f(:\n    '''doc\n"
+    assert strip_python(broken) == broken
+
+
+def test_strip_c_comments_respects_strings():
+    source = (
+        "/* header */\n"
+        "const url = 'http://example.com'; // trailing\n"
+        "const t = `a /* b */ c`;\n"
+        "let x = a/* inline */b;\n"
+    )
+    result = strip_c_comments(source)
+    assert result == "const url = 'http://example.com';\nconst t = `a /* b */ c`;\nlet x = a b;\n"
+
+
+def test_strip_c_comments_skips_regex_literals():
+    source = (
+        "const re = /\\/\\//g; // gone\n"
+        "if (/[/]/.test(s)) return /a\\/\\/b/;\n"
+        "const half = total / 2; // gone too\n"
+        "const ratio = a / b / c;\n"
+    )
+    assert strip_c_comments(source) == (
+        "const re = /\\/\\//g;\n"
+        "if (/[/]/.test(s)) return /a\\/\\/b/;\n"
+        "const half = total / 2;\n"
+        "const ratio = a / b / c;\n"
+    )
+
+
+def test_strip_css_keeps_double_slash():
+    source = "/* reset */\nbody { background: url(http://x/y.png); }\n"
+    assert strip_c_comments(source, line_comments=False) == "body { background: url(http://x/y.png); }\n"
+
+
+def test_strip_hash_comments():
+    source = "#!/bin/sh\n# setup\necho \"# kept\" '# kept' ${#var} # gone\n"
+    assert strip_hash_comments(source) == "#!/bin/sh\necho \"# kept\" '# kept' ${#var}\n"
+
+
+def test_minify_text_light_squeezes_blank_lines():
+    result = minify_text("a = 1   \n\n\n\nb = 2\n", "python", "light")
+    assert result["text"] == "a = 1\n\nb = 2\n"
+    assert result["tokens_saved"] >= 0
+
+
+def test_minify_context_collapses_headers_and_keeps_target():
+    body = "\n\n\n\n\n\n\n\n".join(f"value_{n} = {n}" for n in range(20)) + "\n"
+    context = {"a.py": LICENSE + body, "b.py": LICENSE + body, "c.py": LICENSE + body, "README": "x"}
+    minified, report = minify_context(context, {"minify": "light", "use_index": False}, keep=["c.py"])
+
+    assert minified["a.py"].startswith(LICENSE)
+    assert minified["b.py"].startswith("[zor: same header as a.py]\n")
+    assert minified["c.py"] == context["c.py"]
+    assert minified["README"] == "x"
+    assert report["files"] == 2 and report["tokens_saved"] > 0
+    assert report["header_owners"] == ["a.py"]
+
+
+def test_minify_context_off_returns_context_unchanged():
+    context = {"a.py": "# c\n\n\n\nx = 1\n"}
+    minified, report = minify_context(context, {"minify": "off"})
+    assert minified is context
+    assert report == {"files": 0, "tokens_saved": 0, "header_owners": []}
+
+
+def test_minify_context_light_keeps_small_savings_lazy(tmp_path):
+    (tmp_path / "a.py").write_text("x = 1  \n\n\n\ny = 2\n")
+    (tmp_path / "b.py").write_text("".join(f"value_{n} = {n}\n\n\n\n\n" for n in range(50)))
+    context = LazyContext(tmp_path, {"a.py": 20, "b.py": 2000})
+    minified, report = minify_context(context, {"minify": "light", "use_index": False})
+
+    assert not minified.is_overridden("a.py")
+    assert minified["a.py"] == "x = 1  \n\n\n\ny = 2\n"
+    assert minified.is_overridden("b.py")
+    assert report["files"] == 1
@@ -0,0 +1,100 @@
+import ast
+
+from zor.outline import OUTLINE_HEADER, context_mode, outline_context, outline_source
+
+PYTHON = '''"""Payments module.
+
+Longer description.
+"""
+import os
+from typing import List
+
+RETRIES = 3
+_cache = {}
+
+
+@decorator
+def charge(amount: int,
+           currency: str = "EUR") -> bool:
+    """Charge a card.
+
+    Details that the outline drops.
+    """
+    total = amount * 100
+    return total > 0
+
+
+class Ledger(Base):
+    """Keeps entries"""
+    entries: List[int] = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+        return entry
+
+    async def flush(self): return None
+'''
+
+
+def test_outline_python_keeps_signatures():
+    outline = outline_source(PYTHON, "python")
+    assert outline.startswith(OUTLINE_HEADER)
+    body = outline[len(OUTLINE_HEADER):]
+    ast.parse(body)
+
+    assert '"""Payments module."""' in body
+    assert "import os" in body and "RETRIES = 3" in body
+    assert "_cache" not in body
+    assert "@decorator\ndef charge(amount: int,\n           currency: str = \"EUR\") -> bool:\n" in body
+    assert '    """Charge a card."""\n    ...\n' in body
+    assert "entries: List[int] = []" in body
+    assert "    def add(self, entry):\n        ...\n" in body
+    assert "async def flush(self): return None" in body
+    assert "total = amount" not in body and "Details" not in body
+
+
+def test_outline_code_elides_bodies():
+    source = (
+        "import { x } from './x';\n"
+        "const LIMIT = 10;\n"
+        "export function run(a) {\n"
+        "  const y = a + 1;\n"
+        "  return y * LIMIT;\n"
+        "}\n"
+        "class Box {\n"
+        "  open(lid) {\n"
+        "    if (lid) {\n"
+        "      return lid;\n"
+        "    }\n"
+        "  }\n"
+        "}\n"
+    )
+    outline = outline_source(source, "code")[len(OUTLINE_HEADER):]
+    assert outline == (
+        "import { x } from './x';\n"
+        "const LIMIT = 10;\n"
+        "export function run(a) {\n"
+        "    ...\n"
+        "class Box {\n"
+        "  open(lid) {\n"
+        "      ...\n"
+    )
+
+
+def test_outline_source_falls_back_to_full_text():
+    assert outline_source("def f(:\n", "python") is None
+    assert outline_source("x = 1\n", "python") is None
+    assert outline_source("# Title\n\ntext\n", "markdown") is None
+
+
+def test_outline_context_keeps_target():
+    context = {"a.py": PYTHON, "b.py": PYTHON, "README.md": "# Readme\n"}
+    outlined = outline_context(context, keep=["b.py"], config={"use_index": False})
+    assert outlined["a.py"].startswith(OUTLINE_HEADER)
+    assert outlined["b.py"] == PYTHON
+    assert outlined["README.md"] == "# Readme\n"
+
+
+def test_context_mode_defaults_to_full():
+    assert context_mode({"context_mode": {"edit": "outline"}}, "edit") == "outline"
+    assert context_mode({}, "ask") == "full"
@@ -0,0 +1,120 @@
+from zor import packer
+from zor.index import FileIndex
+from zor.packer import build_candidates, pack_context, pack_for_model, count_tokens
+
+
+def _lines(n, word="line"):
+    return "".join(f"{word} {i}\n" for i in range(n))
+
+
+def test_build_candidates_tiers():
+    context = {"a.py": "a", "b.py": "b", "docs/x.md": "x", "c.py": "c", "_conversation_history": "h"}
+    candidates = build_candidates(context, target="a.py", pinned=["docs/*"], scores={"c.py": 2.0})
+    tiers = {c["path"]: c["tier"] for c in candidates}
+    assert tiers == {
+        "a.py": packer.TIER_TARGET,
+        "b.py": packer.TIER_OTHER,
+        "docs/x.md": packer.TIER_PINNED,
+        "c.py": packer.TIER_RETRIEVED,
+        "_conversation_history": packer.TIER_PINNED,
+    }
+
+
+def test_pack_context_fits_everything():
+    context = {"a.py": "a", "b.py": "b"}
+    packed, manifest = pack_context(context, build_candidates(context), 100, {"a.py": 10, "b.py": 10})
+    assert packed == context
+    assert manifest["included"] == 2
+    assert manifest["used_tokens"] == 20
+    assert manifest["dropped"] == manifest["truncated"] == 0
+
+
+def test_pack_context_drops_lowest_priority():
+    context = {"other.py": "o", "hit.py": "h", "target.py": "t"}
+    candidates = build_candidates(context, target="target.py", scores={"hit.py": 1.0})
+    counts = {"other.py": 50, "hit.py": 50, "target.py": 60}
+    packed, manifest = pack_context(context, candidates, 115, counts, min_truncated_tokens=10)
+
+    # The target always goes in; the retrieval hit beats the unscored file
+    assert list(packed) == ["hit.py", "target.py"]
+    statuses = {f["path"]: f["status"] for f in manifest["files"]}
+    assert statuses == {"other.py": "dropped", "hit.py": "included", "target.py": "included"}
+    assert manifest["dropped"] == 1
+
+
+def test_pack_context_truncates_at_line_boundary():
+    text = _lines(200)
+    context = {"big.py": text}
+    candidates = build_candidates(context)
+    tokens = packer.estimate_tokens(text)
+    packed, manifest = pack_context(context, candidates, tokens // 2, {"big.py": tokens}, min_truncated_tokens=10)
+
+    head, marker = packed["big.py"].rsplit("\n... ", 1)
+    assert text.startswith(head + "\n")
+    assert marker.startswith("[truncated by zor:") and "of 201 lines shown" in marker
+    assert manifest["truncated"] == 1
+    assert manifest["used_tokens"] <= tokens // 2
+
+
+def test_pack_context_truncation_counts_the_text_sent():
+    text = _lines(4000)
+    context = {"a.py": "a", "big.py": text}
+    # A placeholder count far below the real one must not let the slice overrun
+    counts = {"a.py": 10, "big.py": len(text) // 40}
+    packed, manifest = pack_context(context, build_candidates(context), 300, counts, min_truncated_tokens=10)
+
+    big = next(f for f in manifest["files"] if f["path"] == "big.py")
+    assert big["status"] == "truncated"
+    assert big["tokens"] == packer.estimate_tokens(packed["big.py"])
+    assert manifest["used_tokens"] == 10 + big["tokens"] <= 300
+
+
+def test_pack_context_knapsack_prefers_score_density():
+    context = {"big.py": "b", "small1.py": "s", "small2.py": "s"}
+    scores = {"big.py": 3.0, "small1.py": 2.0, "small2.py": 2.0}
+    counts = {"big.py": 100, "small1.py": 50, "small2.py": 50}
+    candidates = build_candidates(context, scores=scores)
+
+    greedy, _ = pack_context(context, candidates, 100, counts, "greedy", min_truncated_tokens=1000)
+    knapsack, _ = pack_context(context, candidates, 100, counts, "knapsack", min_truncated_tokens=1000)
+    assert list(greedy) == ["big.py"]
+    assert list(knapsack) == ["small1.py", "small2.py"]
+
+
+def test_pack_for_model_fast_path_skips_counting(monkeypatch):
+    monkeypatch.setattr(packer, "count_tokens", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    packed, manifest = pack_for_model({"a.py": "x = 1\n"}, {"model": "test-model"})
+    assert packed == {"a.py": "x = 1\n"}
+    assert manifest["budget_tokens"] == packer.DEFAULT_INPUT_LIMIT - 8192
+    # Nothing was counted, so no estimate is passed on to the prompt
+    assert manifest["used_tokens"] is None
+
+
+def test_pack_for_model_respects_config_budget(tmp_path):
+    context = {"a.py": _lines(300, "alpha"), "b.py": _lines(300, "beta")}
+    config = {"context_budget_tokens": 1200, "max_tokens": 200, "use_index": False}
+    packed, manifest = pack_for_model(context, config, target="b.py", project_root=str(tmp_path))
+    assert packed["b.py"] == context["b.py"]
+    assert manifest["files"][0]["status"] in ("truncated", "dropped")
+
+
+def test_count_tokens_cached_in_index(tmp_path, monkeypatch):
+    with FileIndex(tmp_path) as index:
+        first = count_tokens({"a.py": "x = 1\n"}, index)
+    monkeypatch.setattr(packer, "estimate_tokens", lambda text: 999)
+    with FileIndex(tmp_path) as index:
+        # The cached estimate is keyed on content, so the path does not matter
+        assert count_tokens({"b.py": "x = 1\n"}, index) == {"b.py": first["a.py"]}
+
+
+def test_pack_for_model_keeps_lazy_context_lazy(tmp_path):
+    from zor.context import LazyContext
+    (tmp_path / "a.py").write_text(_lines(300, "alpha"))
+    (tmp_path / "b.py").write_text("b = 1\n")
+    lazy = LazyContext(str(tmp_path), {"a.py": (tmp_path / "a.py").stat().st_size, "b.py": 6})
+    config = {"context_budget_tokens": 700, "max_tokens": 200, "use_index": False}
+
+    packed, manifest = pack_for_model(lazy, config, target="b.py", project_root=str(tmp_path))
+    assert isinstance(packed, LazyContext)
+    assert packed["b.py"] == "b = 1\n"
+    assert "[truncated by zor:" in packed["a.py"]
@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+import pytest
+
+from zor import retrieval
+from zor.context import get_codebase_context
+from zor.index import FileIndex, text_digest
+from zor.packer import estimate_tokens
+from zor.retrieval import BM25Index, select_context, tokenize
+
+DOCS = {
+    "zor/history.py": "def load_history(max_items=100):\n    history_path = get_history_path()\n",
+    "zor/config.py": "def load_config():\n    config_path = get_config_path()\n",
+    "zor/file_ops.py": "def show_diff(original_content, new_content):\n    pass\n",
+}
+
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize("def loadHistory(max_items): return load_history")
+    assert "loadhistory" in tokens
+    assert "load_history" in tokens
+    assert tokens.count("load") == 2
+    assert tokens.count("history") == 2
+    assert "max" in tokens and "items" in tokens
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_bm25_ranks_relevant_document_first(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(retrieval, "np", None)
+    else:
+        pytest.importorskip("numpy")
+
+    index = BM25Index.from_texts(DOCS)
+    results = index.search("what does load_history do?", top_k=2)
+    assert results[0][0] == "zor/history.py"
+    assert index.search("nothing matches this", top_k=2) == []
+
+
+def test_bm25_term_counts_are_cached(tmp_path):
+    with FileIndex(tmp_path) as file_index:
+        BM25Index.from_texts(DOCS, file_index)
+        digest = text_digest(DOCS["zor/config.py"])
+        cached = file_index.get_derived(retrieval.TERMS_CACHE_KIND, [digest])
+        assert cached[digest]["config"] >= 1
+
+
+def test_select_context_keeps_small_context():
+    assert select_context("load_history", DOCS, budget_tokens=10_000) is DOCS
+
+
+def test_select_context_picks_top_hits_within_budget():
+    budget = estimate_tokens(DOCS["zor/history.py"])
+    retriever = retrieval.build_retriever(DOCS, config={"use_index": False})
+    selected = select_context("load_history", DOCS, top_k=5, budget_tokens=budget, retriever=retriever)
+    assert list(selected) == ["zor/history.py"]
+
+
+def test_select_context_by_chunk_elides_unrelated_code():
+    big = "import os\n\n" + "".join(
+        f"def unrelated_{i}(value):\n    return value * {i}\n\n" for i in range(50)
+    ) + "def load_history(max_items=100):\n    return []\n"
+    docs = {"zor/config.py": DOCS["zor/config.py"], "zor/big.py": big}
+    retriever = retrieval.build_retriever(docs, config={"use_index": False}, granularity="chunk")
+    assert "zor/big.py#load_history" in retriever.chunks["zor/big.py"][-1]["id"]
+
+    selected = select_context("load_history", docs, top_k=1, budget_tokens=200,
+                              retriever=retriever, keep=("zor/config.py",))
+    assert set(selected) == {"zor/big.py", "zor/config.py"}
+    assert selected["zor/config.py"] == DOCS["zor/config.py"]
+    view = selected["zor/big.py"]
+    assert view.startswith("import os\n")
+    assert "def load_history" in view
+    assert "\n... [elided by zor: lines 3-152: unrelated_0," in view
+    assert "return value * 3" not in view
+
+
+def test_chunk_retriever_over_lazy_context_matches_dict(tmp_path):
+    for path, text in DOCS.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    config = {"use_git_index": False}
+    with patch("zor.context.load_config", return_value=config):
+        lazy = get_codebase_context(str(tmp_path), lazy=True)
+    from_lazy = retrieval.build_retriever(lazy, str(tmp_path), config, granularity="chunk")
+    from_dict = retrieval.build_retriever(dict(DOCS), config={"use_index": False}, granularity="chunk")
+    assert from_lazy.chunks == from_dict.chunks
+    assert from_lazy.search("load_history", 1) == from_dict.search("load_history", 1)
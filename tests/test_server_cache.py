@@ -0,0 +1,115 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from zor import api
+from zor.server_cache import CacheServer, ServerContextCache
+
+
+class FakeCacheServer(CacheServer):
+    """In-memory stand-in for the Gemini cached-content API"""
+
+    def __init__(self, ttl_override=None):
+        self.contents = {}
+        self.created = []
+        self.deleted = []
+        self.prompts = []
+        self.ttl_override = ttl_override
+
+    def create(self, model_name, text, ttl_seconds):
+        name = f"cachedContents/{len(self.created)}"
+        self.contents[name] = text
+        self.created.append(name)
+        return name, time.time() + (self.ttl_override if self.ttl_override is not None else ttl_seconds)
+
+    def delete(self, name):
+        self.contents.pop(name)
+        self.deleted.append(name)
+
+    def model(self, name, generation_config):
+        server = self
+
+        class Model:
+            def generate_content(self, text, stream=False):
+                server.prompts.append((server.contents[name], text))
+                return MagicMock(text="cached answer")
+
+        return Model()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ServerContextCache(FakeCacheServer(), tmp_path / "contexts.json", ttl_seconds=600, min_tokens=10)
+
+
+def test_prefix_uploaded_once_per_content(cache):
+    name = cache.cached_content("/repo", "m", "codebase v1", 100)
+    assert cache.cached_content("/repo", "m", "codebase v1", 100) == name
+    assert cache.server.created == [name]
+    # Another model or project gets its own cached content
+    assert cache.cached_content("/repo", "other", "codebase v1", 100) != name
+    assert cache.cached_content("/elsewhere", "m", "codebase v1", 100) != name
+
+
+def test_several_prefixes_kept_per_project(cache, tmp_path):
+    v1 = cache.cached_content("/repo", "m", "codebase v1", 100)
+    v2 = cache.cached_content("/repo", "m", "codebase v2", 100)
+    assert v2 != v1
+    # Going back to an earlier selection hits without an upload
+    assert cache.cached_content("/repo", "m", "codebase v1", 100) == v1
+    assert cache.server.deleted == []
+    # The registry is on disk, so another process reuses both
+    again = ServerContextCache(cache.server, tmp_path / "contexts.json", min_tokens=10)
+    assert again.cached_content("/repo", "m", "codebase v2", 100) == v2
+    assert len(cache.server.created) == 2
+
+
+def test_least_recently_used_prefix_is_deleted(tmp_path):
+    cache = ServerContextCache(FakeCacheServer(), tmp_path / "contexts.json", min_tokens=10, max_entries=2)
+    v1 = cache.cached_content("/repo", "m", "codebase v1", 100)
+    v2 = cache.cached_content("/repo", "m", "codebase v2", 100)
+    cache.cached_content("/repo", "m", "codebase v1", 100)
+    # Another project's entries do not count against this one
+    cache.cached_content("/elsewhere", "m", "codebase v1", 100)
+    cache.cached_content("/repo", "m", "codebase v3", 100)
+    assert cache.server.deleted == [v2]
+    assert cache.cached_content("/repo", "m", "codebase v1", 100) == v1
+
+
+def test_cache_server_is_abstract():
+    with pytest.raises(TypeError):
+        CacheServer()
+
+
+def test_expiring_content_is_replaced(tmp_path):
+    cache = ServerContextCache(FakeCacheServer(ttl_override=5), tmp_path / "contexts.json", min_tokens=10)
+    first = cache.cached_content("/repo", "m", "codebase", 100)
+    assert cache.cached_content("/repo", "m", "codebase", 100) != first
+
+
+def test_small_prefix_or_server_error_is_not_cached(cache):
+    assert cache.cached_content("/repo", "m", "tiny", 5) is None
+    cache.server.create = MagicMock(side_effect=RuntimeError("refused"))
+    assert cache.cached_content("/repo", "m", "codebase", 100) is None
+
+
+def test_generate_with_context_sends_only_the_suffix(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(api, "_client", None)
+    server = FakeCacheServer()
+    api.get_client().cache_server = server
+    config = {"model": "m", "server_cache": True, "server_cache_min_tokens": 0, "response_cache": False,
+              "minify": "off", "dedup": False}
+    context = {"a.py": "x = 1\n", "b.py": "y = 2\n"}
+
+    with patch("zor.api.load_config", return_value=config), patch("zor.api.genai.GenerativeModel"):
+        assert api.generate_with_context("First?", context) == "cached answer"
+        turn = dict(context, _conversation_history="User: First?")
+        api.generate_with_context("Second?", turn)
+
+    assert len(server.created) == 1
+    (prefix, first), (_, second) = server.prompts
+    assert prefix == "Codebase Context:\nFile: a.py\nx = 1\n\nFile: b.py\ny = 2\n"
+    assert first == "\n\nUser Prompt: First?"
+    assert second == "File: _conversation_history\nUser: First?\n\nUser Prompt: Second?"
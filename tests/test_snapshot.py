@@ -0,0 +1,100 @@
+import gzip
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from zor.context import get_codebase_context
+from zor.index import FileIndex
+from zor.snapshot import SnapshotError, export_snapshot, import_snapshot
+
+CONFIG = {"use_git_index": False}
+
+
+def _age(path, seconds=60):
+    st = os.stat(path)
+    old = st.st_mtime_ns - seconds * 1_000_000_000
+    os.utime(path, ns=(old, old))
+
+
+def _export(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "a.py").write_text("def a():\n    return 1\n" * 20)
+    (source / "b.py").write_text("b = 2\n")
+    with patch("zor.context.load_config", return_value=CONFIG):
+        context = get_codebase_context(str(source))
+    snapshot = tmp_path / "snap.jsonl.gz"
+    counts = export_snapshot(str(snapshot), context, str(source), CONFIG)
+    return source, snapshot, counts
+
+
+def test_export_writes_files_and_derived_values(tmp_path):
+    _, snapshot, counts = _export(tmp_path)
+    assert counts["files"] == 2 and counts["text_files"] == 2
+    # Token counts and outlines were warmed for the snapshot
+    assert counts["derived"] >= 3
+    with gzip.open(snapshot, "rt") as f:
+        assert '"format": "zor-snapshot"' in f.readline()
+
+
+def test_import_into_fresh_checkout_reuses_matching_files(tmp_path):
+    source, snapshot, _ = _export(tmp_path)
+    checkout = tmp_path / "checkout"
+    shutil.copytree(source, checkout, ignore=shutil.ignore_patterns(".zor"))
+    (checkout / "b.py").write_text("b = 3\n")
+    for name in ("a.py", "b.py"):
+        _age(checkout / name)
+
+    counts = import_snapshot(str(snapshot), str(checkout), CONFIG)
+    assert (counts["files"], counts["reused"], counts["stale"]) == (2, 1, 1)
+
+    stats = {}
+    with patch("zor.context.load_config", return_value=CONFIG):
+        context = get_codebase_context(str(checkout), stats=stats)
+    assert context["b.py"] == "b = 3\n"
+    assert stats["reused"] == 1 and stats["files_read"] == 1
+
+    with FileIndex(checkout) as index:
+        assert any(kind.startswith("outline:") for kind, _, _ in index.derived_rows())
+
+
+def test_import_stat_mode_needs_same_mtime(tmp_path):
+    source, snapshot, _ = _export(tmp_path)
+    checkout = tmp_path / "checkout"
+    shutil.copytree(source, checkout, ignore=shutil.ignore_patterns(".zor"))
+    # copytree keeps mtimes; a touched file no longer matches
+    _age(checkout / "b.py")
+    counts = import_snapshot(str(snapshot), str(checkout), CONFIG, verify="stat")
+    assert counts["reused"] == 1
+
+
+def test_import_rejects_other_files(tmp_path):
+    bogus = tmp_path / "bogus.gz"
+    with gzip.open(bogus, "wt") as f:
+        f.write('{"format": "something-else"}\n')
+    with pytest.raises(SnapshotError):
+        import_snapshot(str(bogus), str(tmp_path), CONFIG)
+
+
+def test_snapshot_paths_use_forward_slashes(tmp_path, monkeypatch):
+    source = tmp_path / "source"
+    (source / "pkg").mkdir(parents=True)
+    (source / "pkg" / "c.py").write_text("c = 1\n")
+    _age(source / "pkg" / "c.py")
+    with FileIndex(source) as index:
+        # As a Windows checkout would have indexed it
+        index.put("pkg\\c.py", os.stat(source / "pkg" / "c.py"), "digest", False, "c = 1\n")
+
+    snapshot = tmp_path / "snap.jsonl.gz"
+    with monkeypatch.context() as m:
+        m.setattr(os, "sep", "\\")
+        export_snapshot(str(snapshot), {}, str(source), CONFIG)
+    with gzip.open(snapshot, "rt") as f:
+        assert '"path": "pkg/c.py"' in f.read()
+
+    with patch("zor.snapshot._verified", return_value=True):
+        assert import_snapshot(str(snapshot), str(source), CONFIG)["reused"] == 1
+    with FileIndex(source) as index:
+        assert os.path.normpath("pkg/c.py") in index
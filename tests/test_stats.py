@@ -0,0 +1,94 @@
+import json
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from zor.main import app
+from zor.outline import outline_files
+from zor.packer import count_tokens
+from zor.stats import _directory_totals, collect_stats, profile_tokens
+
+CONFIG = {"use_index": False, "use_git_index": False}
+
+
+def _write(root, files):
+    for path, text in files.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(text)
+
+
+def test_directory_totals_count_every_ancestor():
+    sizes = {"a/b/x.py": 10, "a/y.py": 5, "top.py": 1}
+    tokens = {"a/b/x.py": 3, "a/y.py": 2, "top.py": 1}
+    dir_sizes, dir_tokens = _directory_totals(sizes, tokens)
+    assert dir_sizes == {"a/b": 10, "a": 15}
+    assert dir_tokens == {"a/b": 3, "a": 5}
+
+
+def test_collect_stats(tmp_path):
+    _write(tmp_path, {
+        "big/data.py": "values = [\n" + "    1,\n" * 500 + "]\n",
+        "small.py": "x = 1\n",
+        "README.md": "# Project\n",
+        "package-lock.json": "{}\n",
+    })
+    with patch('zor.context.load_config', return_value=CONFIG):
+        report = collect_stats(str(tmp_path), CONFIG, top=2)
+
+    assert report["files"] == 3
+    assert [row["path"] for row in report["top_files"]["bytes"]] == ["big/data.py", "README.md"]
+    assert report["top_files"]["tokens"][0]["path"] == "big/data.py"
+    assert report["top_directories"]["bytes"][0] == {
+        "path": "big", "bytes": report["top_files"]["bytes"][0]["bytes"],
+        "tokens": report["top_files"]["bytes"][0]["tokens"],
+    }
+    assert report["excluded"] == {"generated: lockfile": 1}
+    assert set(report["phases"]) == {"walk", "stat", "index", "sniff", "read", "decode"}
+    assert report["counters"]["context_files"] == 3
+    assert set(report["profiles"]) == {"ask", "edit", "generate_test"}
+    # The report is meant for dashboards, so it has to serialise as it is
+    json.dumps(report)
+
+
+def test_profile_tokens_outline_and_budget():
+    source = "def f(a):\n" + "    a += 1\n" * 200 + "    return a\n"
+    context = {"mod.py": source}
+    config = {"minify": "off", "dedup": False, "context_mode": {"edit": "outline"},
+              "context_budget_tokens": 10_000, "max_tokens": 0, "retrieval_budget_tokens": 50}
+
+    full = profile_tokens(context, "ask", config)
+    outlined = profile_tokens(context, "edit", config)
+    assert outlined["mode"] == "outline" and full["mode"] == "full"
+    assert outlined["tokens"] < full["tokens"]
+    assert full["budget_tokens"] == 50 and full["sent_tokens"] == 50
+    assert outlined["budget_tokens"] == 10_000 and outlined["sent_tokens"] == outlined["tokens"]
+
+
+def test_profile_tokens_measures_target_and_neighbours():
+    body = "".join(f"    v{i} = a + {i}\n" for i in range(100))
+    context = {
+        "app.py": "from lib import f\n\ndef main(a):\n" + body + "    return f(a)\n",
+        "lib.py": "def f(a):\n" + body + "    return a\n",
+        "other.py": "def g(a):\n" + body + "    return a\n",
+    }
+    config = {"minify": "off", "dedup": False, "context_mode": {"edit": "outline"}, "use_index": False}
+
+    estimate = profile_tokens(context, "edit", config)
+    targeted = profile_tokens(context, "edit", config, target="app.py")
+    assert estimate["scope"] == "codebase" and targeted["scope"] == "target"
+    # app.py is sent whole, lib.py outlined and other.py not at all
+    sent = {"app.py": context["app.py"], "lib.py": outline_files(context)["lib.py"]}
+    assert targeted["tokens"] == sum(count_tokens(sent).values()) > estimate["tokens"]
+    assert profile_tokens(context, "edit", config, target="missing.py")["scope"] == "codebase"
+
+
+def test_context_stats_command_json(tmp_path, monkeypatch):
+    _write(tmp_path, {"app.py": "print('hi')\n"})
+    monkeypatch.chdir(tmp_path)
+    with patch('zor.main.load_config', return_value=CONFIG), \
+            patch('zor.context.load_config', return_value=CONFIG):
+        result = CliRunner().invoke(app, ["context-stats", "--json", "--top", "1"])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.stdout)
+    assert report["files"] == 1
+    assert report["top_files"]["bytes"][0]["path"] == "app.py"
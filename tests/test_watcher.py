@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from zor.context import ExclusionMatcher
+from zor.index import FileIndex
+from zor.watcher import ContextWatcher, InotifyBackend, PollingBackend
+
+CONFIG = {"exclude_dirs": ["node_modules", ".*"], "use_git_index": False}
+
+
+def _make_backend(kind, root):
+    matcher = ExclusionMatcher.from_config(CONFIG)
+    if kind == "polling":
+        return PollingBackend(str(root), matcher, interval=0.05)
+    try:
+        return InotifyBackend(str(root), matcher)
+    except OSError:
+        pytest.skip("inotify not available")
+
+
+@pytest.mark.parametrize("kind", ["inotify", "polling"])
+def test_watcher_patches_context(tmp_path, kind):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    context = {os.path.join("pkg", "a.py"): "a = 1\n", "b.py": "b = 1\n"}
+
+    watcher = ContextWatcher(context, str(tmp_path), CONFIG, backend=_make_backend(kind, tmp_path))
+    with watcher:
+        (tmp_path / "pkg" / "a.py").write_text("a = 2\n")
+        (tmp_path / "b.py").unlink()
+        (tmp_path / "new").mkdir()
+        (tmp_path / "new" / "c.py").write_text("c = 1\n")
+        (tmp_path / "node_modules").mkdir()
+        (tmp_path / "node_modules" / "dep.js").write_text("x\n")
+        assert watcher.sync() == 3
+
+    assert context == {
+        os.path.join("pkg", "a.py"): "a = 2\n",
+        os.path.join("new", "c.py"): "c = 1\n",
+    }
+    with FileIndex(tmp_path) as index:
+        assert index.get(os.path.join("new", "c.py"))["text"] == "c = 1\n"
+
+
+def test_watcher_handles_removed_directory_and_unchanged_rewrite(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    context = {os.path.join("pkg", "a.py"): "a = 1\n", "b.py": "b = 1\n"}
+
+    watcher = ContextWatcher(context, str(tmp_path), CONFIG, backend=_make_backend("polling", tmp_path))
+    with watcher:
+        (tmp_path / "pkg" / "a.py").unlink()
+        (tmp_path / "pkg").rmdir()
+        (tmp_path / "b.py").write_text("b = 1\n")
+        assert watcher.sync() == 1
+
+    assert context == {"b.py": "b = 1\n"}
+
+
+def test_watcher_coalesces_bursts(tmp_path):
+    (tmp_path / "a.py").write_text("0\n")
+    context = {"a.py": "0\n"}
+    watcher = ContextWatcher(context, str(tmp_path), CONFIG, backend=_make_backend("inotify", tmp_path),
+                             debounce=0.3)
+    with watcher:
+        for i in range(1, 20):
+            (tmp_path / "a.py").write_text(f"{i}\n")
+        assert watcher.sync() == 1
+
+    assert context == {"a.py": "19\n"}
+    # The burst was applied as one batch, reading the file once
+    assert watcher.stats["files_read"] == 1
+
+
+def test_expand_scales_with_changed_files(tmp_path):
+    import time
+    # Half of 8000 known files changed, the rest (and a directory) deleted
+    (tmp_path / "src").mkdir()
+    context = {}
+    for i in range(8000):
+        path = os.path.join("src" if i % 2 else "gone", f"f{i}.py")
+        context[path] = "x\n"
+        if i % 2:
+            (tmp_path / path).write_text("x\n")
+    watcher = ContextWatcher(context, str(tmp_path), CONFIG, backend=_make_backend("polling", tmp_path))
+
+    changed = {p for p in context if p.startswith("src")} | {"gone", os.path.join("gone", "f0.py")}
+    started = time.perf_counter()
+    files = watcher._expand(changed)
+    assert time.perf_counter() - started < 0.5
+    assert files == set(context) | {"gone"}
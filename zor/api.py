@@ -1,14 +1,52 @@
+import asyncio
+import contextlib
+import contextvars
+import glob
+import os
 import time
 import random
+import threading
 from functools import wraps
 import typer
 import google.generativeai as genai
+from .cache import ResponseCache, response_key
 from .config import load_config
+from .dedup import dedup_context
+from .large import focus_large_files
+from .minify import minify_context
+from .packer import estimate_tokens, pack_for_model
+from .server_cache import GeminiCacheServer, ServerContextCache
 
 class RateLimitError(Exception):
     """Exception raised when API rate limit is hit"""
     pass
 
+class StreamCancelled(Exception):
+    """Raised when the user cancels a streamed response; `text` holds what had arrived"""
+    def __init__(self, text=""):
+        super().__init__("Response cancelled")
+        self.text = text
+
+def _is_rate_limit(error):
+    """Whether an exception looks like a rate limit error"""
+    error_str = str(error).lower()
+    return any(term in error_str for term in ["rate limit", "quota", "too many requests"])
+
+def call_with_backoff(call, max_attempts=3):
+    """Call `call()`, retrying with exponential backoff while it is rate limited"""
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except Exception as e:
+            if _is_rate_limit(e) and attempt < max_attempts - 1:
+                # Calculate backoff with jitter
+                backoff_time = (2 ** attempt) + random.uniform(0, 1)
+                typer.echo(f"Rate limit hit. Retrying in {backoff_time:.1f}s...")
+                time.sleep(backoff_time)
+                continue
+            # Re-raise the exception
+            raise
+
 def exponential_backoff(max_retries=3):
     """Decorator for exponential backoff on rate limiting"""
     def decorator(func):
@@ -16,49 +54,501 @@ def exponential_backoff(max_retries=3):
         def wrapper(*args, **kwargs):
             config = load_config()
             max_attempts = config.get("rate_limit_retries", max_retries)
-            
-            for attempt in range(max_attempts):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    # Check if it looks like a rate limit error
-                    error_str = str(e).lower()
-                    is_rate_limit = any(term in error_str for term in 
-                                       ["rate limit", "quota", "too many requests"])
-                    
-                    if is_rate_limit and attempt < max_attempts - 1:
-                        # Calculate backoff with jitter
-                        backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                        typer.echo(f"Rate limit hit. Retrying in {backoff_time:.1f}s...")
-                        time.sleep(backoff_time)
-                        continue
-                    else:
-                        # Re-raise the exception
-                        raise
+            return call_with_backoff(lambda: func(*args, **kwargs), max_attempts)
         return wrapper
     return decorator
 
-@exponential_backoff()
-def generate_with_context(prompt: str, context: dict):
-    """Generate a response with codebase context with rate limiting"""
-    config = load_config()
+CONTEXT_HEADER = "Codebase Context:\n"
+
+def iter_context(context, header=CONTEXT_HEADER):
+    """Yield the pieces of the context part of the prompt"""
+    if header:
+        yield header
+    for number, (path, content) in enumerate(context.items()):
+        if number:
+            yield "\n"
+        yield f"File: {path}\n"
+        yield content
+
+def iter_prompt(prompt: str, context, header=CONTEXT_HEADER):
+    """Yield the pieces of the full prompt, reading each context file as it is reached"""
+    yield from iter_context(context, header)
+    yield f"\n\nUser Prompt: {prompt}"
+
+def build_prompt(prompt: str, context) -> str:
+    """Build the full prompt with a single join
+
+    No intermediate `context_str` copy of the codebase is made, and with a
+    LazyContext the file texts only exist while the prompt is being joined.
+    """
+    return "".join(iter_prompt(prompt, context))
+
+# Estimated tokens of the "File: <path>" line framing each context file
+_FRAMING_TOKENS = 8
+
+def _utf8_size(text):
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+class Prompt:
+    """A fully assembled prompt, built once and sent as it is on every attempt
+
+    The text is joined once from its pieces (`str.join` sizes the result
+    before copying), and its UTF-8 size and estimated token count are worked
+    out up front, so retries neither rebuild nor re-measure it.
+    """
+
+    __slots__ = ("_text", "_nbytes", "_tokens")
+
+    def __init__(self, text, nbytes=None, tokens=None):
+        self._text = text
+        self._nbytes = _utf8_size(text) if nbytes is None else nbytes
+        self._tokens = estimate_tokens(text) if tokens is None else tokens
+
+    @classmethod
+    def build(cls, prompt: str, context, context_tokens=None, header=CONTEXT_HEADER):
+        """Assemble a prompt over a context
+
+        `context_tokens` is the context's token estimate when the caller
+        already has one (the packer does); otherwise each file is estimated.
+        """
+        measured = {"bytes": 0, "tokens": 0}
+
+        def pieces():
+            # Measured as the join reads them, so a LazyContext's texts are
+            # held no longer than the join itself needs them
+            for piece in iter_prompt(prompt, context, header):
+                measured["bytes"] += _utf8_size(piece)
+                if context_tokens is None:
+                    measured["tokens"] += estimate_tokens(piece)
+                yield piece
+
+        text = "".join(pieces())
+        if context_tokens is None:
+            tokens = measured["tokens"]
+        else:
+            # Besides the user prompt, the packer did not count the "File:"
+            # lines; a few tokens per file covers them
+            tokens = context_tokens + estimate_tokens(prompt) + _FRAMING_TOKENS * len(context)
+        return cls(text, measured["bytes"], tokens)
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def __setattr__(self, name, value):
+        if hasattr(self, "_tokens"):
+            raise AttributeError("Prompt is immutable")
+        object.__setattr__(self, name, value)
+
+    def __str__(self):
+        return self._text
+
+    def __repr__(self):
+        return f"Prompt({self._nbytes} bytes, ~{self._tokens} tokens)"
+
+class GeminiTransport:
+    """Sends prompts to a Gemini model"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def send(self, prompt: Prompt) -> str:
+        """Send a prompt and return the response text"""
+        return self.model.generate_content(prompt.text).text
+
+    def stream(self, prompt: Prompt):
+        """Send a prompt and return an iterator over the response text as it arrives
+
+        The request is made before this returns, so errors such as rate
+        limits are raised here rather than while iterating.
+        """
+        response = self.model.generate_content(prompt.text, stream=True)
+        return (chunk.text for chunk in response)
+
+def render_stream(chunks, console=None) -> str:
+    """Render text chunks as Markdown while they arrive and return the whole text
+
+    Ctrl-C stops the stream and raises StreamCancelled with the partial text.
+    """
+    from rich.console import Console
+    from rich.live import Live
+    from rich.markdown import Markdown
+
+    parts = []
+    try:
+        with Live(Markdown(""), console=console or Console(), refresh_per_second=8,
+                  vertical_overflow="visible") as live:
+            for chunk in chunks:
+                parts.append(chunk)
+                live.update(Markdown("".join(parts)))
+    except KeyboardInterrupt:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        raise StreamCancelled("".join(parts)) from None
+    return "".join(parts)
+
+def _freeze(value):
+    """A hashable form of a (possibly nested) generation config"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+class GeminiClient:
+    """Process-wide Gemini SDK session
+
+    The SDK is configured once per API key, and model handles are kept per
+    (model, temperature, generation config). A handle holds its connection
+    once it has made a call, so commands making several calls (`interactive`,
+    `refactor`, `init`) pay the setup and connection cost once.
+    """
+
+    def __init__(self):
+        self.api_key = None
+        # Where server-side context caches live; a fake can be set in tests
+        self.cache_server = None
+        self._models = {}
+        self._context_cache = None
+        self._lock = threading.Lock()
+
+    def configure(self, api_key):
+        """Configure the SDK, unless it already uses this key"""
+        with self._lock:
+            if api_key == self.api_key:
+                return
+            genai.configure(api_key=api_key)
+            self.api_key = api_key
+            # Handles created under another key keep its credentials
+            self._models.clear()
+
+    def model(self, model_name, temperature=None, generation_config=None):
+        """The cached model handle for a model and generation settings"""
+        settings = dict(generation_config or {})
+        if temperature is not None:
+            settings["temperature"] = temperature
+        key = (model_name, _freeze(settings))
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                if settings:
+                    model = genai.GenerativeModel(model_name, generation_config=settings)
+                else:
+                    model = genai.GenerativeModel(model_name)
+                self._models[key] = model
+            return model
+
+    def transport(self, model_name, temperature=None, generation_config=None):
+        """A transport sending to the cached handle for these settings"""
+        return GeminiTransport(self.model(model_name, temperature, generation_config))
+
+    def context_cache(self, config):
+        """The ServerContextCache for this process, created on first use"""
+        with self._lock:
+            if self._context_cache is None:
+                server = self.cache_server or GeminiCacheServer()
+                self._context_cache = ServerContextCache.from_config(server, config)
+            return self._context_cache
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> GeminiClient:
+    """The process-wide GeminiClient"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
+
+def server_cached_request(prompt: str, context, context_tokens, config, model_name, temperature):
+    """(transport, Prompt) sending only what follows the server-cached codebase, or None
+
+    The codebase files form the cached prefix; synthetic "_" entries such as
+    the conversation history change every turn, so they are sent with the
+    prompt. None means the prefix could not be cached and the whole prompt
+    has to be sent.
+    """
+    prefix = {path: text for path, text in context.items() if not path.startswith("_")}
+    if not prefix:
+        return None
+    context_cache = get_client().context_cache(config)
+    text = "".join(iter_context(prefix))
+    if context_tokens is None:
+        # The packer did not count (everything fitted); measure what is cached
+        context_tokens = estimate_tokens(text)
+    name = context_cache.cached_content(os.path.abspath("."), model_name, text, context_tokens)
+    if name is None:
+        return None
+    rest = {path: text for path, text in context.items() if path.startswith("_")}
+    model = context_cache.model(name, {"temperature": temperature})
+    return GeminiTransport(model), Prompt.build(prompt, rest, header="")
+
+def _report_packing(manifest):
+    """Tell the user when context had to be cut to fit the model"""
+    if not manifest["truncated"] and not manifest["dropped"]:
+        return
+    typer.echo(
+        f"Context packed into {manifest['used_tokens']}/{manifest['budget_tokens']} tokens: "
+        f"{manifest['included']} files included, {manifest['truncated']} truncated, "
+        f"{manifest['dropped']} dropped",
+        err=True,
+    )
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request takes longer than its deadline"""
+
+# Process-wide, so requests of every event loop (each call of the sync API
+# runs its own) and thread share one bound; one semaphore per configured limit
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+# The slot held by the request running in the current task, if any
+_current_slot = contextvars.ContextVar("zor_request_slot", default=None)
+
+# How often a request waiting for a slot checks again
+SLOT_POLL_SECONDS = 0.02
+
+class _RequestSlot:
+    """One acquired unit of the request limit, released when its last holder lets go
+
+    The awaiting request is one holder and every worker thread it starts is
+    another, so a request abandoned by a deadline or cancellation keeps its
+    slot until the SDK call it left running has really finished.
+    """
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def hold(self):
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders:
+                return
+        self._semaphore.release()
+
+def _request_semaphore(config) -> threading.BoundedSemaphore:
+    limit = max(1, config.get("max_concurrent_requests", 4))
+    with _semaphores_lock:
+        if limit not in _semaphores:
+            _semaphores[limit] = threading.BoundedSemaphore(limit)
+        return _semaphores[limit]
+
+@contextlib.asynccontextmanager
+async def request_slots(config):
+    """Hold one of the process-wide `max_concurrent_requests` slots for a request
+
+    Waiting polls rather than blocking a thread, so a waiting request can be
+    cancelled without leaking a slot.
+    """
+    semaphore = _request_semaphore(config)
+    while not semaphore.acquire(blocking=False):
+        await asyncio.sleep(SLOT_POLL_SECONDS)
+    slot = _RequestSlot(semaphore)
+    token = _current_slot.set(slot)
+    try:
+        yield slot
+    finally:
+        _current_slot.reset(token)
+        slot.release()
+
+_END = object()
+
+def _settle(future, result, error):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+async def run_blocking(func, *args):
+    """Run a blocking call on a daemon thread and await its result
+
+    Unlike `asyncio.to_thread`, nothing joins the thread: when the awaiting
+    task is cancelled or its deadline passes, the call is left to finish in
+    the background, and neither `asyncio.run` nor interpreter exit waits for it.
+    Inside `request_slots` the thread holds the request's slot until the call
+    returns.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    slot = _current_slot.get()
+    if slot is not None:
+        slot.hold()
+
+    def run():
+        try:
+            result, error = func(*args), None
+        except BaseException as e:
+            result, error = None, e
+        finally:
+            if slot is not None:
+                slot.release()
+        try:
+            loop.call_soon_threadsafe(_settle, future, result, error)
+        except RuntimeError:
+            # The loop is gone; nobody is waiting for the result any more
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return await future
+
+async def render_stream_async(chunks, console=None) -> str:
+    """`render_stream` for a blocking iterator: each chunk is awaited on a worker thread
+
+    Cancelling the task stops rendering and propagates the cancellation;
+    the sync wrapper turns Ctrl-C into StreamCancelled.
+    """
+    from rich.console import Console
+    from rich.live import Live
+    from rich.markdown import Markdown
+
+    parts = []
+    with Live(Markdown(""), console=console or Console(), refresh_per_second=8,
+              vertical_overflow="visible") as live:
+        while True:
+            chunk = await run_blocking(next, chunks, _END)
+            if chunk is _END:
+                break
+            parts.append(chunk)
+            live.update(Markdown("".join(parts)))
+    return "".join(parts)
+
+def _prepare_context(prompt, context, config, target=None, pinned=None, scores=None):
+    """Focus, dedup, minify and pack a context for the model; returns (context, manifest)"""
+    keep = [target] if target else ()
+    context = focus_large_files(context, prompt, config)
+    context, duplicates = dedup_context(context, config, keep=keep)
+    if duplicates:
+        typer.echo(f"Replaced {len(duplicates)} duplicate files with references", err=True)
+    context, minified = minify_context(context, config, keep=keep)
+    if minified["files"]:
+        typer.echo(f"Minified {minified['files']} files, saving ~{minified['tokens_saved']} tokens", err=True)
+    # Files that references point at must survive packing for them to resolve
+    referenced = {canonical for canonical, _ in duplicates.values()} | set(minified["header_owners"])
+    if referenced:
+        pinned = config.get("pinned_files", []) if pinned is None else pinned
+        pinned = list(pinned) + [glob.escape(path) for path in sorted(referenced)]
+    context, manifest = pack_for_model(context, config, estimate_tokens(prompt),
+                                       target=target, pinned=pinned, scores=scores)
+    _report_packing(manifest)
+    return context, manifest
+
+async def _generate(prompt, context, config, target, pinned, scores, stream, use_cache, refresh):
     model_name = config.get("model", "gemini-2.0-flash")
     temperature = config.get("temperature", 0.2)
     
-    model = genai.GenerativeModel(model_name, 
-                                 generation_config={"temperature": temperature})
+    # Packing is CPU and disk bound; other requests keep going meanwhile
+    context, manifest = await run_blocking(_prepare_context, prompt, context, config, target, pinned, scores)
+    
+    cache = ResponseCache.from_config(config) if use_cache and config.get("response_cache", True) else None
+    key = response_key(model_name, temperature, prompt, context) if cache is not None else None
+    cached = cache.get(key) if cache is not None and not refresh else None
+    if cached is not None:
+        # A replay renders the chunks the live answer arrived in
+        return render_stream(iter(cached)) if stream else "".join(cached)
     
-    context_str = "\n".join(f"File: {path}\n{content}" for path, content in context.items())
-    full_prompt = f"Codebase Context:\n{context_str}\n\nUser Prompt: {prompt}"
+    async with request_slots(config):
+        request = None
+        if config.get("server_cache", False):
+            request = await run_blocking(server_cached_request, prompt, context, manifest["used_tokens"],
+                                              config, model_name, temperature)
+        if request is not None:
+            transport, full_prompt = request
+        else:
+            transport = get_client().transport(model_name, temperature)
+            full_prompt = Prompt.build(prompt, context, manifest["used_tokens"])
+        
+        max_attempts = config.get("rate_limit_retries", 3)
+        if stream:
+            chunks = await run_blocking(call_with_backoff, lambda: transport.stream(full_prompt), max_attempts)
+            received = []
+            
+            def recorded():
+                for chunk in chunks:
+                    received.append(chunk)
+                    yield chunk
+            
+            text = await render_stream_async(recorded())
+        else:
+            text = await run_blocking(call_with_backoff, lambda: transport.send(full_prompt), max_attempts)
+            received = [text]
     
-    response = model.generate_content(full_prompt)
+    if cache is not None:
+        cache.put(key, received, model_name)
+    return text
+
+async def generate_with_context_async(prompt: str, context: dict, target=None, pinned=None, scores=None,
+                                      stream=False, use_cache=True, refresh=False, timeout=None):
+    """Generate a response with codebase context, as a coroutine
+
+    At most `max_concurrent_requests` requests are in flight in the process,
+    counting SDK calls left running by a deadline or cancellation; the
+    others wait for a slot. `timeout` (default: the
+    `request_timeout_seconds` config key, 0 for none) is the deadline for
+    the whole request, after which DeadlineExceeded is raised. Cancelling
+    the task cancels the request; a blocking SDK call already running on a
+    worker thread is left to finish there and its result is dropped.
+
+    The prompt is assembled once; rate-limited attempts resend the same
+    `Prompt` through the same transport. With `stream=True` the response is
+    rendered to the terminal as it arrives.
+
+    Responses are kept in the `ResponseCache` unless `use_cache` is False or
+    the `response_cache` config key is off; `refresh` skips the lookup but
+    stores the new answer.
+    """
+    config = load_config()
+    if timeout is None:
+        timeout = config.get("request_timeout_seconds", 0)
+    request = _generate(prompt, context, config, target, pinned, scores, stream, use_cache, refresh)
+    if timeout:
+        try:
+            text = await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Request exceeded its {timeout}s deadline") from None
+    else:
+        text = await request
     
     # Save to history
     try:
         from .history import save_history_item
-        save_history_item(prompt, response.text)
+        save_history_item(prompt, text)
     except ImportError:
         pass
     
-    return response.text
+    return text
+
+def generate_with_context(prompt: str, context: dict, target=None, pinned=None, scores=None, stream=False,
+                          use_cache=True, refresh=False, timeout=None):
+    """Generate a response with codebase context with rate limiting
+
+    A blocking wrapper over `generate_with_context_async`. It returns as
+    soon as the deadline passes; a blocking call still running on a worker
+    thread is not waited for. Ctrl-C during a streamed answer raises
+    StreamCancelled.
+    """
+    try:
+        return asyncio.run(generate_with_context_async(
+            prompt, context, target, pinned, scores, stream, use_cache, refresh, timeout,
+        ))
+    except KeyboardInterrupt:
+        if stream:
+            raise StreamCancelled() from None
+        raise
 
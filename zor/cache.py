@@ -0,0 +1,161 @@
+"""On-disk cache of model responses.
+
+Asking the same question about unchanged code (or re-running
+`generate_test` on an untouched file in CI) returns the cached answer
+instead of calling the API. Entries are keyed by a hash of the model, the
+temperature, the prompt and the content hashes of the context files in the
+order they are sent, so any change to what the model would see misses.
+
+The cache lives in `$XDG_CACHE_HOME/zor` (`~/.cache/zor` by default), one
+JSON file per response. A file's mtime is its last use: entries older than
+`response_cache_max_age_days` are dropped, and the least recently used go
+first once the cache is over `response_cache_max_bytes`. Streamed responses
+keep their chunks so a replay renders the same way the live answer did.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from .index import text_digest
+
+RESPONSES_DIRNAME = "responses"
+STATS_FILENAME = "stats.json"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def get_cache_dir():
+    """The user-level cache directory, following XDG_CACHE_HOME"""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "zor"
+
+
+def response_key(model_name, temperature, prompt, context):
+    """Hash everything that decides a response: model, temperature, prompt and context"""
+    h = hashlib.sha256(json.dumps([model_name, temperature, prompt]).encode("utf-8"))
+    for path, content in context.items():
+        h.update(f"\0{path}\0{text_digest(content)}".encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed response store with size- and age-based LRU eviction"""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else get_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("response_cache_dir") or None,
+            config.get("response_cache_max_bytes", DEFAULT_MAX_BYTES),
+            config.get("response_cache_max_age_days", DEFAULT_MAX_AGE_DAYS),
+        )
+
+    def _path(self, key):
+        return self.cache_dir / RESPONSES_DIRNAME / key[:2] / f"{key}.json"
+
+    def _count(self, counter):
+        """Bump the persistent hit/miss counters"""
+        stats = self.stats()
+        stats[counter] = stats.get(counter, 0) + 1
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            (self.cache_dir / STATS_FILENAME).write_text(json.dumps(stats))
+        except OSError:
+            pass
+
+    def stats(self):
+        """Hit and miss counts so far"""
+        try:
+            return json.loads((self.cache_dir / STATS_FILENAME).read_text())
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        """The cached chunks for a key, or None; a hit marks the entry as used"""
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink()
+                raise FileNotFoundError(path)
+            chunks = json.loads(path.read_text(encoding="utf-8"))["chunks"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            self._count("misses")
+            return None
+        self._count("hits")
+        return chunks
+
+    def put(self, key, chunks, model_name=None):
+        """Store a response (as the chunks it arrived in) and evict to stay within bounds"""
+        path = self._path(key)
+        entry = {"model": model_name, "created": time.time(), "chunks": list(chunks)}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(entry), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            # A read-only or full disk must never block an answer
+            return
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) for every stored response"""
+        entries = []
+        for path in (self.cache_dir / RESPONSES_DIRNAME).glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Drop expired entries, then the least recently used until under max_bytes
+
+        Returns the number of entries removed.
+        """
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Remove every cached response and reset the counters"""
+        for _, _, path in self._entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        try:
+            (self.cache_dir / STATS_FILENAME).unlink()
+        except OSError:
+            pass
+
+    def status(self):
+        """Entry count, size and hit/miss counters"""
+        entries = self._entries()
+        return {
+            "path": str(self.cache_dir),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            **self.stats(),
+        }
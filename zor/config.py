@@ -15,6 +15,37 @@ DEFAULT_CONFIG = {
     "backup_files": True,
     "history_size": 10,
     "rate_limit_retries": 3,
+    "use_index": True,
+    "context_workers": 0,
+    "use_git_index": True,
+    "retrieval_top_k": 20,
+    "retrieval_budget_tokens": 200000,
+    "retrieval_granularity": "chunk",
+    "deps_hops": 1,
+    "context_mode": {"edit": "outline", "generate_test": "outline"},
+    "watch": True,
+    "lazy_context": True,
+    "workspace": [],
+    "exclude_generated": True,
+    "large_file_size": 1_000_000,
+    "large_file_policy": "outline",
+    "large_file_window_bytes": 16384,
+    "dedup": True,
+    "dedup_threshold": 0.85,
+    "minify": "light",
+    "context_budget_tokens": 0,
+    "pinned_files": [],
+    "packing_strategy": "greedy",
+    "stream": False,
+    "response_cache": True,
+    "response_cache_max_bytes": 64 * 1024 * 1024,
+    "response_cache_max_age_days": 30,
+    "server_cache": False,
+    "server_cache_ttl_seconds": 3600,
+    "server_cache_min_tokens": 32768,
+    "server_cache_max_entries": 4,
+    "max_concurrent_requests": 4,
+    "request_timeout_seconds": 0,
 }
 
 def get_config_path():
@@ -1,8 +1,50 @@
+import ast
+import mmap
 import os
+import re
+import stat
+import subprocess
+import sys
+import time
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 import fnmatch
 from .config import load_config
+from collections import Counter
+from collections.abc import Mapping
+from .index import INDEX_DIRNAME, blob_digest, derive_cached, indexed_digests, open_index, stat_key, text_digest
+from .generated import classify_name, classify_sample
+from .large import LargeFilePolicy
+
+# Default exclusion lists with wildcards
+DEFAULT_EXCLUDE_DIRS = [
+    "node_modules", ".venv", "venv", ".git", "__pycache__", 
+    "dist", "build", ".pytest_cache", ".next", ".*"
+]
+
+DEFAULT_EXCLUDE_FILES = [
+    ".env", "*.pyc", "*.jpg", "*.png", "*.pdf", "*.lock"
+]
+
+# Common binary and unwanted extensions
+DEFAULT_EXCLUDE_EXTENSIONS = [
+    ".zip", ".tar", ".gz", ".rar", ".7z", ".jar", ".war", ".ear",
+    ".class", ".obj", ".dll", ".exe", ".so", ".dylib",
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".ico", ".svg", ".webp",
+    ".mp3", ".mp4", ".avi", ".mov", ".flv", ".wmv", ".wav", ".ogg",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".db", ".sqlite", ".sqlite3", ".mdb", ".accdb",
+    ".pyc", ".pyo", ".pyd", ".o", ".a", ".lib"
+]
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+# Leading bytes checked for NUL bytes before a file is treated as text
+SNIFF_SIZE = 8192
+
+# Verdicts needed, all agreeing, before an extension skips sniffing
+EXTENSION_VERDICT_MIN_SAMPLES = 20
 
 def is_binary_file(file_path):
     """Check if a file is binary by reading a small sample"""
@@ -50,79 +92,937 @@ def should_exclude_file(file_path, exclude_files, exclude_extensions):
     
     return False
 
-def get_codebase_context(project_root="."):
-    """Walk through the codebase and create a structured context"""
+class ExclusionMatcher:
+    """Exclusion rules compiled once from the `exclude_*` config lists
+
+    Literal names and extensions are looked up in frozensets and all glob
+    patterns of a kind are merged into a single regex, so a check costs a
+    couple of hash lookups and at most one regex match however long the
+    lists are. It matches what `should_exclude_directory` and
+    `should_exclude_file` (minus the binary sniff) match.
+    """
+
+    def __init__(self, exclude_dirs=(), exclude_files=(), exclude_extensions=()):
+        self.exclude_dirs = list(exclude_dirs)
+        self.exclude_files = list(exclude_files)
+        self.exclude_extensions = list(exclude_extensions)
+        self._dir_names, self._dir_regex = self._compile(self.exclude_dirs)
+        self._file_names, self._file_regex = self._compile(self.exclude_files)
+        self._extensions = frozenset(ext.lower() for ext in self.exclude_extensions)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a matcher from a loaded config dict"""
+        return cls(
+            config.get("exclude_dirs", DEFAULT_EXCLUDE_DIRS),
+            config.get("exclude_files", DEFAULT_EXCLUDE_FILES),
+            config.get("exclude_extensions", DEFAULT_EXCLUDE_EXTENSIONS),
+        )
+
+    @staticmethod
+    def _compile(patterns):
+        """Split patterns into a set of literal names and one compiled glob regex"""
+        # fnmatch.fnmatch normalises case the same way on Windows
+        patterns = [os.path.normcase(p) for p in patterns]
+        literals = frozenset(p for p in patterns if not _GLOB_CHARS.search(p))
+        globs = [p for p in patterns if _GLOB_CHARS.search(p)]
+        regex = re.compile("|".join(fnmatch.translate(p) for p in globs)) if globs else None
+        return literals, regex
+
+    def extend(self, exclude_dirs=(), exclude_files=(), exclude_extensions=()):
+        """Return a new matcher with extra patterns, e.g. from an ignore file"""
+        return ExclusionMatcher(
+            self.exclude_dirs + list(exclude_dirs),
+            self.exclude_files + list(exclude_files),
+            self.exclude_extensions + list(exclude_extensions),
+        )
+
+    def excludes_dir(self, dir_name):
+        """Check if a directory name should be excluded"""
+        dir_name = os.path.normcase(dir_name)
+        if dir_name in self._dir_names:
+            return True
+        return self._dir_regex is not None and self._dir_regex.match(dir_name) is not None
+
+    def excludes_file(self, file_name):
+        """Check if a file name should be excluded based on name or extension"""
+        file_name = os.path.normcase(os.path.basename(file_name))
+        if file_name in self._file_names:
+            return True
+        if self._file_regex is not None and self._file_regex.match(file_name) is not None:
+            return True
+        return os.path.splitext(file_name)[1].lower() in self._extensions
+
+    def explain(self, relative_path):
+        """Name the rule excluding a path, e.g. "exclude_dirs: node_modules", or None
+
+        Slower than the `excludes_*` checks; only used for reporting.
+        """
+        parts = [p for p in relative_path.replace(os.sep, "/").split("/") if p not in (".", "..")]
+        for part in parts[:-1]:
+            for pattern in self.exclude_dirs:
+                if fnmatch.fnmatch(os.path.normcase(part), os.path.normcase(pattern)):
+                    return f"exclude_dirs: {pattern}"
+        name = os.path.normcase(parts[-1]) if parts else ""
+        for pattern in self.exclude_files:
+            if fnmatch.fnmatch(name, os.path.normcase(pattern)):
+                return f"exclude_files: {pattern}"
+        ext = os.path.splitext(name)[1].lower()
+        if ext in self._extensions:
+            return f"exclude_extensions: {ext}"
+        return None
+
+    def excludes_path(self, relative_path):
+        """Check a relative file path, including every directory above it"""
+        parts = relative_path.replace(os.sep, "/").split("/")
+        # Roots outside the project ("../libs") are not hidden directories
+        while parts[:1] in (["."], [".."]):
+            parts.pop(0)
+        if any(self.excludes_dir(part) for part in parts[:-1]):
+            return True
+        return self.excludes_file(parts[-1])
+
+class ContextScope:
+    """Which part of a project a context collection covers
+
+    `roots` are directories relative to the project root (collected in
+    parallel, each file keyed by its path from the project root, so files of
+    different roots never collide); `include` and `exclude` are globs on
+    those paths. A glob without "/" also matches the file name alone.
+    """
+
+    def __init__(self, roots=(), include=(), exclude=()):
+        roots = [os.path.normpath(root).replace(os.sep, "/") for root in roots]
+        # "." covers everything, so it makes any other root redundant
+        self.roots = [] if "." in roots else sorted(set(roots))
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    @classmethod
+    def from_options(cls, paths=None, include=None, exclude=None, config=None):
+        """Scope from command-line options, falling back to the `workspace` config roots"""
+        roots = list(paths or ()) or list((config or {}).get("workspace") or ())
+        return cls(roots, include or (), exclude or ())
+
+    @property
+    def restricted(self):
+        """False when the scope covers the whole project"""
+        return bool(self.roots or self.include or self.exclude)
+
+    @staticmethod
+    def _matches(path, patterns):
+        name = path.rsplit("/", 1)[-1]
+        return any(
+            fnmatch.fnmatch(path, pattern) or ("/" not in pattern and fnmatch.fnmatch(name, pattern))
+            for pattern in patterns
+        )
+
+    def covers(self, relative_path):
+        """Check whether a path relative to the project root is in scope"""
+        path = relative_path.replace(os.sep, "/")
+        if self.roots and not any(path == root or path.startswith(root + "/") for root in self.roots):
+            return False
+        if self.include and not self._matches(path, self.include):
+            return False
+        return not self._matches(path, self.exclude)
+
+def _decode_text(data):
+    """Decode file bytes (or any bytes-like buffer) as UTF-8 text with universal newlines"""
+    text = str(data, "utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def _find_git_dir(project_root):
+    """Return True if project_root is inside a git work tree (by looking for `.git`)"""
+    current = Path(project_root).resolve()
+    for candidate in [current] + list(current.parents):
+        if (candidate / ".git").exists():
+            return True
+    return False
+
+def _git_ls_files(project_root, *args):
+    """Run `git ls-files -z` with extra arguments and return the listed entries"""
+    result = subprocess.run(
+        ["git", "ls-files", "-z", *args],
+        cwd=project_root,
+        capture_output=True,
+        check=True,
+    )
+    return [item for item in os.fsdecode(result.stdout).split("\0") if item]
+
+def git_list_files(project_root=".", roots=()):
+    """List the files git would consider part of the project, with blob hashes
+
+    Uses `git ls-files --cached --others --exclude-standard`, so `.gitignore`
+    is honoured for free. Returns a dict mapping paths relative to
+    project_root to the blob hash from `git ls-files -s`; the hash is None for
+    untracked, locally modified, conflicted or symlinked files, whose content
+    git has not verified. `roots` limits the listing to some directories.
+    Returns None outside a git work tree or when git is unavailable.
+    """
+    if not _find_git_dir(project_root):
+        return None
+    pathspecs = ["--", *roots] if roots else []
+    try:
+        listed = _git_ls_files(project_root, "--cached", "--others", "--exclude-standard", *pathspecs)
+        staged = _git_ls_files(project_root, "--stage", *pathspecs)
+        modified = set(_git_ls_files(project_root, "--modified", *pathspecs))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    hashes = {}
+    for line in staged:
+        info, path = line.split("\t", 1)
+        mode, digest, stage_number = info.split()
+        # Only regular files at stage 0 have a blob hash that matches the work tree
+        if mode in ("100644", "100755") and stage_number == "0" and path not in modified:
+            hashes[path] = digest
+
+    return {path: hashes.get(path) for path in listed}
+
+class ExtensionStats:
+    """Per-extension tally of binary/text verdicts
+
+    Once an extension has been seen often enough and always binary, files
+    with it are not read at all. Files of always-text extensions are still
+    sniffed, since a stray binary file can be valid UTF-8.
+    """
+
+    def __init__(self, min_samples=EXTENSION_VERDICT_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self.counts = {}
+
+    @staticmethod
+    def _extension(file_name):
+        return os.path.splitext(file_name)[1].lower()
+
+    def add(self, file_name, is_binary):
+        """Record the verdict for one file"""
+        ext = self._extension(file_name)
+        # Extensionless files (Makefile, LICENSE, compiled tools...) vary too much
+        if not ext:
+            return
+        counts = self.counts.setdefault(ext, [0, 0])
+        counts[1 if is_binary else 0] += 1
+
+    def verdict(self, file_name):
+        """Return "text", "binary" or None if the extension is not settled yet"""
+        text, binary = self.counts.get(self._extension(file_name), (0, 0))
+        if text >= self.min_samples and not binary:
+            return "text"
+        if binary >= self.min_samples and not text:
+            return "binary"
+        return None
+
+def read_text(file_path):
+    """Read and decode a text file through a read-only memory map
+
+    The file is decoded straight from the mapping, so no intermediate bytes
+    copy is made.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return _decode_text(view)
+
+class LazyContext(Mapping):
+    """Read-only {relative_path: text} mapping that reads files on access
+
+    Only the paths and their byte sizes are held in memory; each lookup maps
+    the file and decodes it, so holding a LazyContext for a large repo costs
+    almost nothing and the text of a file lives only as long as the caller
+    keeps it. `overrides` replace the on-disk text of some paths (truncated
+    or generated entries). A file deleted since collection reads as "".
+    """
+
+    def __init__(self, project_root, sizes, overrides=None):
+        self.project_root = project_root
+        self._sizes = dict(sizes)
+        self._overrides = dict(overrides or {})
+        for path, text in self._overrides.items():
+            self._sizes.setdefault(path, len(text))
+
+    def __getitem__(self, path):
+        if path in self._overrides:
+            return self._overrides[path]
+        if path not in self._sizes:
+            raise KeyError(path)
+        try:
+            return read_text(os.path.join(self.project_root, path))
+        except (OSError, ValueError):
+            return ""
+
+    def __iter__(self):
+        return iter(self._sizes)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, path):
+        return path in self._sizes
+
+    def is_overridden(self, path):
+        """Whether an entry's text is held in memory rather than read from disk"""
+        return path in self._overrides
+
+    def size(self, path):
+        """Size of an entry in bytes, an upper bound on its length in characters"""
+        if path in self._overrides:
+            return len(self._overrides[path])
+        return self._sizes[path]
+
+    def total_size(self):
+        """Sum of the entry sizes, without reading anything"""
+        return sum(self.size(path) for path in self._sizes)
+
+    def subset(self, paths, overrides=None):
+        """Return a LazyContext over some of the paths, in the given order"""
+        merged = {p: t for p, t in self._overrides.items() if p in set(paths)}
+        merged.update(overrides or {})
+        return LazyContext(
+            self.project_root,
+            {path: self._sizes.get(path, 0) for path in paths},
+            merged,
+        )
+
+def subset_context(context, paths, overrides=None):
+    """Take some paths of a context, replacing the text of `overrides`
+
+    A LazyContext stays lazy; any other mapping gives a dict.
+    """
+    overrides = overrides or {}
+    subset = getattr(context, "subset", None)
+    if subset is not None:
+        return subset(paths, overrides)
+    return {path: overrides.get(path, context[path]) for path in paths}
+
+def context_size(context):
+    """Upper bound on the characters in a context, without reading a LazyContext"""
+    total_size = getattr(context, "total_size", None)
+    if total_size is not None:
+        return total_size()
+    return sum(len(text) for text in context.values())
+
+def _sniff_binary(chunk):
+    """Check a leading byte sample for NUL bytes, which indicate binary data"""
+    return b"\x00" in chunk
+
+# Marks a text file whose content was not loaded from the index
+_UNREAD = object()
+
+class _LargeView(str):
+    """Text standing in for a file above the large-file threshold
+
+    Kept in memory even by lazy collection, since re-reading the file would
+    give the whole file rather than the view.
+    """
+
+class _Collector:
+    """Shared state for one context collection run
+
+    The scan/load methods run on worker threads and return per-task Counters
+    along with their results; only the calling thread mutates the index and
+    the extension statistics.
+    """
+
+    def __init__(self, project_root, matcher, index, ext_stats, keep_text=True, large_files=None,
+                 exclude_generated=True, scope=None, explain=False):
+        self.project_root = project_root
+        self.matcher = matcher
+        self.index = index
+        self.ext_stats = ext_stats
+        # Lazy collection only keeps sizes; file text is read again on use
+        self.keep_text = keep_text
+        self.large_files = large_files or LargeFilePolicy()
+        # Generated, minified and lock files are classified either way and
+        # only left out when this is set
+        self.exclude_generated = exclude_generated
+        self.scope = scope or ContextScope()
+        # Count exclusions per rule (for `zor context-stats`)
+        self.explain = explain
+
+    def _excluded(self, counters, rule):
+        if self.explain:
+            counters[f"excluded:{rule}"] += 1
+
+    def _result(self, relative_path, content, st, update):
+        """Build a result tuple, replacing text by its size for lazy collection"""
+        if not self.keep_text and content is not None and not isinstance(content, _LargeView):
+            content = st.st_size if content is _UNREAD or content.strip() else None
+        return relative_path, content, update
+
+    def load_path(self, file_path, relative_path, st, counters, known_digest=None):
+        """Load a file, or a view of it when it is above the large-file threshold
+
+        Large files bypass the index: only their view is read, and the view
+        depends on the policy rather than on the content alone. Outlines are
+        cached in the index by stat key.
+        """
+        # Lockfiles and known generated names are skipped without a read
+        generated = classify_name(relative_path) if self.exclude_generated else None
+        if generated:
+            counters["generated"] += 1
+            self._excluded(counters, f"generated: {generated}")
+            return None, None
+        if not self.large_files.is_large(st.st_size):
+            return self.load_file(file_path, relative_path, st, counters, known_digest)
+        counters["large_files"] += 1
+        started = time.perf_counter()
+        view = self.large_files.render(file_path, relative_path, st.st_size, self.index, st)
+        counters["seconds_read"] += time.perf_counter() - started
+        if view is None:
+            self._excluded(counters, f"large_file_policy: {self.large_files.policy}")
+            return None, None
+        counters["files_read"] += 1
+        return _LargeView(view), None
+
+    def load_file(self, file_path, relative_path, st, counters, known_digest=None):
+        """Load one file, returning (content, index_update)
+
+        `content` is None for binary or unreadable files. `index_update` holds
+        the arguments for `FileIndex.put` when the index needs refreshing,
+        else None. `known_digest` is a trusted content hash (e.g. from git)
+        that lets an unchanged file be reused even when its stat key changed.
+        """
+        index = self.index
+        entry = None
+        if index is not None:
+            started = time.perf_counter()
+            entry = index.lookup(relative_path, st, known_digest, with_text=self.keep_text)
+            counters["seconds_index"] += time.perf_counter() - started
+        if entry is not None:
+            counters["reused"] += 1
+            excluded = self.exclude_generated and entry["generated"]
+            if excluded:
+                counters["generated"] += 1
+                self._excluded(counters, f"generated: {entry['generated']}")
+            elif entry["is_binary"]:
+                self._excluded(counters, "binary")
+            if (entry["size"], entry["mtime_ns"], entry["inode"]) != stat_key(st):
+                # Content verified by digest; only the stat key needs refreshing
+                if entry["text"] is None and not entry["is_binary"]:
+                    entry = index.get(relative_path)
+                update = (st, entry["digest"], entry["is_binary"], entry["text"], entry["generated"])
+                return (None if excluded else entry["text"]), update
+            if excluded:
+                return None, None
+            if entry["text"] is None and not entry["is_binary"]:
+                return _UNREAD, None
+            return entry["text"], None
+
+        verdict = self.ext_stats.verdict(file_path)
+        if verdict == "binary":
+            counters["sniff_skipped"] += 1
+            self._excluded(counters, "binary")
+            return None, (st, "", True, None)
+
+        # Read the file once: sniff the leading bytes, then read the rest only
+        # if it looks like text
+        counters["files_read"] += 1
+        started = time.perf_counter()
+        with open(file_path, "rb") as f:
+            data = f.read(SNIFF_SIZE)
+            sniffed = time.perf_counter()
+            counters["seconds_sniff"] += sniffed - started
+            # Always sniffed: NUL bytes decode as UTF-8, and the check is a
+            # scan of bytes already read
+            if _sniff_binary(data):
+                counters["bytes_read"] += len(data)
+                self._excluded(counters, "binary")
+                return None, (st, "", True, None)
+            if len(data) == SNIFF_SIZE:
+                data += f.read()
+            counters["seconds_read"] += time.perf_counter() - sniffed
+        counters["bytes_read"] += len(data)
+
+        started = time.perf_counter()
+        try:
+            content = _decode_text(data)
+        except UnicodeDecodeError:
+            self._excluded(counters, "binary")
+            return None, (st, blob_digest(data), True, None)
+        finally:
+            counters["seconds_decode"] += time.perf_counter() - started
+        # Classified on the sniff sample; the text is indexed regardless so
+        # turning exclusion off needs no re-read
+        generated = classify_sample(data[:SNIFF_SIZE], relative_path)
+        update = (st, blob_digest(data), False, content, generated)
+        if generated and self.exclude_generated:
+            counters["generated"] += 1
+            self._excluded(counters, f"generated: {generated}")
+            return None, update
+        return content, update
+
+    def scan_directory(self, dir_path):
+        """Scan one directory and load its files; runs on a worker thread
+
+        Returns (subdirectories, counters, results) where each result is
+        (relative_path, content, index_update).
+        """
+        subdirs = []
+        results = []
+        counters = Counter(directories=1)
+        started = time.perf_counter()
+        try:
+            with os.scandir(dir_path) as entries:
+                entries = list(entries)
+        except OSError:
+            # Unreadable directories are skipped, as os.walk does
+            return subdirs, counters, results
+        finally:
+            counters["seconds_walk"] += time.perf_counter() - started
+
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    # Like os.walk, symlinked directories are not descended into
+                    if entry.is_symlink() or entry.name == INDEX_DIRNAME:
+                        continue
+                    if self.matcher.excludes_dir(entry.name):
+                        self._excluded(counters, self.matcher.explain(entry.name + "/"))
+                    else:
+                        subdirs.append(entry.path)
+                    continue
+
+                counters["files"] += 1
+                # Skip excluded files before paying for a stat (the binary
+                # check is answered by the index when possible)
+                if self.matcher.excludes_file(entry.name):
+                    self._excluded(counters, self.matcher.explain(entry.name))
+                    continue
+
+                # Use a path that's relative to project_root for better context
+                relative_path = os.path.relpath(entry.path, self.project_root)
+                if not self.scope.covers(relative_path):
+                    self._excluded(counters, "scope")
+                    continue
+
+                # DirEntry caches its stat result, so each file is stat'ed once
+                started = time.perf_counter()
+                st = entry.stat()
+                counters["seconds_stat"] += time.perf_counter() - started
+                content, update = self.load_path(entry.path, relative_path, st, counters)
+                results.append(self._result(relative_path, content, st, update))
+            except (UnicodeDecodeError, PermissionError, OSError):
+                # Skip files that can't be read as text
+                continue
+
+        return subdirs, counters, results
+
+    def load_listed_files(self, items):
+        """Stat, filter and load a batch of (relative_path, git_digest) pairs; runs on a worker thread"""
+        results = []
+        counters = Counter()
+        for relative_path, digest in items:
+            try:
+                file_path = os.path.join(self.project_root, relative_path)
+                started = time.perf_counter()
+                st = os.stat(file_path)
+                counters["seconds_stat"] += time.perf_counter() - started
+                # Skip submodules, symlinked directories and anything else that isn't a file
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+
+                relative_path = os.path.normpath(relative_path)
+                content, update = self.load_path(file_path, relative_path, st, counters, digest)
+                results.append(self._result(relative_path, content, st, update))
+            except (UnicodeDecodeError, PermissionError, OSError):
+                # Skip deleted files and files that can't be read as text
+                continue
+        return counters, results
+
+def _default_workers():
+    """Default size of the context collection thread pool"""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+def get_codebase_context(project_root=".", stats=None, lazy=False, scope=None, explain=False):
+    """Walk through the codebase and create a structured context
+
+    If a `stats` dict is given it is filled with counters for the run
+    (files seen, files read, bytes read, files reused from the index...).
+    With `lazy=True` the result is a `LazyContext` that reads each file when
+    it is accessed instead of a dict holding every file's text. A
+    `ContextScope` limits collection to some roots and globs; only those
+    roots are walked. With `explain=True` the stats also count exclusions
+    per rule ("excluded:<rule>").
+
+    Seconds spent per phase ("seconds_walk", "seconds_stat", "seconds_index",
+    "seconds_sniff", "seconds_read", "seconds_decode") are summed over the
+    worker threads, so they can add up to more than "seconds_total".
+    Progress messages go to stderr to keep command output clean.
+    """
+    started = time.perf_counter()
+    scope = scope or ContextScope()
     config = load_config()
     
-    # Default exclusion lists with wildcards
-    exclude_dirs = config.get("exclude_dirs", [
-        "node_modules", ".venv", "venv", ".git", "__pycache__", 
-        "dist", "build", ".pytest_cache", ".next", ".*"
-    ])
-    
-    exclude_files = config.get("exclude_files", [
-        ".env", "*.pyc", "*.jpg", "*.png", "*.pdf", "*.lock"
-    ])
-    
-    # Common binary and unwanted extensions
-    exclude_extensions = config.get("exclude_extensions", [
-        ".zip", ".tar", ".gz", ".rar", ".7z", ".jar", ".war", ".ear",
-        ".class", ".obj", ".dll", ".exe", ".so", ".dylib",
-        ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".ico", ".svg", ".webp",
-        ".mp3", ".mp4", ".avi", ".mov", ".flv", ".wmv", ".wav", ".ogg",
-        ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
-        ".db", ".sqlite", ".sqlite3", ".mdb", ".accdb",
-        ".pyc", ".pyo", ".pyd", ".o", ".a", ".lib"
-    ])
+    matcher = ExclusionMatcher.from_config(config)
+    
+    workers = config.get("context_workers") or _default_workers()
     
     # Initialize mimetypes
     mimetypes.init()
     
     # Debug information
-    print(f"Starting context collection from {project_root}")
-    print(f"Excluding directories matching: {exclude_dirs}")
-    
-    context = {}
-    file_count = 0
-    dir_count = 0
-    
-    # Use os.walk which traverses directories recursively
-    for root, dirs, files in os.walk(project_root):
-        dir_count += 1
-        
-        # Filter out excluded directories before traversal continues
-        # This modifies dirs in-place to avoid traversing excluded directories
-        dirs[:] = [d for d in dirs if not should_exclude_directory(d, exclude_dirs)]
-        
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_count += 1
-            
-            try:
-                # Skip large files
-                file_size = os.path.getsize(file_path)
-                if file_size > 1_000_000:  # 1MB
-                    continue
-                
-                # Skip excluded files
-                if should_exclude_file(file_path, exclude_files, exclude_extensions):
-                    continue
-                
-                # Read the file content
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    
-                # Add to context if not empty
-                if content.strip():
-                    # Use a path that's relative to project_root for better context
-                    relative_path = os.path.relpath(file_path, project_root)
-                    context[relative_path] = content
-                    
-            except (UnicodeDecodeError, PermissionError, OSError) as e:
-                # Skip files that can't be read as text
-                continue
+    print(f"Starting context collection from {project_root}", file=sys.stderr)
+    print(f"Excluding directories matching: {matcher.exclude_dirs}", file=sys.stderr)
+    if scope.restricted:
+        print(f"Limiting context to roots {scope.roots or ['.']}, include {scope.include}, exclude {scope.exclude}",
+              file=sys.stderr)
+    
+    index = open_index(project_root, config, load_text=not lazy)
+    
+    # Extension verdicts are learned from everything already in the index
+    ext_stats = ExtensionStats()
+    if index is not None:
+        for path, is_binary in index.verdicts():
+            ext_stats.add(path, is_binary)
     
-    print(f"Processed {dir_count} directories and {file_count} files")
-    print(f"Added {len(context)} files to context")
+    collector = _Collector(project_root, matcher, index, ext_stats, keep_text=not lazy,
+                           large_files=LargeFilePolicy.from_config(config),
+                           exclude_generated=config.get("exclude_generated", True),
+                           scope=scope, explain=explain)
+    collected = {}
+    counters = Counter(dict.fromkeys(
+        ("directories", "files", "files_read", "bytes_read", "sniff_skipped", "reused", "large_files", "generated"), 0
+    ))
+    
+    def record(task_counters, results):
+        counters.update(task_counters)
+        for relative_path, content, update in results:
+            collected[relative_path] = content
+            if update is not None:
+                ext_stats.add(relative_path, update[2])
+                if index is not None:
+                    index.put(relative_path, *update)
+    
+    listing_started = time.perf_counter()
+    git_files = git_list_files(project_root, scope.roots) if config.get("use_git_index", True) else None
+    counters["seconds_walk"] += time.perf_counter() - listing_started
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        if git_files is not None:
+            # git already knows the (non-ignored) file set, so no directory
+            # walk is needed; the exclusion rules still apply on top of it
+            listed = [
+                (path, digest) for path, digest in git_files.items()
+                if not path.startswith(INDEX_DIRNAME + "/") and not matcher.excludes_path(path)
+                and scope.covers(path)
+            ]
+            if explain:
+                for path in git_files:
+                    if path.startswith(INDEX_DIRNAME + "/"):
+                        continue
+                    rule = matcher.explain(path) or (None if scope.covers(path) else "scope")
+                    if rule:
+                        counters[f"excluded:{rule}"] += 1
+            counters["files"] = len(git_files)
+            counters["directories"] = len({os.path.dirname(path) for path in git_files})
+            batch_size = 256
+            futures = [
+                pool.submit(collector.load_listed_files, listed[i:i + batch_size])
+                for i in range(0, len(listed), batch_size)
+            ]
+            # Record batches as they finish so their text is not held until
+            # every earlier batch is done
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(*future.result())
+        else:
+            # Directories are scanned breadth-first on a bounded pool; each
+            # task also stats and reads the files of its directory
+            roots = [os.path.join(project_root, root) for root in scope.roots] or [project_root]
+            pending = {pool.submit(collector.scan_directory, root) for root in roots if not os.path.isfile(root)}
+            # A root naming a file is loaded on its own, with the rules a
+            # listed file gets
+            files = [
+                (root, None) for root in scope.roots
+                if os.path.isfile(os.path.join(project_root, root))
+                and not matcher.excludes_path(root) and scope.covers(root)
+            ]
+            if files:
+                counters["files"] += len(files)
+                pending.add(pool.submit(lambda: ([],) + collector.load_listed_files(files)))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subdirs, task_counters, results = future.result()
+                    for subdir in subdirs:
+                        pending.add(pool.submit(collector.scan_directory, subdir))
+                    record(task_counters, results)
+    
+    if index is not None:
+        # Entries outside the scope were not looked at, so they stay
+        index.prune(collected, scope.covers if scope.restricted else None)
+        index.close()
+    
+    # Add non-empty text files, ordered by path so the result is deterministic
+    if lazy:
+        paths = [path for path in sorted(collected) if collected[path] is not None]
+        context = LazyContext(
+            project_root,
+            {path: collected[path] for path in paths if not isinstance(collected[path], _LargeView)},
+            {path: str(collected[path]) for path in paths if isinstance(collected[path], _LargeView)},
+        )
+    else:
+        context = {
+            path: collected[path]
+            for path in sorted(collected)
+            if collected[path] is not None and collected[path].strip()
+        }
+    
+    print(f"Processed {counters['directories']} directories and {counters['files']} files", file=sys.stderr)
+    print(f"Added {len(context)} files to context ({counters['reused']} unchanged files reused from index, "
+          f"{counters['files_read']} files / {counters['bytes_read']} bytes read)", file=sys.stderr)
+    if counters["generated"]:
+        print(f"Skipped {counters['generated']} generated, minified or lock files", file=sys.stderr)
+    
+    if stats is not None:
+        stats.update(counters)
+        stats["context_files"] = len(context)
+        stats["seconds_total"] = time.perf_counter() - started
     
     return context
+
+
+# Source chunking
+#
+# Chunks cover a file contiguously: every line belongs to exactly one chunk,
+# so a file can be reassembled from any subset of its chunks with the rest
+# elided. Each chunk is {"name", "kind", "start", "end", "digest"} with
+# 1-based inclusive line numbers; `chunk_files` adds a stable "id".
+
+MODULE_CHUNK = "<module>"
+
+_CODE_EXTENSIONS = {
+    ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".java", ".kt", ".scala",
+    ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift",
+    ".rb", ".php", ".lua", ".sh", ".bash",
+}
+_MARKDOWN_EXTENSIONS = {".md", ".markdown", ".rst"}
+
+_MODIFIERS = r"(?:(?:export|default|pub(?:\([\w:]+\))?|public|private|protected|internal|static|async|abstract|final|sealed|open|override|unsafe|extern|inline|virtual)\s+)*"
+_BLOCK_START_RE = re.compile(
+    r"^" + _MODIFIERS + r"(?:"
+    r"(?:function\*?|class|interface|struct|enum|impl|trait|fn|def|type|module|object|namespace)\s+(?P<name>[A-Za-z_$][\w$]*)"
+    r"|func\s*(?:\([^)]*\)\s*)?(?P<func>[A-Za-z_]\w*)"
+    r"|(?:const|let|var)\s+(?P<var>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"
+    r")"
+)
+_BLOCK_END_RE = re.compile(r"^(?:[}\]]|end\b)")
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*?)\s*#*\s*$")
+
+
+def split_lines(text):
+    """Split on "\\n" only (unlike str.splitlines), keeping the line endings"""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def _cover(spans, start, end, gap_name, gap_kind, lines):
+    """Fill the lines between spans with gap chunks so [start, end] is covered
+
+    Gaps holding only blank lines are folded into the preceding chunk.
+    """
+    chunks = []
+    position = start
+    for span in spans + [None]:
+        gap_end = (span[0] - 1) if span is not None else end
+        if gap_end >= position:
+            blank = all(not lines[i - 1].strip() for i in range(position, gap_end + 1))
+            if blank and chunks:
+                chunks[-1][1] = gap_end
+            else:
+                chunks.append([position, gap_end, gap_name, gap_kind])
+        if span is None:
+            break
+        chunks.append(list(span))
+        position = span[1] + 1
+    return chunks
+
+
+def _python_spans(text, lines):
+    """Chunk Python by top-level functions and classes, and classes by method"""
+    tree = ast.parse(text)
+    defs = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def span_of(node):
+        first = min([d.lineno for d in node.decorator_list] + [node.lineno])
+        return first, node.end_lineno
+
+    spans = []
+    for node in tree.body:
+        if not isinstance(node, defs):
+            continue
+        start, end = span_of(node)
+        if isinstance(node, ast.ClassDef):
+            methods = [
+                span_of(child) + (f"{node.name}.{child.name}", "method")
+                for child in node.body if isinstance(child, defs)
+            ]
+            if methods:
+                spans.append((start, end, node.name, "class", methods))
+                continue
+            spans.append((start, end, node.name, "class", None))
+        else:
+            spans.append((start, end, node.name, "function", None))
+
+    chunks = []
+    outer = _cover([s[:4] for s in spans], 1, len(lines), MODULE_CHUNK, "module", lines)
+    nested = {s[0]: s for s in spans if s[4]}
+    for chunk in outer:
+        span = nested.get(chunk[0])
+        if span is not None and chunk[2] == span[2]:
+            # The class body lines outside its methods stay under the class name
+            chunks.extend(_cover(span[4], chunk[0], chunk[1], span[2], "class", lines))
+        else:
+            chunks.append(chunk)
+    return chunks
+
+
+def _heuristic_spans(lines):
+    """Chunk brace/indent languages at top-level definitions"""
+    starts = []
+    for number, line in enumerate(lines, 1):
+        match = _BLOCK_START_RE.match(line)
+        if match:
+            name = match.group("name") or match.group("func") or match.group("var")
+            starts.append((number, name))
+
+    spans = []
+    for i, (start, name) in enumerate(starts):
+        limit = starts[i + 1][0] - 1 if i + 1 < len(starts) else len(lines)
+        end = limit
+        # A closing brace (or `end`) at column 0 ends the block early
+        for number in range(start + 1, limit + 1):
+            if _BLOCK_END_RE.match(lines[number - 1]):
+                end = number
+                break
+        spans.append((start, end, name, "block"))
+    return _cover(spans, 1, len(lines), MODULE_CHUNK, "module", lines)
+
+
+def _markdown_spans(lines):
+    """Chunk prose by headings"""
+    spans = []
+    starts = [
+        (number, match.group(1))
+        for number, match in ((n, _HEADING_RE.match(line)) for n, line in enumerate(lines, 1))
+        if match
+    ]
+    for i, (start, title) in enumerate(starts):
+        end = starts[i + 1][0] - 1 if i + 1 < len(starts) else len(lines)
+        spans.append((start, end, title, "section"))
+    return _cover(spans, 1, len(lines), MODULE_CHUNK, "module", lines)
+
+
+def chunk_language(file_path):
+    """Pick the chunker for a file: python, code, markdown or text"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in (".py", ".pyi"):
+        return "python"
+    if ext in _CODE_EXTENSIONS:
+        return "code"
+    if ext in _MARKDOWN_EXTENSIONS:
+        return "markdown"
+    return "text"
+
+
+def chunk_source(text, language="python"):
+    """Split source text into contiguous chunks (without ids)"""
+    lines = split_lines(text)
+    if not lines:
+        return []
+    spans = None
+    if language == "python":
+        try:
+            spans = _python_spans(text, lines)
+        except (SyntaxError, ValueError):
+            spans = None
+    if spans is None and language in ("python", "code"):
+        spans = _heuristic_spans(lines)
+    elif language == "markdown":
+        spans = _markdown_spans(lines)
+    elif spans is None:
+        spans = [[1, len(lines), MODULE_CHUNK, "module"]]
+
+    return [
+        {
+            "name": name,
+            "kind": kind,
+            "start": start,
+            "end": end,
+            "digest": text_digest("".join(lines[start - 1:end])),
+        }
+        for start, end, name, kind in spans
+    ]
+
+
+def _assign_chunk_ids(path, chunks):
+    """Give chunks ids that survive edits elsewhere in the file: path#name(~n)"""
+    seen = Counter()
+    for chunk in chunks:
+        seen[chunk["name"]] += 1
+        suffix = f"~{seen[chunk['name']]}" if seen[chunk["name"]] > 1 else ""
+        chunk["id"] = f"{path}#{chunk['name']}{suffix}"
+    return chunks
+
+
+def chunk_files(context, index=None):
+    """Chunk every file of a context, reusing chunks cached in the index
+
+    Returns {path: [chunk, ...]}. Chunks are cached per content digest, so
+    unchanged files are never re-parsed.
+    """
+    by_language = {}
+    for path in context:
+        by_language.setdefault(chunk_language(path), []).append(path)
+
+    # Subsets keep a LazyContext lazy; files are read only to be hashed
+    # (when the index has no digest for them) or chunked
+    known = indexed_digests(index, context)
+    chunked = {}
+    for language, paths in by_language.items():
+        chunked.update(derive_cached(
+            index, f"chunks:{language}", subset_context(context, paths),
+            lambda text: chunk_source(text, language), known,
+        ))
+    return {path: _assign_chunk_ids(path, chunked[path]) for path in context}
+
+
+def chunk_text(text, chunk, lines=None):
+    """Return the source lines of one chunk"""
+    lines = lines if lines is not None else split_lines(text)
+    return "".join(lines[chunk["start"] - 1:chunk["end"]])
+
+
+def render_elided(text, chunks, keep_ids):
+    """Reassemble a file from the chunks in keep_ids, eliding the rest
+
+    Runs of consecutive elided chunks collapse into a single marker line.
+    """
+    lines = split_lines(text)
+    parts = []
+    elided = []
+
+    def flush():
+        if elided:
+            names = ", ".join(c["name"] for c in elided[:5]) + (", ..." if len(elided) > 5 else "")
+            parts.append(f"... [elided by zor: lines {elided[0]['start']}-{elided[-1]['end']}: {names}]\n")
+            elided.clear()
+
+    for chunk in chunks:
+        if chunk["id"] in keep_ids:
+            flush()
+            parts.append(chunk_text(text, chunk, lines))
+        else:
+            elided.append(chunk)
+    flush()
+    return "".join(parts)
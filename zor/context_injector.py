@@ -31,18 +31,36 @@ DEFAULT_GLOBAL = Path.home() / ".config" / "ai" / "global.md"
 HISTORY_FILENAME = ".context_history.json"
 
 
-def find_context_file(start_path: Optional[Path] = None) -> Optional[Path]:
+def find_project_root(start_path: Path) -> Path:
+    """The nearest directory at or above start_path holding `.git`, else start_path"""
+    for current in [start_path] + list(start_path.parents):
+        if (current / ".git").exists():
+            return current
+    return start_path
+
+
+def find_context_file(start_path: Optional[Path] = None, matcher=None) -> Optional[Path]:
     """Search upwards for `.context.md`. If not found, fall back to
     `~/.config/ai/global.md` if it exists.
 
+    If an `ExclusionMatcher` from `zor.context` is given, `.context.md` files
+    inside excluded directories of the project (e.g. a vendored package under
+    `node_modules`) are skipped. Only directories below the project root
+    (see `find_project_root`) are checked, so a checkout under, say, a
+    hidden directory still finds its own file.
+
     Returns the Path to the project context if found, otherwise the global
     fallback Path if it exists, or None.
     """
     if start_path is None:
         start_path = Path.cwd()
     start_path = start_path.resolve()
+    project_root = find_project_root(start_path) if matcher is not None else None
 
     for current in [start_path] + list(start_path.parents):
+        if project_root is not None and current != project_root and project_root in current.parents:
+            if any(matcher.excludes_dir(part) for part in current.relative_to(project_root).parts):
+                continue
         candidate = current / ".context.md"
         if candidate.is_file():
             return candidate
@@ -53,6 +71,16 @@ def find_context_file(start_path: Optional[Path] = None) -> Optional[Path]:
     return None
 
 
+def default_matcher():
+    """The ExclusionMatcher for the zor config, or None if it cannot be built"""
+    try:
+        from .config import load_config
+        from .context import ExclusionMatcher
+        return ExclusionMatcher.from_config(load_config())
+    except Exception:
+        return None
+
+
 def read_context_file(path: Path) -> str:
     with path.open("r", encoding="utf-8") as f:
         return f.read()
@@ -62,7 +90,7 @@ def assemble_messages(user_query: str, start_path: Optional[Path] = None) -> Lis
     """Assemble chat messages with system message containing global +
     project context, followed by the user message.
     """
-    project_ctx_path = find_context_file(start_path)
+    project_ctx_path = find_context_file(start_path, default_matcher())
     global_ctx = ""
     project_ctx = ""
 
@@ -0,0 +1,221 @@
+"""Exact and near-duplicate file detection for context deduplication.
+
+Vendored copies, generated clients and copy-pasted fixtures are replaced in
+the prompt by a one-line reference to a canonical file. Exact duplicates are
+found by content digest (only among files of equal size). Near-duplicates
+are found with MinHash signatures over token shingles and LSH banding,
+vectorised with NumPy; without NumPy only exact duplicates are removed.
+Signatures are cached per content digest in the file index.
+"""
+import re
+import zlib
+
+from .context import subset_context
+from .index import derive_cached, open_index, text_digest
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
+SIGNATURE_CACHE_KIND = "minhash"
+
+NUM_PERM = 128
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.85
+
+# Files shorter than this are left alone; the reference would save nothing
+DEDUP_MIN_SIZE = 256
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PRIME = (1 << 31) - 1
+_MASK32 = (1 << 32) - 1
+_BLOCK_ROWS = 4096
+
+_permutations = None
+
+
+def _perm_params():
+    """Fixed (a, b) MinHash permutation parameters, the same on every run"""
+    global _permutations
+    if _permutations is None:
+        rng = np.random.default_rng(0x5A0)
+        a = rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+        b = rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+def shingle_hashes(text, k=SHINGLE_SIZE):
+    """Return the distinct 32-bit hashes of the k-token shingles of a text
+
+    Tokens are hashed with crc32 rather than hash(), which is salted per
+    process, so signatures can be cached across runs.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    if len(tokens) < k:
+        return np.zeros(0, dtype=np.uint64)
+    vocab = {}
+    ids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens))
+    token_hashes = np.fromiter(
+        (zlib.crc32(t.encode("utf-8", "surrogatepass")) for t in vocab), dtype=np.uint64, count=len(vocab)
+    )[ids]
+
+    count = len(tokens) - k + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        hashes = (hashes * np.uint64(1_000_003) + token_hashes[offset:offset + count]) & np.uint64(_MASK32)
+    return np.unique(hashes)
+
+
+def minhash_signature(text):
+    """MinHash signature of a text as a list of NUM_PERM ints (empty if too short)"""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return []
+    a, b = _perm_params()
+    values = hashes % np.uint64(_PRIME)
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    # (a * x + b) mod p stays below 2**63, so uint64 never overflows
+    for start in range(0, len(values), _BLOCK_ROWS):
+        block = values[start:start + _BLOCK_ROWS, None]
+        np.minimum(signature, ((block * a + b) % np.uint64(_PRIME)).min(axis=0), out=signature)
+    return signature.tolist()
+
+
+def _canonical_order(keep):
+    """Sort key choosing the canonical file of a group: kept paths, then the shallowest"""
+    def key(path):
+        return (path not in keep, path.count("/") + path.count("\\"), len(path), path)
+    return key
+
+
+def _exact_groups(context, sizes):
+    """Group paths with identical content, hashing only files that share a size"""
+    by_size = {}
+    for path, size in sizes.items():
+        by_size.setdefault(size, []).append(path)
+    groups = {}
+    for paths in by_size.values():
+        if len(paths) < 2:
+            continue
+        for path in paths:
+            groups.setdefault(text_digest(context[path]), []).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def _near_pairs(signatures, threshold):
+    """Find (path, path, similarity) pairs via LSH banding on the signatures"""
+    paths = [path for path, sig in signatures.items() if sig]
+    if len(paths) < 2:
+        return []
+    matrix = np.asarray([signatures[path] for path in paths], dtype=np.uint64)
+    rows = NUM_PERM // LSH_BANDS
+
+    candidates = set()
+    for band in range(LSH_BANDS):
+        buckets = {}
+        chunk = matrix[:, band * rows:(band + 1) * rows]
+        for number, key in enumerate(map(bytes, chunk)):
+            buckets.setdefault(key, []).append(number)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+
+    pairs = []
+    for i, j in candidates:
+        similarity = float(np.mean(matrix[i] == matrix[j]))
+        if similarity >= threshold:
+            pairs.append((paths[i], paths[j], similarity))
+    return pairs
+
+
+def _candidate_sizes(context):
+    """Sizes of the files large enough to deduplicate (synthetic "_" entries excluded)"""
+    size = getattr(context, "size", None) or (lambda path: len(context[path]))
+    sizes = {path: size(path) for path in context if not path.startswith("_")}
+    return {path: n for path, n in sizes.items() if n >= DEDUP_MIN_SIZE}
+
+
+def find_duplicates(context, threshold=DEFAULT_THRESHOLD, index=None, keep=()):
+    """Map each duplicate path to (canonical_path, similarity)
+
+    Similarity is 1.0 for exact copies and the estimated Jaccard similarity
+    of the shingle sets for near-duplicates. Paths in `keep` are never
+    reported as copies.
+    """
+    keep = set(keep)
+    sizes = _candidate_sizes(context)
+    order = _canonical_order(keep)
+
+    duplicates = {}
+    for group in _exact_groups(context, sizes):
+        canonical, *copies = sorted(group, key=order)
+        for path in copies:
+            if path not in keep:
+                duplicates[path] = (canonical, 1.0)
+
+    if np is None or threshold >= 1.0:
+        return duplicates
+
+    remaining = subset_context(context, [path for path in sizes if path not in duplicates])
+    signatures = derive_cached(index, SIGNATURE_CACHE_KIND, remaining, minhash_signature)
+
+    # Union the near pairs into groups, each with one canonical file
+    parent = {}
+
+    def find(path):
+        while parent.get(path, path) != path:
+            path = parent[path]
+        return path
+
+    grouped = set()
+    for a, b, _ in _near_pairs(signatures, threshold):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b, key=order)] = min(root_a, root_b, key=order)
+        grouped.update((a, b))
+
+    for path in sorted(grouped):
+        canonical = find(path)
+        if path != canonical and path not in keep:
+            similarity = float(np.mean(np.asarray(signatures[path]) == np.asarray(signatures[canonical])))
+            # Groups are joined transitively (a~b, b~c), so the end of a
+            # chain can be far from its canonical; such files are kept
+            if similarity >= threshold:
+                duplicates[path] = (canonical, similarity)
+    return duplicates
+
+
+def reference_line(canonical, similarity):
+    """The one-line stand-in for a duplicate file"""
+    if similarity >= 1.0:
+        return f"[zor: identical to {canonical}]"
+    return f"[zor: near-duplicate of {canonical} (~{similarity:.0%} similar)]"
+
+
+def dedup_context(context, config, keep=(), project_root="."):
+    """Replace duplicate files by references to their canonical copy
+
+    Returns (context, duplicates) where duplicates is the mapping from
+    `find_duplicates`.
+    """
+    if not config.get("dedup", True):
+        return context, {}
+    threshold = config.get("dedup_threshold", DEFAULT_THRESHOLD)
+
+    index = None
+    if np is not None and len(_candidate_sizes(context)) > 1:
+        index = open_index(project_root, config)
+    try:
+        duplicates = find_duplicates(context, threshold, index, keep)
+    finally:
+        if index is not None:
+            index.close()
+
+    if not duplicates:
+        return context, duplicates
+    overrides = {path: reference_line(*match) for path, match in duplicates.items()}
+    return subset_context(context, list(context), overrides), duplicates
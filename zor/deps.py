@@ -0,0 +1,222 @@
+"""Import graph of the files in a collected context.
+
+Python imports are read with `ast` and JavaScript/TypeScript imports with the
+same `import`/`require` patterns `zor init` uses to detect dependencies.
+The imports of each file are cached per content digest in the file index, so
+rebuilding the graph only re-parses files that changed; resolving imports to
+repository paths is a set of dictionary lookups.
+"""
+import ast
+import os
+import posixpath
+import re
+from collections import deque
+
+from .context import subset_context
+from .index import derive_cached, indexed_digests, open_index
+
+JS_IMPORT_PATTERNS = [
+    r'import\s+.*?\s+from\s+[\'"]([^\'"]+)[\'"]\s*;?',  # ES6 imports
+    r'require\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)',  # CommonJS imports
+    r'@import\s+[\'"]([^\'"]+)[\'"]\s*;?',      # CSS imports
+]
+_JS_EXTRA_PATTERNS = [
+    r'^\s*import\s+[\'"]([^\'"]+)[\'"]',  # side-effect imports
+    r'^\s*export\s+.*?\s+from\s+[\'"]([^\'"]+)[\'"]',  # re-exports
+    r'\bimport\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)',  # dynamic imports
+]
+_JS_IMPORT_RES = [re.compile(p, re.MULTILINE) for p in JS_IMPORT_PATTERNS + _JS_EXTRA_PATTERNS]
+
+PYTHON_EXTENSIONS = (".py", ".pyi")
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+_JS_RESOLVE_SUFFIXES = JS_EXTENSIONS + (".css", ".scss", ".json")
+
+# Source roots whose prefix is not part of the import name (src layout)
+PYTHON_SOURCE_ROOTS = ("src/", "lib/")
+
+
+def python_imports(text):
+    """Return the imports of a Python module as JSON-friendly lists
+
+    `import a.b` gives ["import", "a.b", 0, []] and `from ..a import b, c`
+    gives ["from", "a", 2, ["b", "c"]].
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend(["import", alias.name, 0, []] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(["from", node.module or "", node.level, [a.name for a in node.names]])
+    return imports
+
+
+def js_imports(text):
+    """Return the module specifiers imported by a JS/TS (or CSS) file"""
+    specs = []
+    for pattern in _JS_IMPORT_RES:
+        for spec in pattern.findall(text):
+            if spec not in specs:
+                specs.append(spec)
+    return specs
+
+
+def module_name(path):
+    """Dotted module names a Python file can be imported as"""
+    stem = os.path.splitext(path)[0]
+    parts = stem.split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = [".".join(parts)] if parts else []
+    for root in PYTHON_SOURCE_ROOTS:
+        if path.startswith(root) and len(parts) > 1:
+            names.append(".".join(parts[1:]))
+    return names
+
+
+class ImportGraph:
+    """Directed graph of which context files import which"""
+
+    def __init__(self, imports):
+        self.imports = {path: set(targets) for path, targets in imports.items()}
+        self.importers = {path: set() for path in self.imports}
+        for path, targets in self.imports.items():
+            for target in targets:
+                self.importers.setdefault(target, set()).add(path)
+
+    def __contains__(self, path):
+        return path in self.imports
+
+    def __len__(self):
+        return len(self.imports)
+
+    def neighbours(self, path, hops=1):
+        """Return {path: distance} for files within `hops` imports either way
+
+        The start file is included at distance 0; nearer files come first.
+        """
+        distances = {path: 0}
+        queue = deque([path])
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= hops:
+                continue
+            linked = self.imports.get(current, set()) | self.importers.get(current, set())
+            for other in sorted(linked):
+                if other not in distances:
+                    distances[other] = distances[current] + 1
+                    queue.append(other)
+        return distances
+
+
+def _resolve_python(path, entry, modules):
+    """Resolve one Python import entry to repository paths"""
+    kind, module, level, names = entry
+    if level:
+        package = path.split("/")[:-1]
+        if level > 1:
+            package = package[:len(package) - (level - 1)] if level - 1 <= len(package) else None
+        if package is None:
+            return set()
+        base = ".".join(package + ([module] if module else []))
+    else:
+        base = module
+
+    found = set()
+    if kind == "from":
+        # `from pkg import mod` may name submodules rather than attributes
+        for name in names:
+            target = modules.get(f"{base}.{name}" if base else name)
+            if target is not None:
+                found.add(target)
+    if not found:
+        # `import a.b.c` (or `from a.b import x`) loads the nearest module found
+        parts = base.split(".") if base else []
+        while parts:
+            target = modules.get(".".join(parts))
+            if target is not None:
+                found.add(target)
+                break
+            parts.pop()
+    found.discard(path)
+    return found
+
+
+def _resolve_js(path, spec, paths):
+    """Resolve a relative JS/TS specifier to a repository path"""
+    if not spec.startswith("."):
+        return None
+    base = posixpath.normpath(posixpath.join(posixpath.dirname(path), spec))
+    candidates = [base] + [base + ext for ext in _JS_RESOLVE_SUFFIXES]
+    candidates += [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+    for candidate in candidates:
+        if candidate in paths and candidate != path:
+            return candidate
+    return None
+
+
+def build_graph(context, index=None):
+    """Build the import graph for a {path: text} context
+
+    Paths are expected in the "/"-separated form `get_codebase_context`
+    produces; imports of anything outside the context are ignored.
+    """
+    paths = {path.replace(os.sep, "/"): path for path in context}
+    python_paths = [p for p in paths if p.endswith(PYTHON_EXTENSIONS)]
+    js_paths = [p for p in paths if p.endswith(JS_EXTENSIONS)]
+
+    # Subsets keep a LazyContext lazy, and files it reads from disk have
+    # their text digest in the index: only files whose imports are not
+    # cached are read, once, when parsed
+    known = indexed_digests(index, context)
+    python = derive_cached(index, "imports:python",
+                           subset_context(context, [paths[p] for p in python_paths]), python_imports, known)
+    javascript = derive_cached(index, "imports:js",
+                               subset_context(context, [paths[p] for p in js_paths]), js_imports, known)
+    python = {p: python[paths[p]] for p in python_paths}
+    javascript = {p: javascript[paths[p]] for p in js_paths}
+
+    modules = {}
+    for path in sorted(python_paths):
+        for name in module_name(path):
+            # Prefer `pkg/mod.py` over a same-named stub when both exist
+            modules.setdefault(name, path)
+
+    edges = {}
+    for path in paths:
+        targets = set()
+        for entry in python.get(path, ()):
+            targets |= _resolve_python(path, entry, modules)
+        for spec in javascript.get(path, ()):
+            target = _resolve_js(path, spec, paths)
+            if target is not None:
+                targets.add(target)
+        edges[paths[path]] = {paths[t] for t in targets}
+    return ImportGraph(edges)
+
+
+def load_graph(context, project_root=".", config=None):
+    """Build the import graph, reusing imports cached in the file index"""
+    index = open_index(project_root, config)
+    try:
+        return build_graph(context, index)
+    finally:
+        if index is not None:
+            index.close()
+
+
+def dependency_context(target, context, hops=1, project_root=".", config=None):
+    """Narrow a context to the target file and its N-hop import neighbours
+
+    Returns None when the target is not part of the context, so callers can
+    fall back to another selection.
+    """
+    if target not in context:
+        return None
+    if len(context) == 1:
+        return {target: context[target]}
+    graph = load_graph(context, project_root, config)
+    return {path: context[path] for path in graph.neighbours(target, hops)}
@@ -0,0 +1,104 @@
+"""Detection of generated, minified and lockfile content.
+
+Lockfiles, minified bundles, source maps and code generated from schemas
+pass the extension-based exclusions yet mostly waste prompt space. A file is
+classified from its name first (which needs no read at all) and then from
+the leading sample that context collection already reads to sniff binary
+files:
+  * tool banners near the top: `@generated`, or "DO NOT EDIT" in a
+    "generated by" style header
+  * very long average lines with little whitespace, in code and web
+    assets, as minified code has
+  * high byte entropy with little whitespace, as embedded data blobs have
+
+The verdict is stored with the file in the index, so unchanged files are
+not classified again.
+"""
+import math
+import os
+import re
+from collections import Counter
+
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "pdm.lock", "uv.lock", "Cargo.lock", "composer.lock",
+    "Gemfile.lock", "go.sum", "mix.lock", "pubspec.lock", "flake.lock", "packages.lock.json",
+}
+
+GENERATED_PATTERNS = [
+    "*.min.js", "*.min.css", "*.min.mjs", "*.map", "*.bundle.js", "*.chunk.js",
+    "*_pb2.py", "*_pb2.pyi", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h", "*_pb.js", "*_pb.d.ts",
+    "*.g.dart", "*.freezed.dart", "*.designer.cs", "*.generated.*",
+]
+_GENERATED_RE = re.compile("|".join(
+    re.escape(p).replace(r"\*", ".*") + "$" for p in GENERATED_PATTERNS
+))
+
+# Markers count in comment lines among the first lines of the sample, and
+# not when quoted (a file talking about generated code is not generated).
+# "Do not edit" alone is a common hand-written note, so it only counts in a
+# header that also names a generator.
+MARKER_LINES = 10
+_COMMENT = rb"^[ \t]*(?:#|//|/\*|\*|<!--|--|;).*?(?<![\"'])"
+_AT_GENERATED_RE = re.compile(_COMMENT + rb"@generated\b", re.MULTILINE)
+_GENERATOR_RE = re.compile(
+    _COMMENT + rb"(?:\bgenerated (?:by|from)\b|\bauto-?generated\b|\bcode generated\b)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_DO_NOT_EDIT_RE = re.compile(_COMMENT + rb"\bDO NOT (?:EDIT|MODIFY)\b", re.IGNORECASE | re.MULTILINE)
+
+# Extensions of code and web assets that minifiers produce; prose and data
+# (markdown, JSON lines, CSV) have long lines without being minified
+MINIFIABLE_EXTENSIONS = {
+    ".js", ".mjs", ".cjs", ".jsx", ".ts", ".tsx", ".css", ".scss", ".less", ".html", ".htm",
+    ".svg", ".vue", ".svelte", ".py", ".go", ".java", ".c", ".h", ".cc", ".cpp", ".cs",
+    ".php", ".rb", ".rs", ".kt", ".swift", ".dart", ".lua",
+}
+# Average line length (bytes) above which minifiable code counts as minified
+MINIFIED_LINE_LENGTH = 300
+# ...provided at most this share of it is whitespace (prose is ~15%)
+MINIFIED_WHITESPACE_RATIO = 0.08
+# Bits per byte above which a sample with little whitespace counts as data
+ENTROPY_THRESHOLD = 5.5
+MAX_WHITESPACE_RATIO = 0.02
+_MIN_SAMPLE = 1024
+
+
+def classify_name(file_name):
+    """Classify a file by its name alone: "lockfile", "generated" or None"""
+    base = os.path.basename(file_name)
+    if base in LOCKFILE_NAMES:
+        return "lockfile"
+    if _GENERATED_RE.match(base.lower()):
+        return "generated"
+    return None
+
+
+def byte_entropy(sample):
+    """Shannon entropy of a byte string in bits per byte"""
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(n / total * math.log2(n / total) for n in Counter(sample).values())
+
+
+def classify_sample(sample, file_name=None):
+    """Classify the leading bytes of a text file: "generated", "minified", "data" or None"""
+    head = b"\n".join(sample.split(b"\n", MARKER_LINES)[:MARKER_LINES])
+    if _AT_GENERATED_RE.search(head) or (_GENERATOR_RE.search(head) and _DO_NOT_EDIT_RE.search(head)):
+        return "generated"
+    if len(sample) < _MIN_SAMPLE:
+        return None
+    lines = sample.count(b"\n") + 1
+    whitespace = sum(sample.count(c) for c in (b" ", b"\n", b"\t")) / len(sample)
+    minifiable = file_name is None or os.path.splitext(file_name)[1].lower() in MINIFIABLE_EXTENSIONS
+    if minifiable and len(sample) / lines > MINIFIED_LINE_LENGTH and whitespace < MINIFIED_WHITESPACE_RATIO:
+        return "minified"
+    if whitespace < MAX_WHITESPACE_RATIO and byte_entropy(sample) > ENTROPY_THRESHOLD:
+        return "data"
+    return None
+
+
+def classify(file_name, sample):
+    """Classify a file from its name and leading sample, or None for ordinary files"""
+    return classify_name(file_name) or classify_sample(sample, file_name)
@@ -0,0 +1,434 @@
+"""Persistent on-disk file index used to make context collection incremental.
+
+Each entry is keyed on the file path and remembers the stat key (size,
+mtime_ns, inode) it was recorded with, the content digest, the binary/text
+verdict, the generated-content verdict and the decoded text. Later runs only need to `stat` a file: when the
+stat key still matches, the cached text is reused instead of re-reading it.
+
+Values derived from text (token counts, outlines...) are cached per text
+digest. When the walk prunes the index, derived values whose digest is no
+longer the text of any file are dropped too, unless they were used within
+DERIVED_GRACE_SECONDS (values derived from views of files, such as the
+token count of a minified text, are not tied to a file).
+
+The index lives in a per-repo `.zor/` cache directory as a SQLite database.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+INDEX_DIRNAME = ".zor"
+INDEX_FILENAME = "index.sqlite3"
+INDEX_VERSION = 3
+
+# Files modified this close to the moment they were indexed may have changed
+# again within the same mtime tick, so their entries are never trusted
+RACY_WINDOW_NS = 2_000_000_000
+
+# Without preloaded text, pending writes are flushed once they hold this much
+PENDING_TEXT_LIMIT = 16 * 1024 * 1024
+
+# Derived values not tied to a current file survive this long after last use
+DERIVED_GRACE_SECONDS = 24 * 3600
+# A cache hit refreshes a derived value's last use at most this often
+DERIVED_TOUCH_SECONDS = 3600
+
+
+def get_index_dir(project_root="."):
+    """Get the per-repo cache directory"""
+    return Path(project_root) / INDEX_DIRNAME
+
+
+def blob_digest(data: bytes) -> str:
+    """Hash file bytes the same way git hashes blobs"""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    """Hash decoded text; used to key caches of values derived from content"""
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def stat_key(st):
+    """Build the change-detection key for a stat result"""
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class FileIndex:
+    """Path-keyed cache of file digests, binary verdicts and decoded text
+
+    With `load_text=False` only the metadata is held in memory and text is
+    fetched from the database when an entry is asked for it.
+    """
+
+    def __init__(self, project_root=".", load_text=True):
+        self.project_root = Path(project_root)
+        self.path = get_index_dir(project_root) / INDEX_FILENAME
+        self.load_text = load_text
+        self._conn = None
+        self._entries = None
+        self._pending = {}
+        self._pending_text = 0
+        self._removed = set()
+        # Worker threads may fetch text while the main thread writes
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open (creating if needed) the index database and load its entries"""
+        if self._conn is not None:
+            return self
+        index_dir = self.path.parent
+        index_dir.mkdir(parents=True, exist_ok=True)
+        # Keep the cache out of version control, like pytest does
+        gitignore = index_dir / ".gitignore"
+        if not gitignore.exists():
+            gitignore.write_text("*\n")
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS files")
+            self._conn.execute("DROP TABLE IF EXISTS derived")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                indexed_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                is_binary INTEGER NOT NULL,
+                text TEXT,
+                generated TEXT,
+                text_digest TEXT
+            )"""
+        )
+        # Values derived from file content (term counts, token estimates...)
+        # keyed on the content digest, so unchanged content never recomputes
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS derived (
+                kind TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                value TEXT NOT NULL,
+                used_ns INTEGER NOT NULL,
+                PRIMARY KEY (kind, digest)
+            )"""
+        )
+        self._conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+        self._conn.commit()
+
+        self._entries = {}
+        text_column = "text" if self.load_text else "NULL"
+        for row in self._conn.execute(
+            f"SELECT path, size, mtime_ns, inode, indexed_ns, digest, is_binary, {text_column}, generated, "
+            "text_digest FROM files"
+        ):
+            self._entries[row[0]] = row[1:]
+        return self
+
+    def close(self):
+        """Flush pending changes and close the database"""
+        if self._conn is None:
+            return
+        self.flush()
+        self._conn.close()
+        self._conn = None
+        self._entries = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries or {})
+
+    def __contains__(self, path):
+        return path in (self._entries or {})
+
+    def _fetch_text(self, path):
+        """Read an entry's text from pending writes or the database"""
+        pending = self._pending.get(path)
+        if pending is not None:
+            return pending[6]
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, path, with_text=True):
+        """Return the raw entry for a path as a dict, or None
+
+        Without `with_text` the text is only included if it is already in
+        memory.
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        size, mtime_ns, inode, indexed_ns, digest, is_binary, text, generated = entry[:8]
+        if text is None and not is_binary and with_text and not self.load_text:
+            text = self._fetch_text(path)
+        return {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "inode": inode,
+            "digest": digest,
+            "is_binary": bool(is_binary),
+            "text": text,
+            "generated": generated,
+        }
+
+    def text_digests(self, paths):
+        """Return {path: digest of its text} for the indexed text files among paths"""
+        entries = self._entries
+        return {path: entries[path][8] for path in paths if path in entries and entries[path][8] is not None}
+
+    def verdicts(self):
+        """Yield (path, is_binary) for every entry"""
+        for path, entry in self._entries.items():
+            yield path, bool(entry[5])
+
+    def lookup(self, path, st, digest=None, with_text=True):
+        """Return the cached entry if the file is unchanged since it was indexed
+
+        `digest` is an externally verified content hash, such as the blob hash
+        from `git ls-files -s` for a clean tracked file. When it matches the
+        stored digest the entry is valid even if the stat key has changed
+        (e.g. after a fresh checkout); the caller should then refresh it.
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        size, mtime_ns, inode, indexed_ns, stored_digest = entry[:5]
+        if digest is not None and digest == stored_digest and size == st.st_size:
+            return self.get(path, with_text)
+        if (size, mtime_ns, inode) != stat_key(st):
+            return None
+        if mtime_ns >= indexed_ns - RACY_WINDOW_NS:
+            return None
+        return self.get(path, with_text)
+
+    def put(self, path, st, digest, is_binary, text=None, generated=None):
+        """Record the current state of a file
+
+        `generated` is the reason a file was classified as generated content
+        ("lockfile", "minified"...), or None.
+        """
+        size, mtime_ns, inode = stat_key(st)
+        previous = self._entries.get(path)
+        if is_binary:
+            text, digest_of_text = None, None
+        elif text is not None:
+            digest_of_text = text_digest(text)
+        elif previous is not None and previous[4] == digest:
+            # Refreshed without its text (only the stat key changed)
+            digest_of_text = previous[8]
+        else:
+            digest_of_text = None
+        entry = (size, mtime_ns, inode, time.time_ns(), digest, int(bool(is_binary)),
+                 text, generated, digest_of_text)
+        self._entries[path] = entry if self.load_text else entry[:6] + (None,) + entry[7:]
+        self._pending[path] = entry
+        self._removed.discard(path)
+        if not self.load_text:
+            self._pending_text += len(entry[6] or "")
+            if self._pending_text >= PENDING_TEXT_LIMIT:
+                self.flush()
+
+    def remove(self, path):
+        """Forget a file"""
+        if self._entries.pop(path, None) is not None:
+            self._pending.pop(path, None)
+            self._removed.add(path)
+
+    def prune(self, keep_paths, within=None):
+        """Drop entries for files that were not seen in the latest walk
+
+        `within` limits pruning to the paths it accepts, for walks that only
+        covered part of the project.
+        """
+        keep_paths = set(keep_paths)
+        for path in [p for p in self._entries if p not in keep_paths and (within is None or within(p))]:
+            self.remove(path)
+        self.flush()
+        self.prune_derived()
+
+    def prune_derived(self):
+        """Drop derived values whose text is no longer any file's, once unused for a while
+
+        Returns the number of values removed.
+        """
+        cutoff = time.time_ns() - DERIVED_GRACE_SECONDS * 1_000_000_000
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM derived WHERE used_ns < ? AND digest NOT IN "
+                "(SELECT text_digest FROM files WHERE text_digest IS NOT NULL)",
+                (cutoff,),
+            ).rowcount
+
+    def clear(self):
+        """Remove every entry"""
+        self._conn.execute("DELETE FROM files")
+        self._conn.execute("DELETE FROM derived")
+        self._conn.commit()
+        self._entries = {}
+        self._pending = {}
+        self._pending_text = 0
+        self._removed = set()
+
+    def flush(self):
+        """Write pending changes to disk"""
+        if not self._pending and not self._removed:
+            return
+        with self._lock, self._conn:
+            if self._removed:
+                self._conn.executemany(
+                    "DELETE FROM files WHERE path = ?", [(p,) for p in self._removed]
+                )
+            if self._pending:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files "
+                    "(path, size, mtime_ns, inode, indexed_ns, digest, is_binary, text, generated, text_digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(path,) + entry for path, entry in self._pending.items()],
+                )
+        self._pending = {}
+        self._pending_text = 0
+        self._removed = set()
+
+    def rows(self):
+        """Yield every entry, with its text, as a dict; streamed from the database"""
+        self.flush()
+        for row in self._conn.execute(
+            "SELECT path, size, mtime_ns, inode, indexed_ns, digest, is_binary, text, generated "
+            "FROM files ORDER BY path"
+        ):
+            path, size, mtime_ns, inode, _, digest, is_binary, text, generated = row
+            yield {
+                "path": path,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "inode": inode,
+                "digest": digest,
+                "is_binary": bool(is_binary),
+                "text": text,
+                "generated": generated,
+            }
+
+    def derived_rows(self):
+        """Yield (kind, digest, value) for every cached derived value, value as JSON text"""
+        yield from self._conn.execute("SELECT kind, digest, value FROM derived ORDER BY kind, digest")
+
+    def get_derived(self, kind, digests):
+        """Return {digest: value} for the cached values of `kind` that exist"""
+        digests = list(digests)
+        found = {}
+        stale = []
+        now = time.time_ns()
+        # Large-file outlines are cached from collection worker threads
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(digests), 500):
+                batch = digests[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for digest, value, used_ns in self._conn.execute(
+                    f"SELECT digest, value, used_ns FROM derived WHERE kind = ? AND digest IN ({placeholders})",
+                    [kind] + batch,
+                ):
+                    found[digest] = json.loads(value)
+                    if used_ns < now - DERIVED_TOUCH_SECONDS * 1_000_000_000:
+                        stale.append(digest)
+            if stale:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE derived SET used_ns = ? WHERE kind = ? AND digest = ?",
+                        [(now, kind, digest) for digest in stale],
+                    )
+        return found
+
+    def put_derived(self, kind, values):
+        """Cache values of `kind` given as {digest: value}"""
+        if not values:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO derived (kind, digest, value, used_ns) VALUES (?, ?, ?, ?)",
+                [(kind, digest, json.dumps(value), time.time_ns()) for digest, value in values.items()],
+            )
+
+    def status(self):
+        """Summarise the index contents"""
+        entries = self._entries.values()
+        text_entries = [e for e in entries if not e[5]]
+        return {
+            "path": str(self.path),
+            "files": len(self._entries),
+            "text_files": len(text_entries),
+            "binary_files": len(self._entries) - len(text_entries),
+            "generated_files": sum(1 for e in text_entries if e[7]),
+            "bytes": sum(e[0] for e in entries),
+            "text_bytes": sum(e[0] for e in text_entries),
+            "db_bytes": os.path.getsize(self.path) if self.path.exists() else 0,
+        }
+
+
+def open_index(project_root=".", config=None, load_text=True):
+    """Open the file index for project_root, or return None if disabled or unusable"""
+    if config is not None and not config.get("use_index", True):
+        return None
+    try:
+        return FileIndex(project_root, load_text).open()
+    except Exception:
+        # A read-only checkout or a corrupt cache must never block zor
+        return None
+
+
+def indexed_digests(index, context):
+    """Text digests the index holds for the entries a LazyContext reads from disk
+
+    Other mappings (and overridden entries) may hold text that differs from
+    the file, so they get none.
+    """
+    if index is None or not hasattr(context, "is_overridden"):
+        return {}
+    return index.text_digests(path for path in context if not context.is_overridden(path))
+
+
+def derive_cached(index, kind, texts, compute, known_digests=None):
+    """Map `compute` over texts, reusing values cached in the index
+
+    `texts` maps arbitrary keys to text and the result maps the same keys to
+    `compute(text)`. Values are cached per content digest under `kind`, so
+    they must be JSON types (they come back from the cache as lists, not
+    tuples). With `index=None` everything is computed. `known_digests` gives
+    the text digest of some keys up front, so their text is neither read
+    nor hashed unless the value has to be computed.
+    """
+    known_digests = known_digests or {}
+    digests = {
+        key: known_digests[key] if key in known_digests else text_digest(texts[key])
+        for key in texts
+    }
+    cached = index.get_derived(kind, set(digests.values())) if index is not None else {}
+    fresh = {}
+    result = {}
+    for key, digest in digests.items():
+        if digest in cached:
+            result[key] = cached[digest]
+        elif digest in fresh:
+            result[key] = fresh[digest]
+        else:
+            # Only misses look at the text again (cheap for dicts, a re-read
+            # for a LazyContext)
+            result[key] = fresh[digest] = compute(texts[key])
+    if index is not None:
+        index.put_derived(kind, fresh)
+    return result
@@ -0,0 +1,260 @@
+"""Views of files too large to send in full.
+
+Files above `large_file_size` bytes are not read whole during collection.
+The `large_file_policy` config key decides what the model sees instead:
+  * "head_tail" - the first and last `large_file_window_bytes` of the file
+  * "outline"   - the outline of a code file (`zor.outline`), else head/tail
+  * "hits"      - windows around the lines matching the prompt, chosen when
+                  the prompt is known; head/tail until then
+  * "exclude"   - the file is left out, as zor used to do
+
+Head/tail windows are read with seek, and prompt hits are searched in a
+read-only memory map, so only the byte ranges shown are decoded. Every view
+starts with a LARGE_FILE_MARKER line and marks what it cut.
+"""
+import mmap
+import os
+import re
+
+POLICIES = ("head_tail", "outline", "hits", "exclude")
+DEFAULT_POLICY = "outline"
+
+DEFAULT_LARGE_FILE_SIZE = 1_000_000
+DEFAULT_WINDOW_BYTES = 16 * 1024
+
+# Lines of context kept on either side of a prompt hit
+HIT_CONTEXT_LINES = 5
+
+LARGE_FILE_MARKER = "[zor: large file"
+
+_SNIFF_SIZE = 8192
+_TERM_MIN_LENGTH = 4
+_STOP_TERMS = {
+    "this", "that", "with", "from", "into", "file", "files", "code", "make", "should",
+    "would", "could", "what", "when", "where", "which", "there", "their", "them",
+    "return", "only", "complete", "content", "modify", "change", "please",
+}
+
+
+def _decode(data):
+    # Windows may cut a multi-byte character at either end
+    return data.decode("utf-8", errors="replace")
+
+
+def elision_marker(start, end, size):
+    """The line standing in for bytes [start, end) of a file"""
+    return f"... [elided by zor: bytes {start}-{end} of {size}]\n"
+
+
+def _header(size, view):
+    return f"{LARGE_FILE_MARKER}, {size} bytes; {view}]\n"
+
+
+def is_large_view(text):
+    """Whether a context entry is a large-file view rather than the file itself"""
+    return text.startswith(LARGE_FILE_MARKER)
+
+
+def head_tail(file_path, size, window_bytes=DEFAULT_WINDOW_BYTES):
+    """Read the first and last window of a file, cut at line boundaries
+
+    Returns None for binary files.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(window_bytes)
+        if b"\x00" in head[:_SNIFF_SIZE]:
+            return None
+        if size <= 2 * window_bytes:
+            rest = f.read()
+            return _header(size, "shown in full") + _decode(head + rest)
+        f.seek(size - window_bytes)
+        tail = f.read(window_bytes)
+
+    head_end = head.rfind(b"\n") + 1 or len(head)
+    tail_start = tail.find(b"\n") + 1
+    head, tail = head[:head_end], tail[tail_start:]
+    elided_start, elided_end = head_end, size - len(tail)
+    return (
+        _header(size, "head and tail shown")
+        + _decode(head)
+        + elision_marker(elided_start, elided_end, size)
+        + _decode(tail)
+    )
+
+
+def _outline_file(file_path, language):
+    """Outline a whole file, or None if it is binary, not UTF-8 or has no outline"""
+    from .outline import outline_source
+
+    # An outline needs the whole file parsed; it is mapped, not copied
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if b"\x00" in mapped[:_SNIFF_SIZE]:
+            return None
+        try:
+            text = str(mapped, "utf-8")
+        except UnicodeDecodeError:
+            return None
+    return outline_source(text, language)
+
+
+def outline_view(file_path, relative_path, size, window_bytes=DEFAULT_WINDOW_BYTES, index=None, st=None):
+    """Outline a large code file, falling back to head and tail
+
+    With an index and the file's stat result the outline is cached under
+    the stat key, so an unchanged file is parsed once rather than on every
+    collection or watcher resync.
+    """
+    from .context import chunk_language
+    from .index import derive_cached, stat_key, text_digest
+    from .outline import OUTLINE_HEADER
+
+    language = chunk_language(relative_path)
+    if language in ("python", "code"):
+        if st is None:
+            # Without a stat key there is nothing to cache the outline under
+            index = known = None
+        else:
+            # Large files are not in the index, so they have no text digest
+            known = {relative_path: text_digest("stat:%d:%d:%d" % stat_key(st))}
+        outline = derive_cached(
+            index, f"outline:{language}", {relative_path: file_path},
+            lambda path: _outline_file(path, language), known,
+        )[relative_path]
+        if outline is not None:
+            return _header(size, "outline, bodies elided") + outline[len(OUTLINE_HEADER):]
+    return head_tail(file_path, size, window_bytes)
+
+
+def prompt_terms(prompt):
+    """Words of a prompt worth searching a large file for"""
+    words = {w.lower() for w in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", prompt)}
+    return sorted(w for w in words if len(w) >= _TERM_MIN_LENGTH and w not in _STOP_TERMS)
+
+
+def _line_window(mapped, position, size, lines):
+    """Byte range of the line at `position` plus `lines` lines on either side"""
+    start = position
+    for _ in range(lines + 1):
+        start = mapped.rfind(b"\n", 0, start)
+        if start < 0:
+            start = -1
+            break
+    start += 1
+    end = position
+    for _ in range(lines + 1):
+        end = mapped.find(b"\n", end)
+        if end < 0:
+            end = size
+            break
+        end += 1
+    return start, end
+
+
+def hits_view(file_path, size, terms, window_bytes=DEFAULT_WINDOW_BYTES, context_lines=HIT_CONTEXT_LINES):
+    """Windows of a large file around lines matching `terms`
+
+    Windows are ranked by how many distinct terms they contain and kept
+    until about two `window_bytes` have been chosen; the rest of the file
+    is elided. Falls back to head and tail when nothing matches.
+    """
+    if not terms or size == 0:
+        return head_tail(file_path, size, window_bytes)
+    pattern = re.compile(b"|".join(re.escape(t.encode()) for t in terms), re.IGNORECASE)
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if b"\x00" in mapped[:_SNIFF_SIZE]:
+            return None
+        windows = {}
+        for match in pattern.finditer(mapped):
+            window = _line_window(mapped, match.start(), size, context_lines)
+            windows.setdefault(window, set()).add(match.group().lower())
+        if not windows:
+            return head_tail(file_path, size, window_bytes)
+
+        ranked = sorted(windows, key=lambda w: (-len(windows[w]), w[0]))
+        chosen = []
+        budget = 2 * window_bytes
+        for start, end in ranked:
+            if budget <= 0:
+                break
+            chosen.append((start, end))
+            budget -= end - start
+
+        # Merge overlapping windows and render them in file order
+        merged = []
+        for start, end in sorted(chosen):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        parts = [_header(size, f"lines matching the prompt shown ({', '.join(terms[:8])})")]
+        position = 0
+        for start, end in merged:
+            if start > position:
+                parts.append(elision_marker(position, start, size))
+            parts.append(_decode(mapped[start:end]))
+            position = end
+        if position < size:
+            parts.append(elision_marker(position, size, size))
+    return "".join(parts)
+
+
+class LargeFilePolicy:
+    """How context collection treats files above the size threshold"""
+
+    def __init__(self, threshold=DEFAULT_LARGE_FILE_SIZE, policy=DEFAULT_POLICY, window_bytes=DEFAULT_WINDOW_BYTES):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown large_file_policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        self.threshold = threshold
+        self.policy = policy
+        self.window_bytes = window_bytes
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("large_file_size", DEFAULT_LARGE_FILE_SIZE),
+            config.get("large_file_policy", DEFAULT_POLICY),
+            config.get("large_file_window_bytes", DEFAULT_WINDOW_BYTES),
+        )
+
+    def is_large(self, size):
+        return size > self.threshold
+
+    def render(self, file_path, relative_path, size, index=None, st=None):
+        """The view of a large file sent before the prompt is known, or None to skip it"""
+        if self.policy == "exclude":
+            return None
+        if self.policy == "outline":
+            return outline_view(file_path, relative_path, size, self.window_bytes, index, st)
+        return head_tail(file_path, size, self.window_bytes)
+
+
+def focus_large_files(context, prompt, config, project_root="."):
+    """Re-render large-file views around the prompt's terms ("hits" policy)
+
+    Other policies, and contexts without large files, are returned as they are.
+    """
+    if config.get("large_file_policy", DEFAULT_POLICY) != "hits":
+        return context
+    terms = prompt_terms(prompt)
+    # In a LazyContext large views are overrides; other entries are not read
+    overridden = getattr(context, "is_overridden", None)
+    overrides = {}
+    for path in context:
+        if overridden is not None and not overridden(path):
+            continue
+        text = context[path]
+        if not is_large_view(text):
+            continue
+        file_path = os.path.join(project_root, path)
+        try:
+            view = hits_view(file_path, os.path.getsize(file_path), terms,
+                             config.get("large_file_window_bytes", DEFAULT_WINDOW_BYTES))
+        except (OSError, ValueError):
+            continue
+        if view is not None:
+            overrides[path] = view
+    if not overrides:
+        return context
+    from .context import subset_context
+    return subset_context(context, list(context), overrides)
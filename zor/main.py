@@ -1,12 +1,19 @@
 import os
 import typer
 from dotenv import load_dotenv
-import google.generativeai as genai
 from pathlib import Path
-from .context import get_codebase_context
+from .context import ContextScope, context_size, get_codebase_context, subset_context
+from .index import FileIndex
+from .retrieval import build_retriever, select_context
+from .deps import JS_IMPORT_PATTERNS, dependency_context, load_graph
+from .outline import context_mode, outline_context
+from .snapshot import SnapshotError, export_snapshot, import_snapshot
+from .stats import DEFAULT_TOP, collect_stats
+from .cache import ResponseCache
+from .watcher import ContextWatcher
 from .file_ops import edit_file, show_diff
 from .git_utils import git_commit
-from .api import generate_with_context
+from .api import StreamCancelled, generate_with_context, get_client
 from .config import load_config, save_config
 from .context_injector import init_command, clear_command, send_query
 import json
@@ -46,9 +53,9 @@ def load_api_key():
     
     if api_key:
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content("Test")
+            client = get_client()
+            client.configure(api_key)
+            response = client.model("gemini-2.0-flash").generate_content("Test")
             api_key_valid = True
             return True
         except Exception:
@@ -103,7 +110,13 @@ def help():
         ("refactor", "Refactor code across multiple files based on instructions"),
         ("setup", "Configure your Gemini API key"),
         ("help", "Display all available commands and their descriptions"),
-        ("review", "Analyses the codebase and gives suggestions")
+        ("review", "Analyses the codebase and gives suggestions"),
+        ("index", "Show the status of or rebuild the on-disk file index"),
+        ("deps", "Show the files a file imports and is imported by"),
+        ("context-export", "Write the collected context and index to a snapshot file"),
+        ("context-import", "Warm the index from a snapshot written by context-export"),
+        ("context-stats", "Profile context collection: timings, largest files, exclusions"),
+        ("cache", "Show the status of or clear the response cache"),
     ]
     
     for cmd, desc in commands:
@@ -116,18 +129,124 @@ def help():
         console.print("\n[bold red]Warning:[/bold red] No valid API key configured. Please run 'zor setup' first.", style="red")
 
 
+# Scope options shared by every command that collects context
+PathOption = Annotated[Optional[List[str]], typer.Option("--path", help="Only collect context under this directory (repeatable)")]
+IncludeOption = Annotated[Optional[List[str]], typer.Option("--include", help="Only include files matching this glob (repeatable)")]
+ExcludeOption = Annotated[Optional[List[str]], typer.Option("--exclude", help="Leave out files matching this glob (repeatable)")]
+StreamOption = Annotated[Optional[bool], typer.Option("--stream/--no-stream", help="Show the answer as it arrives (default: the 'stream' config key)")]
+NoCacheOption = Annotated[bool, typer.Option("--no-cache", help="Neither read nor store cached responses")]
+RefreshOption = Annotated[bool, typer.Option("--refresh", help="Ask the model again and replace the cached response")]
+
+
+def context_scope(path=None, include=None, exclude=None, config=None) -> ContextScope:
+    """Scope for a command from its --path/--include/--exclude options and the workspace config"""
+    return ContextScope.from_options(path, include, exclude, config if config is not None else load_config())
+
+
+def use_streaming(stream: Optional[bool], config: dict) -> bool:
+    """Whether to stream the answer: the --stream/--no-stream flag, else the config"""
+    return config.get("stream", False) if stream is None else stream
+
+
+def cache_options(no_cache: bool = False, refresh: bool = False) -> dict:
+    """generate_with_context keyword arguments for the --no-cache/--refresh flags"""
+    options = {}
+    if no_cache:
+        options["use_cache"] = False
+    if refresh:
+        options["refresh"] = True
+    return options
+
+
+def with_target(context: dict, target: str, text: str) -> dict:
+    """Put the full text of the file a command works on in its context, even when out of scope
+
+    The collected entry may be a large-file view or otherwise cut down;
+    a command rewriting the file must see all of it.
+    """
+    paths = list(context) if target in context else list(context) + [target]
+    return subset_context(context, paths, {target: text})
+
+
+def make_retriever(context: dict, config: dict):
+    """Build the retrieval index at the configured granularity"""
+    return build_retriever(context, config=config, granularity=config.get("retrieval_granularity", "chunk"))
+
+
+def target_context(target: str, prompt: str, context: dict, command: str = "edit") -> dict:
+    """Context for a command working on one file: the file and its import neighbours
+
+    With `context_mode` set to "outline" for the command, every file but the
+    target is sent as an outline.
+    """
+    config = load_config()
+    neighbours = dependency_context(target, context, config.get("deps_hops", 1), config=config)
+    if neighbours is None:
+        # Not a file zor collected (e.g. ignored); fall back to retrieval
+        neighbours = relevant_context(prompt, context, keep=(target,))
+    if context_mode(config, command) == "outline":
+        neighbours = outline_context(neighbours, keep=(target,), config=config)
+    return neighbours
+
+
+def relevant_context(prompt: str, context: dict, retriever=None, keep=()) -> dict:
+    """Narrow the context to the files (or chunks) most relevant to the prompt"""
+    config = load_config()
+    budget_tokens = config.get("retrieval_budget_tokens", 200_000)
+    # Only build an index when the context is too big to send anyway
+    if retriever is None and context_size(context) > budget_tokens:
+        retriever = make_retriever(context, config)
+    return select_context(
+        prompt,
+        context,
+        top_k=config.get("retrieval_top_k", 20),
+        budget_tokens=budget_tokens,
+        retriever=retriever,
+        keep=keep,
+    )
+
 @app.command()
 @require_api_key
-def ask(prompt: str):
+def ask(
+    prompt: str,
+    full_context: Annotated[bool, typer.Option("--full-context", help="Send the whole codebase instead of the most relevant files")] = False,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    stream: StreamOption = None,
+    no_cache: NoCacheOption = False,
+    refresh: RefreshOption = False,
+):
     """Ask Zor about your codebase"""
-    context = get_codebase_context()
-    response = generate_with_context(prompt, context)
-    print(response)
+    config = load_config()
+    context = get_codebase_context(lazy=config.get("lazy_context", True),
+                                   scope=context_scope(path, include, exclude, config))
+    if not full_context:
+        context = relevant_context(prompt, context)
+    if not use_streaming(stream, config):
+        response = generate_with_context(prompt, context, **cache_options(no_cache, refresh))
+        print(response)
+        return
+    try:
+        generate_with_context(prompt, context, stream=True, **cache_options(no_cache, refresh))
+    except StreamCancelled:
+        typer.echo("\nResponse cancelled.", err=True)
+        raise typer.Exit(1)
 
 
 @app.command()
 @require_api_key
-def edit(file_path: str, prompt: str):
+def edit(
+    file_path: str,
+    prompt: str,
+    full_context: Annotated[bool, typer.Option("--full-context", help="Send the whole codebase instead of the most relevant code")] = False,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    stream: StreamOption = None,
+    no_cache: NoCacheOption = False,
+    refresh: RefreshOption = False,
+):
     """Edit a file based on natural language instructions"""
     # Check if file exists first
     if not Path(file_path).exists():
@@ -138,9 +257,23 @@ def edit(file_path: str, prompt: str):
     with open(file_path, "r") as f:
         original_content = f.read()
         
-    context = get_codebase_context()
+    target = os.path.normpath(os.path.relpath(file_path))
+    config = load_config()
+    context = get_codebase_context(lazy=config.get("lazy_context", True),
+                                   scope=context_scope(path, include, exclude, config))
+    context = with_target(context, target, original_content)
+    if not full_context:
+        context = target_context(target, prompt, context)
     instruction = f"Modify the file {file_path} to: {prompt}. Return only the complete new file content."
-    response = generate_with_context(instruction, context)
+    if use_streaming(stream, config):
+        try:
+            response = generate_with_context(instruction, context, target=target, stream=True,
+                                             **cache_options(no_cache, refresh))
+        except StreamCancelled:
+            typer.echo("\nEdit cancelled; the file was not changed.", err=True)
+            return
+    else:
+        response = generate_with_context(instruction, context, target=target, **cache_options(no_cache, refresh))
     
     # Clean md res
     import re
@@ -254,17 +387,191 @@ def context_send(query: str):
     res = send_query(query, start_path=Path(os.getcwd()))
     typer.echo(json.dumps(res, indent=2, default=str))
 
+@app.command("context-export")
+def context_export(
+    output: str = typer.Argument("zor-snapshot.jsonl.gz", help="Snapshot file to write"),
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+):
+    """Collect the context and write it, with the index, to a portable snapshot"""
+    config = load_config()
+    context = get_codebase_context(lazy=True, scope=context_scope(path, include, exclude, config))
+    counts = export_snapshot(output, context, config=config)
+    typer.echo(f"Wrote {output}: {counts['files']} files ({counts['text_files']} text), "
+               f"{counts['derived']} cached values")
+
+@app.command("context-import")
+def context_import(
+    snapshot: str = typer.Argument(..., help="Snapshot file written by context-export"),
+    verify: Annotated[str, typer.Option("--verify", help="Check files by 'hash' (content) or 'stat' (size and mtime)")] = "hash",
+):
+    """Warm the index from a snapshot, keeping only files that still match the working tree"""
+    try:
+        counts = import_snapshot(snapshot, config=load_config(), verify=verify)
+    except (OSError, ValueError, SnapshotError) as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    typer.echo(f"Imported {counts['reused']} of {counts['files']} files "
+               f"({counts['stale']} changed since export), {counts['derived']} cached values")
+
+@app.command("context-stats")
+def context_stats(
+    top: Annotated[int, typer.Option("--top", help="How many of the largest files and directories to list")] = DEFAULT_TOP,
+    as_json: Annotated[bool, typer.Option("--json", help="Print the report as JSON")] = False,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    target: Annotated[Optional[str], typer.Option("--target", help="File to profile edit and generate_test for (default: estimate over the whole codebase)")] = None,
+):
+    """Profile context collection: time per phase, largest files and directories, exclusions and prompt size per command"""
+    if target is not None:
+        if not Path(target).exists():
+            typer.echo(f"Error: File {target} does not exist", err=True)
+            raise typer.Exit(1)
+        target = os.path.normpath(os.path.relpath(target))
+    config = load_config()
+    report = collect_stats(config=config, scope=context_scope(path, include, exclude, config), top=top,
+                           target=target)
+    if as_json:
+        typer.echo(json.dumps(report, indent=2))
+        return
+
+    from rich.table import Table
+    console = Console()
+    console.print(f"{report['files']} files, {report['bytes']} bytes, ~{report['tokens']} tokens "
+                  f"collected in {report['seconds_total']:.3f}s")
+
+    phases = Table(title="Seconds per phase (all threads)")
+    phases.add_column("Phase", style="cyan")
+    phases.add_column("Seconds", justify="right")
+    for phase, seconds in report["phases"].items():
+        phases.add_row(phase, f"{seconds:.3f}")
+    console.print(phases)
+
+    for title, rows in (("files", report["top_files"]), ("directories", report["top_directories"])):
+        for key in ("bytes", "tokens"):
+            table = Table(title=f"Largest {title} by {key}")
+            table.add_column("Path", style="cyan")
+            table.add_column("Bytes", justify="right")
+            table.add_column("Tokens", justify="right")
+            for row in rows[key]:
+                table.add_row(row["path"], str(row["bytes"]), str(row["tokens"]))
+            console.print(table)
+
+    excluded = Table(title="Excluded by rule")
+    excluded.add_column("Rule", style="cyan")
+    excluded.add_column("Count", justify="right")
+    for rule, count in report["excluded"].items():
+        excluded.add_row(rule, str(count))
+    console.print(excluded)
+
+    profiles = Table(title="Context per command")
+    profiles.add_column("Command", style="cyan")
+    profiles.add_column("Mode")
+    profiles.add_column("Scope")
+    profiles.add_column("Tokens", justify="right")
+    profiles.add_column("Budget", justify="right")
+    profiles.add_column("Sent", justify="right")
+    for command, profile in report["profiles"].items():
+        profiles.add_row(command, profile["mode"], profile["scope"], str(profile["tokens"]),
+                         str(profile["budget_tokens"]), str(profile["sent_tokens"]))
+    console.print(profiles)
+    if target is None:
+        console.print("edit and generate_test are estimated over the whole codebase; "
+                      "pass --target FILE to measure what they send for one file")
+
+@app.command()
+def index(action: str = typer.Argument("status", help="'status' or 'rebuild'")):
+    """Show the status of or rebuild the on-disk file index"""
+    if action == "rebuild":
+        with FileIndex(".") as file_index:
+            file_index.clear()
+        context = get_codebase_context()
+        typer.echo(f"Index rebuilt with {len(context)} text files")
+    elif action != "status":
+        typer.echo(f"Unknown index action: {action}. Use 'status' or 'rebuild'.", err=True)
+        raise typer.Exit(1)
+
+    with FileIndex(".") as file_index:
+        for key, value in file_index.status().items():
+            typer.echo(f"{key}: {value}")
+
+@app.command()
+def cache(action: str = typer.Argument("status", help="'status' or 'clear'")):
+    """Show the status of or clear the response cache"""
+    response_cache = ResponseCache.from_config(load_config())
+    if action == "clear":
+        response_cache.clear()
+        typer.echo("Response cache cleared")
+    elif action != "status":
+        typer.echo(f"Unknown cache action: {action}. Use 'status' or 'clear'.", err=True)
+        raise typer.Exit(1)
+
+    for key, value in response_cache.status().items():
+        typer.echo(f"{key}: {value}")
+
+@app.command()
+def deps(
+    file_path: str,
+    hops: Annotated[int, typer.Option("--hops", help="Also list files up to this many imports away")] = 1,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+):
+    """Show the files a file imports and is imported by"""
+    target = os.path.normpath(os.path.relpath(file_path))
+    # Lazy, so files whose imports are cached in the index are not read
+    context = get_codebase_context(scope=context_scope(path, include, exclude), lazy=True)
+    if target not in context:
+        typer.echo(f"Error: {file_path} is not part of the codebase context", err=True)
+        raise typer.Exit(1)
+
+    graph = load_graph(context, config=load_config())
+    typer.echo(f"Imports ({len(graph.imports[target])}):")
+    for imported in sorted(graph.imports[target]):
+        typer.echo(f"  {imported}")
+    typer.echo(f"Imported by ({len(graph.importers[target])}):")
+    for importer in sorted(graph.importers[target]):
+        typer.echo(f"  {importer}")
+    if hops > 1:
+        typer.echo(f"Within {hops} hops:")
+        for neighbour, distance in graph.neighbours(target, hops).items():
+            if distance:
+                typer.echo(f"  {distance}  {neighbour}")
+
 @app.command()
 @require_api_key
-def interactive():
+def interactive(
+    full_context: Annotated[bool, typer.Option("--full-context", help="Send the whole codebase instead of the most relevant files")] = False,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    stream: StreamOption = None,
+    no_cache: NoCacheOption = False,
+    refresh: RefreshOption = False,
+):
     """Start an interactive session with the Zor AI assistant"""
     typer.echo("Starting interactive session. Type 'exit' to quit.")
     typer.echo("Loading codebase context...")
     
+    config = load_config()
+    scope = context_scope(path, include, exclude, config)
+    stream = use_streaming(stream, config)
+    options = cache_options(no_cache, refresh)
+    
     # load context once at the start
-    context = get_codebase_context()
+    context = get_codebase_context(scope=scope)
     typer.echo(f"Loaded context : {len(context)} tokens")
     
+    # the retrieval index is built once and rebuilt only when files change
+    retriever = None if full_context else make_retriever(context, config)
+    
+    # keep the context current as files are edited, without rescanning
+    watcher = None
+    if config.get("watch", True):
+        watcher = ContextWatcher(context, config=config, scope=scope).start()
+    
     # conversation history
     history = []
     
@@ -275,6 +582,9 @@ def interactive():
             if prompt.lower() in ("exit", "quit"):
                 break
                 
+            if watcher is not None and watcher.sync() and retriever is not None:
+                retriever = make_retriever(context, config)
+            
             # add prompt to history
             history.append({"role": "user", "content": prompt})
             
@@ -285,13 +595,20 @@ def interactive():
             )
             
             # Create context for API call
-            context_with_history = context.copy()
+            if retriever is not None:
+                context_with_history = dict(relevant_context(prompt, context, retriever))
+            else:
+                context_with_history = context.copy()
             if history_str:
                 context_with_history["_conversation_history"] = history_str
             
             try:
-                answer = generate_with_context(prompt, context_with_history)
-                typer.echo(f"\n{answer}")
+                if stream:
+                    typer.echo("")
+                    answer = generate_with_context(prompt, context_with_history, stream=True, **options)
+                else:
+                    answer = generate_with_context(prompt, context_with_history, **options)
+                    typer.echo(f"\n{answer}")
                 
                 # Add response to history
                 history.append({"role": "assistant", "content": answer})
@@ -306,6 +623,10 @@ def interactive():
                             edit_file(file_to_edit, code_blocks[0], backup=True)
                             typer.echo(f"Updated {file_to_edit}")
                 
+            except StreamCancelled:
+                # Only the answer is cancelled; the session carries on without it
+                history.pop()
+                typer.echo("\nResponse cancelled.", err=True)
             except Exception as e:
                 typer.echo(f"Error: {e}", err=True)
                 
@@ -313,6 +634,8 @@ def interactive():
             typer.echo("\nExiting interactive mode.")
             break
     
+    if watcher is not None:
+        watcher.stop()
     typer.echo("Interactive session ended.")
 
 @app.command()
@@ -346,17 +669,32 @@ def history(limit: int = 5):
 
 @app.command()
 @require_api_key
-def generate_test(file_path: str, test_framework: str = "pytest"):
+def generate_test(
+    file_path: str,
+    test_framework: str = "pytest",
+    full_context: Annotated[bool, typer.Option("--full-context", help="Send the whole codebase instead of the file and its imports")] = False,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    no_cache: NoCacheOption = False,
+    refresh: RefreshOption = False,
+):
     """Generate tests for a specific file"""
     if not Path(file_path).exists():
         typer.echo(f"Error: File {file_path} does not exist", err=True)
         return
 
-    context = get_codebase_context()
-    
     # Read the target file
     with open(file_path, "r") as f:
         target_file = f.read()
+
+    target = os.path.normpath(os.path.relpath(file_path))
+    config = load_config()
+    context = get_codebase_context(lazy=config.get("lazy_context", True),
+                                   scope=context_scope(path, include, exclude, config))
+    context = with_target(context, target, target_file)
+    if not full_context:
+        context = target_context(target, f"tests for {file_path}", context, command="generate_test")
     
     # Create the prompt
     prompt = load_prompt("generate_test_prompt").format(
@@ -365,7 +703,7 @@ def generate_test(file_path: str, test_framework: str = "pytest"):
     )
     
     # Generate the tests
-    tests = generate_with_context(prompt, context)
+    tests = generate_with_context(prompt, context, target=target, **cache_options(no_cache, refresh))
     
     # Determine test file path
     test_file_path = str(Path(file_path).parent / f"test_{Path(file_path).name}")
@@ -402,15 +740,22 @@ def generate_test(file_path: str, test_framework: str = "pytest"):
 
 @app.command()
 @require_api_key
-def refactor(prompt: str):
+def refactor(
+    prompt: str,
+    path: PathOption = None,
+    include: IncludeOption = None,
+    exclude: ExcludeOption = None,
+    no_cache: NoCacheOption = False,
+    refresh: RefreshOption = False,
+):
     """Refactor code across multiple files based on instructions"""
-    context = get_codebase_context()
+    context = get_codebase_context(scope=context_scope(path, include, exclude))
     
     instruction = load_prompt("refactor_prompt").format(
         prompt=prompt
     )
 
-    refactoring_plan = generate_with_context(instruction, context)
+    refactoring_plan = generate_with_context(instruction, context, **cache_options(no_cache, refresh))
     
     # Parse the plan to extract file paths and contents
     import re
@@ -507,10 +852,10 @@ def setup():
     typer.echo("Validating API key...")
     try:
         # Configure temporarily with the new key
-        genai.configure(api_key=api_key)
+        get_client().configure(api_key)
         
         # Try a simple API call to validate the key
-        model = genai.GenerativeModel("gemini-2.0-flash")
+        model = get_client().model("gemini-2.0-flash")
         response = model.generate_content("Just respond with 'OK' if this API key is valid.")
         
         if not response or not hasattr(response, 'text') or "error" in response.text.lower():
@@ -550,7 +895,7 @@ def setup():
         save_config(config)
         
         # Update the current session's API key
-        genai.configure(api_key=api_key)
+        get_client().configure(api_key)
         
         typer.echo("API key configured and saved successfully!")
         typer.echo("You can now use zor with your Gemini API key.")
@@ -1005,11 +1350,7 @@ def init(prompt: str, directory: str = None, install: bool = typer.Option(True,
         skipped_files = []
         
         # Extract dependency imports from React files to add to package.json later
-        import_patterns = [
-            r'import\s+.*?\s+from\s+[\'"]([^.][^\'"]*)[\'"]\s*;?',  # ES6 imports
-            r'require\s*\(\s*[\'"]([^.][^\'"]*)[\'"]\s*\)',  # CommonJS imports
-            r'@import\s+[\'"]([^.][^\'"]*)[\'"]\s*;?',      # CSS imports
-        ]
+        import_patterns = JS_IMPORT_PATTERNS
         
         detected_dependencies = set()
         
@@ -0,0 +1,378 @@
+"""Token-saving minification of context files before prompt assembly.
+
+Modes (the `minify` config key):
+  * "off"   - files are sent as they are
+  * "light" - trailing whitespace and runs of blank lines are squeezed, and a
+              leading comment block (license header) repeated across files is
+              kept once and replaced by a reference elsewhere
+  * "full"  - "light" plus comments and docstrings are removed: Python with
+              `tokenize`, C-family/JS/TS, CSS and shell with small lexers that
+              know their string syntax
+
+Minified text is cached per content digest in the file index. Paths passed
+as `keep` (the file being edited) are never minified. A file whose
+minification saves little is sent as it is, so a LazyContext keeps reading
+it from disk instead of holding a copy in memory.
+"""
+import io
+import os
+import re
+import tokenize
+
+from .context import context_size, subset_context
+from .index import derive_cached, open_index
+from .packer import estimate_tokens
+
+MODES = ("off", "light", "full")
+
+# Below this much text minifying is cheaper than opening the index
+CACHE_MIN_SIZE = 64 * 1024
+
+# A file is only replaced by its minified text when that saves at least
+# this many tokens and this share of the file
+MIN_TOKENS_SAVED = 16
+MIN_SAVED_RATIO = 0.02
+
+# A leading comment block needs this many lines to count as a header
+HEADER_MIN_LINES = 3
+
+_C_EXTENSIONS = {
+    ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".java", ".kt", ".scala", ".go",
+    ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift", ".php",
+}
+_CSS_EXTENSIONS = {".css", ".scss", ".less"}
+_HASH_EXTENSIONS = {".sh", ".bash", ".zsh", ".yml", ".yaml", ".toml"}
+
+# Marks a removed span; lines left holding only markers and spaces are dropped
+_GONE = "\x00"
+
+_BLANK_RUN_RE = re.compile(r"\n(?:[ \t]*\n){2,}")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+_C_SPECIAL_RE = re.compile(r"[\"'`/]")
+_CSS_SPECIAL_RE = re.compile(r"[\"'/]")
+_HASH_SPECIAL_RE = re.compile(r"[\"'#\\]")
+
+
+def minify_language(file_path):
+    """Pick the minifier for a file: python, c, css, hash or None"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in (".py", ".pyi"):
+        return "python"
+    if ext in _C_EXTENSIONS:
+        return "c"
+    if ext in _CSS_EXTENSIONS:
+        return "css"
+    if ext in _HASH_EXTENSIONS:
+        return "hash"
+    return None
+
+
+def squeeze_blank_lines(text):
+    """Drop trailing whitespace and squeeze blank-line runs to one blank line"""
+    text = _TRAILING_SPACE_RE.sub("", text)
+    return _BLANK_RUN_RE.sub("\n\n", text)
+
+
+def _drop_marked_lines(text):
+    """Remove lines emptied by comment stripping, then the markers"""
+    if _GONE not in text:
+        return text
+    lines = text.split("\n")
+    kept = []
+    for line in lines:
+        if _GONE in line:
+            line = line.replace(_GONE, "").rstrip()
+            if not line:
+                continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _python_deletions(text):
+    """Yield (start, end, replacement) offsets for Python comments and docstrings"""
+    offsets = [0]
+    for line in text.split("\n"):
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    def offset(position):
+        row, col = position
+        return offsets[row - 1] + col
+
+    tokens = [t for t in tokenize.generate_tokens(io.StringIO(text).readline)]
+    significant = [t for t in tokens if t.type not in (tokenize.NL, tokenize.COMMENT)]
+    for token in tokens:
+        if token.type == tokenize.COMMENT and not (token.start[0] == 1 and token.string.startswith("#!")):
+            yield offset(token.start), offset(token.end), _GONE
+
+    for number, token in enumerate(significant):
+        if token.type != tokenize.STRING:
+            continue
+        before = significant[number - 1].type if number else tokenize.NEWLINE
+        after = significant[number + 1].type if number + 1 < len(significant) else tokenize.ENDMARKER
+        # A docstring opens a module (nothing before it) or a block (INDENT)
+        opens_block = before == tokenize.INDENT or (number == 0)
+        if not opens_block or after != tokenize.NEWLINE:
+            continue
+        following = significant[number + 2].type if number + 2 < len(significant) else tokenize.ENDMARKER
+        # A body holding only a docstring still needs a statement
+        replacement = "..." if before == tokenize.INDENT and following in (tokenize.DEDENT, tokenize.ENDMARKER) else _GONE
+        yield offset(token.start), offset(token.end), replacement
+
+
+def strip_python(text):
+    """Remove comments and docstrings from Python source"""
+    try:
+        deletions = sorted(_python_deletions(text))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return text
+    parts = []
+    position = 0
+    for start, end, replacement in deletions:
+        if start < position:
+            continue
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return _drop_marked_lines("".join(parts))
+
+
+def _skip_string(text, start, quote):
+    """Return the index after the string literal starting at text[start]"""
+    i = start + 1
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        # Unterminated '...' and "..." end at the line; `...` may span lines
+        if c == "\n" and quote != "`":
+            return i
+        i += 1
+    return n
+
+
+# A "/" after one of these (or at the start) opens a regex literal, not a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void",
+                   "throw", "yield", "await"}
+_WORD_BEFORE_RE = re.compile(r"([A-Za-z_$][\w$]*)\s*$")
+
+
+def _regex_end(text, start):
+    """The index after a JS regex literal opening at text[start], or None if there is none"""
+    before = text[max(0, start - 32):start].rstrip()
+    if before and before[-1] not in _REGEX_PRECEDERS:
+        word = _WORD_BEFORE_RE.search(before)
+        if word is None or word.group(1) not in _REGEX_KEYWORDS:
+            return None
+    i = start + 1
+    n = len(text)
+    in_class = False
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return None
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            return i + 1
+        i += 1
+    return None
+
+
+def strip_c_comments(text, line_comments=True):
+    """Remove /* */ (and optionally //) comments outside string literals"""
+    special = _C_SPECIAL_RE if line_comments else _CSS_SPECIAL_RE
+    parts = []
+    i = 0
+    n = len(text)
+    while i < n:
+        match = special.search(text, i)
+        if match is None:
+            parts.append(text[i:])
+            break
+        j = match.start()
+        parts.append(text[i:j])
+        c = text[j]
+        if c in "\"'`":
+            end = _skip_string(text, j, c)
+            parts.append(text[j:end])
+            i = end
+        elif text.startswith("/*", j):
+            end = text.find("*/", j + 2)
+            end = n if end < 0 else end + 2
+            # Keep tokens on either side of an inline comment apart
+            parts.append(_GONE + (" " if text[end:end + 1].isalnum() and text[j - 1:j].isalnum() else ""))
+            i = end
+        elif line_comments and text.startswith("//", j):
+            end = text.find("\n", j)
+            end = n if end < 0 else end
+            parts.append(_GONE)
+            i = end
+        else:
+            # A regex literal such as /\/\// holds "//" that is not a comment
+            end = _regex_end(text, j) if line_comments else None
+            if end is None:
+                end = j + 1
+            parts.append(text[j:end])
+            i = end
+    return _drop_marked_lines("".join(parts))
+
+
+def strip_hash_comments(text):
+    """Remove # comments (shell, YAML, TOML) outside quotes, keeping a shebang"""
+    parts = []
+    i = 0
+    n = len(text)
+    while i < n:
+        match = _HASH_SPECIAL_RE.search(text, i)
+        if match is None:
+            parts.append(text[i:])
+            break
+        j = match.start()
+        parts.append(text[i:j])
+        c = text[j]
+        if c == "\\":
+            parts.append(text[j:j + 2])
+            i = j + 2
+        elif c == "'":
+            # Single quotes have no escapes in shell
+            end = text.find("'", j + 1)
+            end = n if end < 0 else end + 1
+            parts.append(text[j:end])
+            i = end
+        elif c == '"':
+            end = _skip_string(text, j, c)
+            parts.append(text[j:end])
+            i = end
+        elif (j == 0 or text[j - 1] in " \t\n") and not (j == 0 and text.startswith("#!")):
+            end = text.find("\n", j)
+            end = n if end < 0 else end
+            parts.append(_GONE)
+            i = end
+        else:
+            parts.append(c)
+            i = j + 1
+    return _drop_marked_lines("".join(parts))
+
+
+def leading_header(text, language):
+    """Return the leading comment block of a file, or "" if there is none"""
+    lines = text.split("\n")
+    start = 1 if lines and lines[0].startswith("#!") else 0
+    end = start
+    if language in ("python", "hash"):
+        while end < len(lines) and lines[end].startswith("#"):
+            end += 1
+    elif language in ("c", "css"):
+        if start < len(lines) and lines[start].lstrip().startswith("/*"):
+            while end < len(lines) and "*/" not in lines[end]:
+                end += 1
+            end += 1
+        else:
+            while end < len(lines) and lines[end].lstrip().startswith("//"):
+                end += 1
+    if end - start < HEADER_MIN_LINES or end > len(lines):
+        return ""
+    return "\n".join(lines[:end]) + "\n"
+
+
+def minify_text(text, language, mode="light"):
+    """Minify one file's text; returns {"text", "header", "changed", "tokens_saved"}"""
+    original = text
+    if mode == "full":
+        if language == "python":
+            text = strip_python(text)
+        elif language == "c":
+            text = strip_c_comments(text)
+        elif language == "css":
+            text = strip_c_comments(text, line_comments=False)
+        elif language == "hash":
+            text = strip_hash_comments(text)
+    text = squeeze_blank_lines(text)
+    header = leading_header(text, language) if mode == "light" else ""
+    changed = text != original
+    saved = estimate_tokens(original) - estimate_tokens(text) if changed else 0
+    return {"text": text, "header": header, "changed": changed, "tokens_saved": saved}
+
+
+def _minify_entry(text, language, mode):
+    """minify_text, with the text dropped when the saving is not worth a copy"""
+    entry = minify_text(text, language, mode)
+    saved = entry["tokens_saved"]
+    if saved < MIN_TOKENS_SAVED or saved < estimate_tokens(text) * MIN_SAVED_RATIO:
+        # The header must then be found in the original text
+        header = leading_header(text, language) if mode == "light" else ""
+        return {"text": None, "header": header, "changed": False, "tokens_saved": 0}
+    return entry
+
+
+def minify_context(context, config, keep=(), project_root="."):
+    """Minify the files of a context per the `minify` config mode
+
+    Returns (context, report) where report has "files" (how many changed),
+    "tokens_saved" (estimated) and "header_owners" (the files whose header
+    others refer to, which have to be sent for the references to resolve).
+    """
+    mode = config.get("minify", "light")
+    report = {"files": 0, "tokens_saved": 0, "header_owners": []}
+    if mode not in MODES or mode == "off":
+        return context, report
+
+    keep = set(keep)
+    by_language = {}
+    for path in context:
+        if path in keep or path.startswith("_"):
+            continue
+        by_language.setdefault(minify_language(path), []).append(path)
+
+    index = open_index(project_root, config) if context_size(context) >= CACHE_MIN_SIZE else None
+    try:
+        minified = {}
+        for language, paths in by_language.items():
+            minified.update(derive_cached(
+                index, f"minify:{mode}:{language}", subset_context(context, paths),
+                lambda text: _minify_entry(text, language, mode),
+            ))
+    finally:
+        if index is not None:
+            index.close()
+
+    # A header repeated across files is kept in the first file that has it
+    first_with = {}
+    owners = set()
+    overrides = {}
+    for path in sorted(minified):
+        entry = minified[path]
+        saved = entry["tokens_saved"]
+        text = entry["text"]
+        changed = entry["changed"]
+        header = entry["header"]
+        if header:
+            owner = first_with.setdefault(header, path)
+            if owner != path:
+                if text is None:
+                    text = context[path]
+                owners.add(owner)
+                reference = f"[zor: same header as {owner}]\n"
+                text = reference + text[len(header):]
+                saved += estimate_tokens(header) - estimate_tokens(reference)
+                changed = True
+        if changed:
+            overrides[path] = text
+            report["tokens_saved"] += max(saved, 0)
+
+    if not overrides:
+        return context, report
+    report["files"] = len(overrides)
+    report["header_owners"] = sorted(owners)
+    return subset_context(context, list(context), overrides), report
@@ -0,0 +1,202 @@
+"""Outlines of source files: signatures kept, bodies elided.
+
+Commands working on one file (`edit`, `generate_test`) mostly need the
+interfaces of the surrounding code. An outline keeps imports, constants,
+class and function signatures and the first line of each docstring; Python
+is outlined with `ast`, other code languages line by line with the same
+definition patterns the chunker uses. Outlines are cached per content digest
+in the file index.
+
+Which commands send outlines is set per command by the `context_mode`
+config key, e.g. {"edit": "outline", "ask": "full"}.
+"""
+import ast
+import re
+
+from .context import _BLOCK_START_RE, chunk_language, context_size, split_lines, subset_context
+from .index import derive_cached, open_index
+
+OUTLINE_HEADER = "[zor: outline, bodies elided]\n"
+
+# Below this much text outlining is cheaper than opening the index
+CACHE_MIN_SIZE = 64 * 1024
+
+# Assignments spanning more lines than this are outlined as `name = ...`
+MAX_ASSIGNMENT_LINES = 3
+
+_CONSTANT_NAME_RE = re.compile(r"^_*[A-Z][A-Z0-9_]*$")
+_IMPORT_RE = re.compile(r"^\s*(?:import\b|from\s+\S+\s+import\b|#include\b|using\b|use\b|package\b|require\b|export\s+\*)")
+_CONSTANT_RE = re.compile(
+    r"^(?:export\s+)?(?:(?:pub\s+)?const|static\s+final|final|#define|var|let)\s+(?:[\w<>\[\]]+\s+)?_*[A-Z][A-Z0-9_]*\b"
+)
+_METHOD_RE = re.compile(
+    r"^\s+(?:(?:public|private|protected|static|async|override|get|set)\s+)*"
+    r"(?!(?:if|for|while|switch|catch|return|else)\b)[A-Za-z_$][\w$]*\s*\([^)]*\)\s*(?::\s*[^{=]+)?\{\s*$"
+)
+
+
+def _docstring_line(node, indent):
+    """First line of a node's docstring as a one-line docstring, or None"""
+    docstring = ast.get_docstring(node)
+    if not docstring or not docstring.strip():
+        return None
+    first = docstring.strip().splitlines()[0].replace("\\", "\\\\").replace('"', '\\"')
+    return f'{indent}"""{first}"""\n'
+
+
+def _outline_python(text):
+    """Outline a Python module with ast"""
+    tree = ast.parse(text)
+    lines = split_lines(text)
+    out = []
+
+    def source(node):
+        return lines[node.lineno - 1:node.end_lineno]
+
+    def start(node):
+        return min([d.lineno for d in getattr(node, "decorator_list", ())] + [node.lineno])
+
+    def body_indent(node):
+        return " " * node.body[0].col_offset
+
+    def emit_def(node):
+        # The signature runs up to the first statement of the body
+        body_start = start(node.body[0])
+        if body_start == node.lineno:
+            out.extend(lines[start(node) - 1:node.lineno])
+            return
+        out.extend(lines[start(node) - 1:body_start - 1])
+        indent = body_indent(node)
+        doc = _docstring_line(node, indent)
+        if doc:
+            out.append(doc)
+        if isinstance(node, ast.ClassDef):
+            before = len(out)
+            for child in node.body:
+                emit(child, in_class=True)
+            if len(out) > before:
+                return
+        out.append(f"{indent}...\n")
+
+    def emit(node, in_class=False):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            out.extend(source(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            emit_def(node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [t.id for t in targets if isinstance(t, ast.Name)]
+            # Class attributes are the class's interface; at module level only constants
+            if not (in_class or any(_CONSTANT_NAME_RE.match(n) or n == "__all__" for n in names)):
+                return
+            if node.end_lineno - node.lineno < MAX_ASSIGNMENT_LINES:
+                out.extend(source(node))
+                return
+            # Long literals (tables, mappings) keep only their target
+            indent = " " * node.col_offset
+            if isinstance(node, ast.Assign):
+                left = " = ".join(ast.get_source_segment(text, t) for t in node.targets)
+            else:
+                left = f"{ast.get_source_segment(text, node.target)}: {ast.get_source_segment(text, node.annotation)}"
+            out.append(f"{indent}{left} = ...\n")
+
+    doc = _docstring_line(tree, "")
+    if doc:
+        out.append(doc)
+    for node in tree.body:
+        emit(node)
+    return "".join(line if line.endswith("\n") else line + "\n" for line in out)
+
+
+def _outline_code(text):
+    """Outline brace/indent languages by keeping definition-like lines"""
+    out = []
+    elided = False
+    indent = ""
+    for line in split_lines(text):
+        stripped = line.lstrip()
+        if (
+            _BLOCK_START_RE.match(stripped)
+            or _METHOD_RE.match(line)
+            or _IMPORT_RE.match(line)
+            or _CONSTANT_RE.match(stripped)
+        ):
+            if elided:
+                out.append(f"{indent}    ...\n")
+                elided = False
+            out.append(line if line.endswith("\n") else line + "\n")
+            indent = line[:len(line) - len(stripped)]
+        elif stripped.strip():
+            elided = True
+    if elided:
+        out.append(f"{indent}    ...\n")
+    return "".join(out)
+
+
+def outline_source(text, language):
+    """Outline a file's text, or return None when no outline applies"""
+    try:
+        if language == "python":
+            outline = _outline_python(text)
+        elif language == "code":
+            outline = _outline_code(text)
+        else:
+            return None
+    except (SyntaxError, ValueError):
+        return None
+    if not outline.strip():
+        return None
+    outline = OUTLINE_HEADER + outline
+    # Small files can come out longer than they are; send those in full
+    return outline if len(outline) < len(text) else None
+
+
+def context_mode(config, command):
+    """The context mode ("full" or "outline") configured for a command"""
+    return config.get("context_mode", {}).get(command, "full")
+
+
+def outline_files(context, index=None, keep=()):
+    """Outline the code files of a context, reusing outlines cached in the index
+
+    Returns {path: outline or None}; prose, files in `keep` and synthetic
+    "_" entries are left out.
+    """
+    keep = set(keep)
+    by_language = {}
+    for path in context:
+        if path in keep or path.startswith("_"):
+            continue
+        by_language.setdefault(chunk_language(path), []).append(path)
+    by_language.pop("text", None)
+    by_language.pop("markdown", None)
+
+    outlines = {}
+    for language, paths in by_language.items():
+        outlines.update(derive_cached(
+            index, f"outline:{language}", subset_context(context, paths),
+            lambda text: outline_source(text, language),
+        ))
+    return outlines
+
+
+def outline_context(context, keep=(), project_root=".", config=None):
+    """Replace the files of a context by their outlines, except those in `keep`
+
+    Files that cannot be outlined (prose, syntax errors, tiny files) and
+    synthetic "_" entries are sent in full.
+    """
+    if all(path in keep or path.startswith("_") for path in context):
+        return context
+
+    index = open_index(project_root, config) if context_size(context) >= CACHE_MIN_SIZE else None
+    try:
+        outlines = outline_files(context, index, keep)
+    finally:
+        if index is not None:
+            index.close()
+
+    overrides = {path: outline for path, outline in outlines.items() if outline is not None}
+    if not overrides:
+        return context
+    return subset_context(context, list(context), overrides)
@@ -0,0 +1,237 @@
+"""Token-budgeted packing of context files into a prompt.
+
+Candidates are ranked by priority tier (edit target, pinned files, retrieval
+hits, everything else) and then by score, and added until the model's input
+budget is used up. Files that no longer fit are truncated while there is
+room for a useful slice, and the rest are dropped. Every decision is recorded
+in a manifest.
+"""
+import fnmatch
+import re
+
+from .context import context_size, subset_context
+from .index import derive_cached, open_index
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+TIER_TARGET = 0
+TIER_PINNED = 1
+TIER_RETRIEVED = 2
+TIER_OTHER = 3
+
+TIER_NAMES = {
+    TIER_TARGET: "target",
+    TIER_PINNED: "pinned",
+    TIER_RETRIEVED: "retrieved",
+    TIER_OTHER: "other",
+}
+
+# Input token limits per model; unknown models get DEFAULT_INPUT_LIMIT
+MODEL_INPUT_LIMITS = {
+    "gemini-2.0-flash": 1_048_576,
+    "gemini-2.0-flash-lite": 1_048_576,
+    "gemini-1.5-flash": 1_048_576,
+    "gemini-1.5-pro": 2_097_152,
+    "gemini-2.5-pro": 1_048_576,
+    "gemini-2.5-flash": 1_048_576,
+}
+DEFAULT_INPUT_LIMIT = 128_000
+
+TOKENS_CACHE_KIND = "tokens"
+
+# Smallest slice worth sending when a file has to be truncated
+MIN_TRUNCATED_TOKENS = 256
+
+_WORD_RE = re.compile(r"\S+")
+_encoding = None
+
+
+def estimate_tokens(text):
+    """Estimate the model tokens in a text
+
+    Uses `tiktoken` when it is installed, otherwise the larger of a word-based
+    (words * 1.3, as in `context_injector`) and a character-based estimate,
+    since code is dense in symbols.
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    words = len(_WORD_RE.findall(text))
+    return max(int(words * 1.3), len(text) // 4)
+
+
+def count_tokens(texts, index=None):
+    """Estimate tokens for {key: text} in bulk, cached per content digest"""
+    return derive_cached(index, TOKENS_CACHE_KIND, texts, estimate_tokens)
+
+
+def input_limit(model_name):
+    """Return the input token limit for a model"""
+    return MODEL_INPUT_LIMITS.get(model_name, DEFAULT_INPUT_LIMIT)
+
+
+def context_budget(config, prompt_tokens=0):
+    """Tokens available for context once the prompt and the response are reserved"""
+    budget = config.get("context_budget_tokens") or input_limit(config.get("model", "gemini-2.0-flash"))
+    # max_tokens is the response length; it has to fit in the same window
+    return max(0, budget - config.get("max_tokens", 8192) - prompt_tokens)
+
+
+def build_candidates(context, target=None, pinned=(), scores=None):
+    """Turn a context dict into ranked candidates
+
+    `target` is the file being edited, `pinned` a list of paths or glob
+    patterns that are always wanted, and `scores` optional retrieval scores
+    by path. Keys starting with "_" (such as the interactive conversation
+    history) are synthetic entries and count as pinned.
+    """
+    scores = scores or {}
+    candidates = []
+    for order, path in enumerate(context):
+        if path == target:
+            tier = TIER_TARGET
+        elif path.startswith("_") or any(fnmatch.fnmatch(path, pattern) for pattern in pinned):
+            tier = TIER_PINNED
+        elif path in scores:
+            tier = TIER_RETRIEVED
+        else:
+            tier = TIER_OTHER
+        candidates.append({
+            "path": path,
+            "tier": tier,
+            "score": scores.get(path, 0.0),
+            "order": order,
+        })
+    return candidates
+
+
+def _truncate(text, tokens, limit_tokens):
+    """Cut text to roughly limit_tokens at a line boundary, with an elision marker"""
+    keep_chars = int(len(text) * limit_tokens / max(tokens, 1))
+    cut = text.rfind("\n", 0, keep_chars)
+    if cut <= 0:
+        cut = keep_chars
+    head = text[:cut]
+    shown = head.count("\n") + 1
+    total = text.count("\n") + 1
+    return f"{head}\n... [truncated by zor: {shown} of {total} lines shown]\n"
+
+
+def pack_context(context, candidates, budget_tokens, token_counts=None, strategy="greedy",
+                 min_truncated_tokens=MIN_TRUNCATED_TOKENS):
+    """Pack the candidates of a context into the token budget
+
+    Candidates are taken tier by tier. Within a tier "greedy" follows score
+    (then original order) and "knapsack" follows score per token, the usual
+    greedy approximation of 0/1 knapsack. Target files are always included
+    whole. Only truncated files are read here. Returns (context, manifest).
+    """
+    if token_counts is None:
+        token_counts = count_tokens({c["path"]: context[c["path"]] for c in candidates})
+
+    if strategy == "knapsack":
+        def rank(c):
+            return (c["tier"], -c["score"] / max(token_counts[c["path"]], 1), c["order"])
+    else:
+        def rank(c):
+            return (c["tier"], -c["score"], c["order"])
+
+    ranked = sorted(candidates, key=rank)
+    remaining = budget_tokens
+    chosen = {}
+    overflow = []
+    for candidate in ranked:
+        tokens = token_counts[candidate["path"]]
+        if tokens <= remaining or candidate["tier"] == TIER_TARGET:
+            chosen[candidate["path"]] = (None, tokens, "included")
+            remaining -= tokens
+        else:
+            overflow.append(candidate)
+
+    # Files that did not fit are truncated in priority order while a useful
+    # slice still fits, so the lowest-priority files are the ones dropped
+    dropped = []
+    for candidate in overflow:
+        tokens = token_counts[candidate["path"]]
+        text = None
+        if remaining >= min_truncated_tokens:
+            full = context[candidate["path"]]
+            limit = remaining - 16
+            # `tokens` may be a rough estimate, so the slice is measured and
+            # cut again until what is actually sent fits
+            while limit >= min_truncated_tokens:
+                text = _truncate(full, tokens, limit)
+                used = estimate_tokens(text)
+                if used <= remaining:
+                    break
+                limit = limit * remaining // used
+                text = None
+        if text is not None:
+            chosen[candidate["path"]] = (text, used, "truncated")
+            remaining -= used
+        else:
+            dropped.append(candidate)
+
+    # Keep the caller's ordering in the packed context
+    kept = []
+    overrides = {}
+    entries = []
+    for candidate in candidates:
+        path = candidate["path"]
+        if path in chosen:
+            text, tokens, status = chosen[path]
+            kept.append(path)
+            if text is not None:
+                overrides[path] = text
+        else:
+            tokens, status = token_counts[path], "dropped"
+        entries.append({
+            "path": path,
+            "tier": TIER_NAMES[candidate["tier"]],
+            "score": candidate["score"],
+            "tokens": tokens,
+            "status": status,
+        })
+
+    manifest = {
+        "budget_tokens": budget_tokens,
+        "used_tokens": budget_tokens - remaining,
+        "included": sum(1 for e in entries if e["status"] == "included"),
+        "truncated": sum(1 for e in entries if e["status"] == "truncated"),
+        "dropped": len(dropped),
+        "files": entries,
+    }
+    return subset_context(context, kept, overrides), manifest
+
+
+def pack_for_model(context, config, prompt_tokens=0, target=None, pinned=None, scores=None,
+                   project_root="."):
+    """Pack a context dict into the configured model's input budget"""
+    budget = context_budget(config, prompt_tokens)
+    if pinned is None:
+        pinned = config.get("pinned_files", [])
+    candidates = build_candidates(context, target, pinned, scores)
+
+    # Every token is at least one character, so a context with fewer
+    # characters than the budget fits without counting anything. The
+    # per-file counts are then only placeholders, so the total is reported
+    # as unknown (None) rather than as an estimate.
+    if context_size(context) <= budget:
+        size = getattr(context, "size", None) or (lambda path: len(context[path]))
+        token_counts = {c["path"]: size(c["path"]) // 4 + 1 for c in candidates}
+        packed, manifest = pack_context(context, candidates, budget, token_counts)
+        manifest["used_tokens"] = None
+        return packed, manifest
+
+    index = open_index(project_root, config)
+    try:
+        token_counts = count_tokens(context, index)
+    finally:
+        if index is not None:
+            index.close()
+    return pack_context(context, candidates, budget, token_counts, config.get("packing_strategy", "greedy"))
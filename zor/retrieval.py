@@ -0,0 +1,270 @@
+"""Query-relevant context selection with a local BM25 inverted index.
+
+Documents are tokenized into identifiers and words (snake_case and camelCase
+identifiers also contribute their parts), term counts are cached per content
+digest in the file index, and scoring uses NumPy when it is installed.
+Documents are whole files or, at "chunk" granularity, the functions, classes
+and sections produced by `zor.context.chunk_files`.
+"""
+import math
+import re
+from collections import Counter
+
+from .context import MODULE_CHUNK, chunk_files, chunk_text, context_size, render_elided, split_lines
+from .index import derive_cached, open_index
+from .packer import count_tokens
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+_PART_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+TERMS_CACHE_KIND = "bm25_terms"
+# Chunk texts counted per index lookup when building a chunk retriever
+CHUNK_BATCH = 512
+
+
+def _word_tokens(word):
+    """Tokens contributed by one identifier or word"""
+    lower = word.lower()
+    tokens = [lower] if len(lower) > 1 else []
+    # load_history / loadHistory also match "load" and "history"
+    if "_" in word or not (word.islower() or word.isupper()):
+        tokens.extend(p.lower() for p in _PART_RE.findall(word) if len(p) > 1)
+    return tokens
+
+
+def tokenize(text):
+    """Split text into lowercase identifier and word tokens"""
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        tokens.extend(_word_tokens(word))
+    return tokens
+
+
+def term_counts(text):
+    """Count the tokens in a document"""
+    counts = {}
+    # Split each distinct word once, however often it occurs
+    for word, n in Counter(_WORD_RE.findall(text)).items():
+        for token in _word_tokens(word):
+            counts[token] = counts.get(token, 0) + n
+    return counts
+
+
+class BM25Index:
+    """Inverted index scored with Okapi BM25"""
+
+    def __init__(self, doc_term_counts, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = list(doc_term_counts)
+        lengths = [sum(counts.values()) for counts in doc_term_counts.values()]
+        self.avgdl = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+        # Per-document length normalisation, precomputed once
+        avgdl = self.avgdl or 1.0
+        norms = [k1 * (1 - b + b * length / avgdl) for length in lengths]
+
+        self._vectorized = np is not None
+        if self._vectorized:
+            self._build_arrays(doc_term_counts.values(), norms)
+        else:
+            self._norms = norms
+            self._vocab = {}
+            for doc_number, counts in enumerate(doc_term_counts.values()):
+                for term, tf in counts.items():
+                    docs, tfs = self._vocab.setdefault(term, ([], []))
+                    docs.append(doc_number)
+                    tfs.append(tf)
+
+    def _build_arrays(self, all_counts, norms):
+        """Build CSR-style postings arrays: one sort instead of per-term lists"""
+        vocab = {}
+        term_ids = []
+        tfs = []
+        doc_sizes = []
+        for counts in all_counts:
+            term_ids.extend([vocab.setdefault(term, len(vocab)) for term in counts])
+            tfs.extend(counts.values())
+            doc_sizes.append(len(counts))
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        docs = np.repeat(np.arange(len(doc_sizes), dtype=np.int64), doc_sizes)
+        order = np.argsort(term_ids, kind="stable")
+        self._post_docs = docs[order]
+        self._post_tfs = np.asarray(tfs, dtype=np.float64)[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))))
+        self._vocab = vocab
+        self._norms = np.asarray(norms, dtype=np.float64)
+
+    @classmethod
+    def from_texts(cls, texts, index=None, **kwargs):
+        """Build from {doc_id: text}, reusing term counts cached in the file index"""
+        return cls(derive_cached(index, TERMS_CACHE_KIND, texts, term_counts), **kwargs)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _idf(self, df):
+        n = len(self.doc_ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _query_terms(self, query):
+        return [t for t in set(tokenize(query)) if t in self._vocab]
+
+    def _score_array(self, terms):
+        """Vectorised BM25: accumulate each term's contribution over its postings"""
+        totals = np.zeros(len(self.doc_ids))
+        for term in terms:
+            term_id = self._vocab[term]
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs, tfs = self._post_docs[start:end], self._post_tfs[start:end]
+            idf = self._idf(len(docs))
+            totals[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._norms[docs])
+        return totals
+
+    def scores(self, query):
+        """Return {doc_id: score} for every document matching the query"""
+        terms = self._query_terms(query)
+        if not terms:
+            return {}
+
+        if self._vectorized:
+            totals = self._score_array(terms)
+            return {self.doc_ids[i]: float(totals[i]) for i in np.flatnonzero(totals)}
+
+        totals = {}
+        for term in terms:
+            docs, tfs = self._vocab[term]
+            idf = self._idf(len(docs))
+            for doc_number, tf in zip(docs, tfs):
+                score = idf * tf * (self.k1 + 1) / (tf + self._norms[doc_number])
+                totals[doc_number] = totals.get(doc_number, 0.0) + score
+        return {self.doc_ids[i]: score for i, score in totals.items()}
+
+    def search(self, query, top_k=10):
+        """Return the top_k (doc_id, score) pairs, best first"""
+        if self._vectorized:
+            terms = self._query_terms(query)
+            if not terms:
+                return []
+            totals = self._score_array(terms)
+            matched = np.flatnonzero(totals)
+            if len(matched) > top_k:
+                # Partial selection keeps this O(n) however many documents match
+                matched = matched[np.argpartition(-totals[matched], top_k - 1)[:top_k]]
+            ranked = [(self.doc_ids[i], float(totals[i])) for i in matched]
+        else:
+            ranked = list(self.scores(query).items())
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+
+class ChunkRetriever:
+    """BM25 over the chunks of a context, remembering which file each came from"""
+
+    def __init__(self, bm25, chunks):
+        self.bm25 = bm25
+        self.chunks = chunks
+
+    def __len__(self):
+        return len(self.bm25)
+
+    def search(self, query, top_k=10):
+        """Return the top_k (chunk_id, score) pairs, best first"""
+        return self.bm25.search(query, top_k)
+
+
+def build_retriever(context, project_root=".", config=None, granularity="file"):
+    """Build a BM25 index over a collected context, per file or per chunk"""
+    index = open_index(project_root, config)
+    try:
+        if granularity != "chunk":
+            return BM25Index.from_texts(context, index)
+        chunks = chunk_files(context, index)
+        # Chunk texts are built a file at a time and only live until their
+        # batch is counted, so the codebase is never held whole
+        counts = {}
+        batch = {}
+        for path, file_chunks in chunks.items():
+            text = context[path]
+            lines = split_lines(text)
+            for chunk in file_chunks:
+                batch[chunk["id"]] = chunk_text(text, chunk, lines)
+            if len(batch) >= CHUNK_BATCH:
+                counts.update(derive_cached(index, TERMS_CACHE_KIND, batch, term_counts))
+                batch = {}
+        counts.update(derive_cached(index, TERMS_CACHE_KIND, batch, term_counts))
+        return ChunkRetriever(BM25Index(counts), chunks)
+    finally:
+        if index is not None:
+            index.close()
+
+
+def _select_chunks(query, context, retriever, top_k, budget_tokens, keep):
+    """Render the files holding the top_k chunks with everything else elided"""
+    hits = {}
+    for chunk_id, _ in retriever.search(query, top_k):
+        path = chunk_id.partition("#")[0]
+        if path in context:
+            hits.setdefault(path, set()).add(chunk_id)
+
+    views = {path: context[path] for path in keep if path in context}
+    for path, chunk_ids in hits.items():
+        if path in views:
+            continue
+        # The module header carries the imports that make a chunk readable
+        header = [c["id"] for c in retriever.chunks[path][:1] if c["name"] == MODULE_CHUNK]
+        views[path] = render_elided(context[path], retriever.chunks[path], chunk_ids | set(header))
+
+    token_counts = count_tokens(views)
+    selected = {}
+    used = 0
+    for path, text in views.items():
+        tokens = token_counts[path]
+        if path not in keep and used + tokens > budget_tokens:
+            continue
+        selected[path] = text
+        used += tokens
+    return selected
+
+
+def select_context(query, context, top_k=20, budget_tokens=200_000, retriever=None,
+                   token_counts=None, keep=()):
+    """Pick the files most relevant to `query` within a token budget
+
+    A context that already fits the budget is returned unchanged. Otherwise
+    the top_k BM25 hits are added best-first while they fit. With a
+    `ChunkRetriever` the hits are chunks, and each file is sent with only its
+    matching chunks (plus its module header), the rest elided. Paths in
+    `keep` are always sent whole.
+    """
+    # Every token is at least one character, so this needs no counting
+    if context_size(context) <= budget_tokens:
+        return context
+
+    if token_counts is None:
+        token_counts = count_tokens(context)
+    if sum(token_counts.values()) <= budget_tokens:
+        return context
+
+    if retriever is None:
+        retriever = build_retriever(context)
+    if isinstance(retriever, ChunkRetriever):
+        return _select_chunks(query, context, retriever, top_k, budget_tokens, set(keep))
+
+    selected = {path: context[path] for path in keep if path in context}
+    used = sum(token_counts[path] for path in selected)
+    for path, _ in retriever.search(query, top_k):
+        if path not in context or path in selected:
+            continue
+        tokens = token_counts[path]
+        if used + tokens > budget_tokens:
+            continue
+        selected[path] = context[path]
+        used += tokens
+    return selected
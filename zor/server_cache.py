@@ -0,0 +1,175 @@
+"""Server-side caching of the codebase part of the prompt.
+
+Every request sends the codebase context again, so `interactive` pays the
+input tokens for the same megabytes on each turn. With `server_cache` on,
+the codebase prefix is uploaded once as Gemini cached content with a TTL,
+and later requests (turns, other commands) send only what follows it: the
+conversation history and the user prompt.
+
+Cached contents are tracked in `server_contexts.json` in the user cache
+directory, keyed by project, model and a hash of the prefix. The prefix is
+the packed context, which changes with retrieval from one prompt to the
+next, so several are kept per project and model, each with its own TTL:
+going back to an earlier selection (or to the files before an edit) hits
+again. Entries close to expiry are dropped, and past
+`server_cache_max_entries` the least recently used is deleted on the server.
+
+The server is reached through a `CacheServer`, so the logic can be tested
+against a local fake; `GeminiCacheServer` talks to the Gemini API.
+"""
+import abc
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .cache import get_cache_dir
+
+REGISTRY_FILENAME = "server_contexts.json"
+
+DEFAULT_TTL_SECONDS = 3600
+# Gemini refuses to cache less than this many tokens
+DEFAULT_MIN_TOKENS = 32768
+# Cached contents expiring sooner than this are replaced rather than used
+EXPIRY_MARGIN_SECONDS = 60
+# Cached contents kept per project and model
+DEFAULT_MAX_ENTRIES = 4
+
+
+class CacheServer(abc.ABC):
+    """The operations server-side caching needs from the API"""
+
+    @abc.abstractmethod
+    def create(self, model_name, text, ttl_seconds):
+        """Upload `text` as cached content; returns (name, expires_at epoch seconds)"""
+
+    @abc.abstractmethod
+    def delete(self, name):
+        """Delete a cached content"""
+
+    @abc.abstractmethod
+    def model(self, name, generation_config):
+        """A model handle whose requests continue after the cached content"""
+
+
+class GeminiCacheServer(CacheServer):
+    """CacheServer backed by `google.generativeai.caching`"""
+
+    def create(self, model_name, text, ttl_seconds):
+        from google.generativeai import caching
+
+        model = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        cached = caching.CachedContent.create(
+            model=model, contents=[text], ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        return cached.name, cached.expire_time.timestamp()
+
+    def delete(self, name):
+        from google.generativeai import caching
+
+        caching.CachedContent(name).delete()
+
+    def model(self, name, generation_config):
+        import google.generativeai as genai
+
+        return genai.GenerativeModel.from_cached_content(name, generation_config=generation_config or None)
+
+
+def prefix_digest(model_name, text):
+    """Hash of a prefix as cached for a model"""
+    h = hashlib.sha256(model_name.encode("utf-8") + b"\0")
+    h.update(text.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class ServerContextCache:
+    """Cached contents per project, model and prefix, evicted by expiry and LRU"""
+
+    def __init__(self, server, registry_path=None, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 min_tokens=DEFAULT_MIN_TOKENS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.server = server
+        self.registry_path = registry_path or get_cache_dir() / REGISTRY_FILENAME
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.max_entries = max(1, max_entries)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, server, config):
+        return cls(
+            server,
+            ttl_seconds=config.get("server_cache_ttl_seconds", DEFAULT_TTL_SECONDS),
+            min_tokens=config.get("server_cache_min_tokens", DEFAULT_MIN_TOKENS),
+            max_entries=config.get("server_cache_max_entries", DEFAULT_MAX_ENTRIES),
+        )
+
+    def _load(self):
+        try:
+            with open(self.registry_path, encoding="utf-8") as f:
+                registry = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Entries of the older one-per-project layout expire on the server
+        return {key: entry for key, entry in registry.items() if "used" in entry}
+
+    def _save(self, registry):
+        try:
+            os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
+            tmp = f"{self.registry_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(registry, f)
+            os.replace(tmp, self.registry_path)
+        except OSError:
+            pass
+
+    def _drop(self, registry, key):
+        """Delete a cached content on the server and forget it"""
+        name = registry.pop(key)["name"]
+        try:
+            self.server.delete(name)
+        except Exception:
+            pass
+        self._models = {k: v for k, v in self._models.items() if k[0] != name}
+
+    def cached_content(self, project, model_name, text, tokens):
+        """The name of the cached content holding `text`, uploading it if needed
+
+        Returns None when the prefix is too small to cache or the server
+        refuses; the caller then sends the whole prompt.
+        """
+        if tokens < self.min_tokens:
+            return None
+        owner = f"{project}|{model_name}"
+        key = f"{owner}|{prefix_digest(model_name, text)}"
+        now = time.time()
+        with self._lock:
+            registry = self._load()
+            for stale in [k for k, e in registry.items() if e["expires"] <= now + EXPIRY_MARGIN_SECONDS]:
+                self._drop(registry, stale)
+            entry = registry.get(key)
+            if entry:
+                entry["used"] = now
+                self._save(registry)
+                return entry["name"]
+            try:
+                name, expires = self.server.create(model_name, text, self.ttl_seconds)
+            except Exception:
+                self._save(registry)
+                return None
+            registry[key] = {"owner": owner, "name": name, "expires": expires, "used": now}
+            mine = sorted((e["used"], k) for k, e in registry.items() if e["owner"] == owner)
+            for _, evicted in mine[:max(0, len(mine) - self.max_entries)]:
+                self._drop(registry, evicted)
+            self._save(registry)
+            return name
+
+    def model(self, name, generation_config):
+        """The model handle for a cached content, kept for later requests"""
+        key = (name, json.dumps(generation_config, sort_keys=True))
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self.server.model(name, generation_config)
+            return self._models[key]
@@ -0,0 +1,140 @@
+"""Portable snapshots of the file index.
+
+A snapshot is a gzip-compressed JSONL file. The first line is a header.
+Each later line is one of:
+  * a "file" record: path (with "/" separators), size, mtime, digest,
+    verdicts and text
+  * a "derived" record: a cached value such as token counts, outlines,
+    chunks or term counts, keyed on the content digest
+
+Export collects the context first so that the index is current. It also
+warms the token counts and outlines.
+
+Import checks every file record against the working tree before using it:
+  * the size must match
+  * the content must match, checked in this order:
+      - the git blob hash (the same hash zor uses as a digest), so tracked
+        files need no read
+      - with verify="stat", the recorded mtime
+      - otherwise, a hash of the file
+Records that fail the check are dropped, and collection reads those files
+as usual. Derived values are keyed on content, so they are always valid.
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter
+
+from .context import git_list_files
+from .index import FileIndex, blob_digest
+from .outline import outline_files
+from .packer import count_tokens
+
+SNAPSHOT_FORMAT = "zor-snapshot"
+SNAPSHOT_VERSION = 1
+VERIFY_MODES = ("hash", "stat")
+
+# Derived values are written to the index in batches of this many
+_DERIVED_BATCH = 1000
+
+
+class SnapshotError(Exception):
+    """Raised for files that are not zor snapshots or have an unknown version"""
+
+
+def export_snapshot(output, context, project_root=".", config=None):
+    """Write the index for project_root (after warming `context`) to a snapshot
+
+    Returns counters: files, text_files, derived.
+    """
+    counts = Counter(files=0, text_files=0, derived=0)
+    with FileIndex(project_root, load_text=False) as index:
+        # Downstream jobs need token counts and outlines for every file
+        count_tokens(context, index)
+        outline_files(context, index)
+
+        with gzip.open(output, "wt", encoding="utf-8") as f:
+            header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "created": time.time()}
+            f.write(json.dumps(header) + "\n")
+            for row in index.rows():
+                row["type"] = "file"
+                # Paths are stored with "/" so a snapshot made on Windows
+                # serves Linux jobs and the other way round
+                row["path"] = row["path"].replace(os.sep, "/")
+                f.write(json.dumps(row) + "\n")
+                counts["files"] += 1
+                counts["text_files"] += not row["is_binary"]
+            for kind, digest, value in index.derived_rows():
+                # value is already JSON text, so it is embedded as it is
+                f.write(f'{{"type": "derived", "kind": {json.dumps(kind)}, "digest": "{digest}", "value": {value}}}\n')
+                counts["derived"] += 1
+    return counts
+
+
+def _verified(row, full_path, st, git_digest, verify):
+    """Check a file record against the file on disk"""
+    if st.st_size != row["size"]:
+        return False
+    if git_digest is not None:
+        return git_digest == row["digest"]
+    if verify == "stat":
+        return st.st_mtime_ns == row["mtime_ns"]
+    if row["is_binary"]:
+        # Binary verdicts carry no content hash; re-sniffing is cheap
+        return False
+    with open(full_path, "rb") as f:
+        return blob_digest(f.read()) == row["digest"]
+
+
+def import_snapshot(source, project_root=".", config=None, verify="hash"):
+    """Load a snapshot into the index for project_root, keeping only records that still match
+
+    Returns counters: files (records read), reused, stale, derived.
+    """
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode {verify!r}; expected one of {', '.join(VERIFY_MODES)}")
+    config = config or {}
+    git_files = git_list_files(project_root) if config.get("use_git_index", True) else None
+    git_files = git_files or {}
+
+    counts = Counter(files=0, reused=0, stale=0, derived=0)
+    with gzip.open(source, "rt", encoding="utf-8") as f, FileIndex(project_root, load_text=False) as index:
+        try:
+            header = json.loads(f.readline())
+        except (json.JSONDecodeError, OSError) as e:
+            raise SnapshotError(f"{source} is not a zor snapshot: {e}") from e
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"{source} is not a zor snapshot")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {header.get('version')} (expected {SNAPSHOT_VERSION})")
+
+        derived = {}
+        for line in f:
+            row = json.loads(line)
+            if row["type"] == "derived":
+                derived.setdefault(row["kind"], {})[row["digest"]] = row["value"]
+                counts["derived"] += 1
+                if counts["derived"] % _DERIVED_BATCH == 0:
+                    for kind, values in derived.items():
+                        index.put_derived(kind, values)
+                    derived = {}
+                continue
+
+            counts["files"] += 1
+            path = os.path.normpath(row["path"])
+            full_path = os.path.join(project_root, path)
+            try:
+                st = os.stat(full_path)
+                valid = _verified(row, full_path, st, git_files.get(row["path"]), verify)
+            except OSError:
+                valid = False
+            if not valid:
+                counts["stale"] += 1
+                continue
+            index.put(path, st, row["digest"], row["is_binary"], row["text"], row["generated"])
+            counts["reused"] += 1
+
+        for kind, values in derived.items():
+            index.put_derived(kind, values)
+    return counts
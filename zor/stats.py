@@ -0,0 +1,129 @@
+"""Profiling of context collection for `zor context-stats`.
+
+Collection is run with per-phase timings and per-rule exclusion counts
+(see `get_codebase_context`), then the collected files are measured:
+  * the largest files and directories by bytes and by estimated tokens
+    (a directory counts every file below it)
+  * the context each command profile would send: the full codebase for
+    `ask` before retrieval narrows it; for edit and generate_test the target
+    file and its import neighbours (outlined when the command's
+    `context_mode` is "outline"), or the whole codebase when no target is
+    given; each after deduplication and minification, and how much of it
+    fits the model's context budget
+
+Exclusions are counted per file on the git fast path and per directory
+when the tree is walked, since an excluded directory is never entered.
+"""
+import os
+
+from .context import get_codebase_context
+from .dedup import dedup_context
+from .deps import dependency_context
+from .index import open_index
+from .minify import minify_context
+from .outline import context_mode, outline_files
+from .packer import context_budget, count_tokens
+
+PHASES = ("walk", "stat", "index", "sniff", "read", "decode")
+PROFILE_COMMANDS = ("ask", "edit", "generate_test")
+
+DEFAULT_TOP = 10
+
+
+def _top(sizes, tokens, top):
+    """The `top` largest entries by bytes and by tokens"""
+    def rows(key):
+        ranked = sorted(sizes, key=lambda path: (-key[path], path))[:top]
+        return [{"path": path, "bytes": sizes[path], "tokens": tokens[path]} for path in ranked]
+    return {"bytes": rows(sizes), "tokens": rows(tokens)}
+
+
+def _directory_totals(sizes, tokens):
+    """Bytes and tokens summed over every directory above each file"""
+    dir_sizes, dir_tokens = {}, {}
+    for path in sizes:
+        directory = os.path.dirname(path)
+        while directory:
+            dir_sizes[directory] = dir_sizes.get(directory, 0) + sizes[path]
+            dir_tokens[directory] = dir_tokens.get(directory, 0) + tokens[path]
+            directory = os.path.dirname(directory)
+    return dir_sizes, dir_tokens
+
+
+def profile_tokens(context, command, config, index=None, project_root=".", target=None):
+    """Estimated context tokens a command would send, before and after the budget
+
+    With a `target`, edit and generate_test are measured on what they send:
+    the target and its import neighbours, every file but the target outlined
+    in "outline" mode. Without one (or for a target zor did not collect)
+    they are estimated over the whole codebase, and "scope" says so.
+    """
+    mode = context_mode(config, command)
+    scope = "codebase"
+    keep = ()
+    if command != "ask" and target is not None:
+        neighbours = dependency_context(target, context, config.get("deps_hops", 1), project_root, config)
+        if neighbours is not None:
+            context, scope, keep = neighbours, "target", (target,)
+    if mode == "outline":
+        outlines = outline_files(context, index, keep)
+        overrides = {path: outline for path, outline in outlines.items() if outline is not None}
+        context = {path: overrides.get(path, text) for path, text in context.items()}
+    context, _ = dedup_context(context, config, project_root=project_root)
+    context, _ = minify_context(context, config, project_root=project_root)
+    tokens = sum(count_tokens(context, index).values())
+
+    budget = context_budget(config)
+    if command == "ask":
+        budget = min(budget, config.get("retrieval_budget_tokens", 200_000))
+    return {
+        "mode": mode,
+        "scope": scope,
+        "tokens": tokens,
+        "budget_tokens": budget,
+        "sent_tokens": min(tokens, budget),
+    }
+
+
+def collect_stats(project_root=".", config=None, scope=None, top=DEFAULT_TOP, target=None):
+    """Collect the context of project_root and report where its size and time go
+
+    `target` is the file edit and generate_test are profiled for, relative
+    to project_root.
+    """
+    config = config or {}
+    counters = {}
+    context = get_codebase_context(project_root, stats=counters, scope=scope, explain=True)
+
+    index = open_index(project_root, config)
+    try:
+        tokens = count_tokens(context, index)
+        sizes = {path: len(text.encode("utf-8")) for path, text in context.items()}
+        dir_sizes, dir_tokens = _directory_totals(sizes, tokens)
+        profiles = {
+            command: profile_tokens(context, command, config, index, project_root, target)
+            for command in PROFILE_COMMANDS
+        }
+    finally:
+        if index is not None:
+            index.close()
+
+    excluded = {
+        key[len("excluded:"):]: value for key, value in counters.items() if key.startswith("excluded:")
+    }
+    return {
+        "project_root": project_root,
+        "files": len(context),
+        "bytes": sum(sizes.values()),
+        "tokens": sum(tokens.values()),
+        "seconds_total": counters["seconds_total"],
+        "phases": {phase: counters.get(f"seconds_{phase}", 0.0) for phase in PHASES},
+        "counters": {
+            key: value for key, value in counters.items()
+            if not key.startswith(("excluded:", "seconds_"))
+        },
+        "excluded": dict(sorted(excluded.items(), key=lambda item: (-item[1], item[0]))),
+        "top_files": _top(sizes, tokens, top),
+        "top_directories": _top(dir_sizes, dir_tokens, top),
+        "profiles": profiles,
+    }
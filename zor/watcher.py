@@ -0,0 +1,431 @@
+"""Keep a collected context current while a session is running.
+
+A background thread listens for filesystem changes (inotify on Linux, a stat
+polling loop elsewhere), waits for bursts such as a `git checkout` to settle,
+then re-reads only the files that changed and records them in the file index.
+The prepared changes are merged into the caller's context dict by `sync()`,
+on the caller's thread, so the dict is never mutated while it is being read.
+"""
+import bisect
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import subprocess
+import threading
+import time
+from collections import Counter
+
+from .config import load_config
+from .context import (
+    ContextScope,
+    ExclusionMatcher,
+    ExtensionStats,
+    _Collector,
+    _find_git_dir,
+)
+from .index import INDEX_DIRNAME, open_index, stat_key
+from .large import LargeFilePolicy
+
+# Quiet period that ends a burst of events, and the longest a burst may
+# delay an update
+DEBOUNCE_SECONDS = 0.2
+MAX_DEBOUNCE_SECONDS = 2.0
+POLL_INTERVAL_SECONDS = 1.0
+
+# Returned by a backend when it lost track of events and everything must be
+# checked again
+RESCAN = object()
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _walk_dirs(root, matcher):
+    """Yield the relative paths of the directories context collection descends into"""
+    for dir_path, dir_names, _ in os.walk(root):
+        dir_names[:] = [
+            d for d in dir_names
+            if d != INDEX_DIRNAME and not matcher.excludes_dir(d)
+            and not os.path.islink(os.path.join(dir_path, d))
+        ]
+        yield os.path.relpath(dir_path, root)
+
+
+class InotifyBackend:
+    """Recursive inotify watches through ctypes (Linux only)"""
+
+    def __init__(self, root, matcher):
+        if not hasattr(select, "select") or not os.path.exists("/proc/sys/fs/inotify"):
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.root = root
+        self.matcher = matcher
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        try:
+            for relative_dir in _walk_dirs(root, matcher):
+                self._watch(relative_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, relative_dir):
+        path = os.path.join(self.root, relative_dir)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            # ENOENT/ENOTDIR: the directory vanished before we got to it
+            if errno in (2, 20):
+                return
+            # ENOSPC means the max_user_watches limit was hit
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+        self._dirs[wd] = relative_dir
+
+    def _watch_tree(self, relative_dir):
+        for sub_dir in _walk_dirs(os.path.join(self.root, relative_dir), self.matcher):
+            self._watch(os.path.normpath(os.path.join(relative_dir, sub_dir)))
+
+    def read(self, timeout):
+        """Wait up to `timeout` seconds and return changed relative paths (or RESCAN)"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return RESCAN
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            relative_dir = self._dirs.get(wd)
+            if relative_dir is None:
+                continue
+            if not name:
+                # The watched directory itself was deleted or moved
+                changed.add(relative_dir)
+                continue
+            if mask & IN_ISDIR and (name == INDEX_DIRNAME or self.matcher.excludes_dir(name)):
+                continue
+            path = os.path.normpath(os.path.join(relative_dir, name))
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._watch_tree(path)
+                except OSError:
+                    return RESCAN
+            changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingBackend:
+    """Portable fallback that compares stat keys every `interval` seconds"""
+
+    def __init__(self, root, matcher, interval=POLL_INTERVAL_SECONDS):
+        self.root = root
+        self.matcher = matcher
+        self.interval = interval
+        self._wake = threading.Event()
+        self._last_poll = time.monotonic()
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for relative_dir in _walk_dirs(self.root, self.matcher):
+            dir_path = os.path.join(self.root, relative_dir)
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False) and not self.matcher.excludes_file(entry.name):
+                            st = entry.stat(follow_symlinks=False)
+                            snapshot[os.path.normpath(os.path.join(relative_dir, entry.name))] = stat_key(st)
+            except OSError:
+                continue
+        return snapshot
+
+    def wake(self):
+        """Poll now instead of at the next interval"""
+        self._wake.set()
+
+    def read(self, timeout):
+        """Wait until the next poll (at most `timeout` seconds) and return changed paths"""
+        wait = self._last_poll + self.interval - time.monotonic()
+        if wait > 0 and not self._wake.wait(min(wait, timeout)) and wait > timeout:
+            return set()
+        self._wake.clear()
+        self._last_poll = time.monotonic()
+        snapshot = self._scan()
+        previous, self._snapshot = self._snapshot, snapshot
+        changed = {path for path, key in snapshot.items() if previous.get(path) != key}
+        changed.update(path for path in previous if path not in snapshot)
+        return changed
+
+    def close(self):
+        pass
+
+
+def _git_ignored(project_root, paths):
+    """Return the paths git would ignore, or an empty set outside a work tree"""
+    if not paths or not _find_git_dir(project_root):
+        return set()
+    try:
+        result = subprocess.run(
+            ["git", "-C", project_root, "check-ignore", "--stdin", "-z"],
+            input="\0".join(p.replace(os.sep, "/") for p in paths).encode(),
+            capture_output=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    return {os.path.normpath(p) for p in result.stdout.decode().split("\0") if p}
+
+
+class ContextWatcher:
+    """Watch project_root and keep `context` ({relative_path: text}) current
+
+    Start it with `start()` (or as a context manager) and call `sync()` before
+    each use of the context: it merges the changes the background thread has
+    prepared, after first asking it to pick up any events not seen yet.
+    """
+
+    def __init__(self, context, project_root=".", config=None, backend=None,
+                 debounce=DEBOUNCE_SECONDS, scope=None):
+        self.context = context
+        self.project_root = project_root
+        self.config = config if config is not None else load_config()
+        self.matcher = ExclusionMatcher.from_config(self.config)
+        # Changes outside the scope the context was collected with are ignored
+        self.scope = scope or ContextScope()
+        self.debounce = debounce
+        self.stats = Counter()
+        self._backend = backend
+        self._known = set(context)
+        self._ready = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flush = threading.Event()
+        self._synced = threading.Event()
+        self._thread = None
+
+    def _make_backend(self):
+        try:
+            return InotifyBackend(self.project_root, self.matcher)
+        except (OSError, AttributeError):
+            return PollingBackend(self.project_root, self.matcher)
+
+    @property
+    def backend_name(self):
+        return type(self._backend).__name__ if self._backend is not None else None
+
+    def start(self):
+        """Set up the watches and start the background thread"""
+        if self._thread is not None:
+            return self
+        if self._backend is None:
+            self._backend = self._make_backend()
+        self._thread = threading.Thread(target=self._run, name="zor-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread and release the watches"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        wake = getattr(self._backend, "wake", None)
+        if wake is not None:
+            wake()
+        self._thread.join()
+        self._thread = None
+        self._backend.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def sync(self, timeout=5.0):
+        """Bring `context` up to date; returns the number of paths that changed"""
+        if self._thread is not None:
+            self._synced.clear()
+            self._flush.set()
+            wake = getattr(self._backend, "wake", None)
+            if wake is not None:
+                wake()
+            self._synced.wait(timeout)
+
+        with self._lock:
+            ready, self._ready = self._ready, {}
+        for path, text in ready.items():
+            if text is None:
+                self.context.pop(path, None)
+            else:
+                self.context[path] = text
+        return len(ready)
+
+    def _run(self):
+        # Texts live in the context; the index only needs its metadata in memory
+        index = open_index(self.project_root, self.config, load_text=False)
+        ext_stats = ExtensionStats()
+        if index is not None:
+            for path, is_binary in index.verdicts():
+                ext_stats.add(path, is_binary)
+        collector = _Collector(self.project_root, self.matcher, index, ext_stats,
+                               large_files=LargeFilePolicy.from_config(self.config),
+                               exclude_generated=self.config.get("exclude_generated", True))
+
+        pending = set()
+        first_event = last_event = 0.0
+        try:
+            while not self._stop.is_set():
+                flushing = self._flush.is_set()
+                changed = self._backend.read(0 if flushing else self.debounce / 2)
+                now = time.monotonic()
+                if changed:
+                    if not pending:
+                        first_event = now
+                    last_event = now
+                    if changed is RESCAN:
+                        changed = {"."} | self._known
+                    pending |= changed
+                    if flushing:
+                        # Keep draining until the kernel queue is empty
+                        continue
+
+                settled = (now - last_event >= self.debounce
+                           or now - first_event >= MAX_DEBOUNCE_SECONDS)
+                if pending and (flushing or settled):
+                    self._apply(pending, collector, index, ext_stats)
+                    pending = set()
+                if flushing:
+                    self._flush.clear()
+                    self._synced.set()
+        finally:
+            if index is not None:
+                index.close()
+            self._synced.set()
+
+    def _expand(self, paths):
+        """Turn event paths into the set of files to refresh"""
+        files = set()
+        known = None
+        for path in paths:
+            full_path = os.path.join(self.project_root, path)
+            if os.path.isfile(full_path):
+                files.add(path)
+                continue
+            if os.path.isdir(full_path) and not os.path.islink(full_path):
+                for relative_dir in _walk_dirs(full_path, self.matcher):
+                    dir_path = os.path.join(full_path, relative_dir)
+                    try:
+                        names = os.listdir(dir_path)
+                    except OSError:
+                        continue
+                    for name in names:
+                        files.add(os.path.normpath(os.path.join(path, relative_dir, name)))
+            else:
+                files.add(path)
+            # A deleted or moved-away directory takes its files with it
+            if path == ".":
+                files.update(self._known)
+                continue
+            if known is None:
+                known = sorted(self._known)
+            prefix = path.rstrip(os.sep) + os.sep
+            for p in known[bisect.bisect_left(known, prefix):]:
+                if not p.startswith(prefix):
+                    break
+                files.add(p)
+        return files
+
+    def _apply(self, paths, collector, index, ext_stats):
+        counters = Counter()
+        updates = {}
+        candidates = []
+        for path in self._expand(paths):
+            if (path == INDEX_DIRNAME or path.startswith(INDEX_DIRNAME + os.sep)
+                    or self.matcher.excludes_path(path) or not self.scope.covers(path)):
+                continue
+            candidates.append(path)
+
+        # New files that git ignores stay out, as they would on a fresh collection
+        ignored = set()
+        if self.config.get("use_git_index", True):
+            ignored = _git_ignored(self.project_root, [p for p in candidates if p not in self._known])
+
+        for path in candidates:
+            content = None
+            if path not in ignored:
+                full_path = os.path.join(self.project_root, path)
+                try:
+                    st = os.stat(full_path)
+                    if stat.S_ISREG(st.st_mode):
+                        # Large files get the same view as on a fresh collection
+                        content, update = collector.load_path(full_path, path, st, counters)
+                        if update is not None:
+                            ext_stats.add(path, update[2])
+                            if index is not None:
+                                index.put(path, *update)
+                except (UnicodeDecodeError, PermissionError, OSError):
+                    content = None
+            if content is not None and content.strip():
+                updates[path] = str(content)
+            elif path in self._known:
+                updates[path] = None
+                if index is not None:
+                    index.remove(path)
+
+        if index is not None:
+            index.flush()
+
+        # Files rewritten with identical content need no update
+        updates = {
+            path: text for path, text in updates.items()
+            if text is None or path not in self._known or self.context.get(path) != text
+        }
+        for path, text in updates.items():
+            if text is None:
+                self._known.discard(path)
+            else:
+                self._known.add(path)
+        self.stats.update(counters)
+        self.stats["updates"] += len(updates)
+        with self._lock:
+            self._ready.update(updates)